@@ -2,19 +2,32 @@
 # ---------------------------
 # Purpose:
 #   - Create a LangGraph ReAct agent using OpenAI (ChatOpenAI).
-#   - Connect multiple MCP servers (weather, fun, info, search) via stdio.
-#   - Provide an interactive chat loop with memory retained across turns.
+#   - Connect multiple MCP servers (weather, fun, info, search) via stdio, spawned lazily on first tool call;
+#     tool schemas are read from a manifest cache so startup does not wait on any server.
+#   - Or (PLUGGRAPH_MCP_MODE=inprocess) mount all servers in this process over an in-memory transport,
+#     or (PLUGGRAPH_MCP_MODE=http) use a shared tool tier started with serve.py.
+#   - Provide an interactive chat loop with memory retained across turns (and restarts, via SQLite).
+#   - Stream LLM tokens and tool-call events as they arrive (PLUGGRAPH_STREAM=0 to disable).
+#   - Keep the prompt within a token budget (old tool outputs digested, old turns summarized).
+#   - Trace every turn (LLM calls, tool calls, upstream requests) when PLUGGRAPH_TRACE is set.
+#   - Dispatch the tool calls of one model step concurrently, with per-server caps and a per-turn
+#     deadline after which the model gets the partial results (tool_dispatch.py).
 #   - Demonstrate tool use: weather forecast/alerts, quotes, jokes, activities, universities, country info, images, live web search.
 # ---------------------------
 
 import os  # for reading environment variables like OPENAI_API_KEY
+import time  # for per-turn latency measurements
 import asyncio  # for running async event loop
+from contextlib import asynccontextmanager, nullcontext  # agent setup/teardown shared by the REPL and batch runner
 from dotenv import load_dotenv  # to load .env file for API keys
 from langchain_openai import ChatOpenAI  # OpenAI chat model wrapper for LangChain
 from langchain_core.messages import HumanMessage  # structured message type for inputs
-from langchain_mcp_adapters.client import MultiServerMCPClient  # MCP multi-server client
-from langgraph.prebuilt import create_react_agent  # prebuilt ReAct agent for LangGraph
-from langgraph.checkpoint.memory import MemorySaver  # simple in-memory checkpointer for persistence
+from lazy_tools import LazyToolset  # cached tool schemas + MCP servers spawned on first use
+from langgraph.prebuilt import ToolNode, create_react_agent  # prebuilt ReAct agent for LangGraph
+from sqlite_checkpointer import checkpointer_from_env  # persistent, bounded checkpointer (SQLite or memory)
+from history import history_from_env  # token-budgeted history trimming + rolling summary
+from tool_dispatch import dispatcher_from_env  # concurrent tool calls: per-server caps + per-turn deadline
+from tracing import LLMSpanCallback, configure_logging, span  # per-turn traces (PLUGGRAPH_TRACE=console|file.jsonl)
 
 # Load environment variables from .env so OPENAI_API_KEY is available
 load_dotenv()
@@ -30,84 +43,235 @@ llm = ChatOpenAI(model="gpt-4o")  # create the chat model instance
 # Define a single thread_id to keep conversation memory across turns during this run
 THREAD_ID = "demo-thread-001"  # any stable string works as a memory key
 
-async def run_chat_loop(agent, client):
+# MCP servers, each launched as a subprocess (on first use) and reached over stdio
+SERVERS = {
+    "weather": {  # logical server name for weather tools
+        "command": "python",  # run via Python interpreter
+        "args": ["weather_server.py"],  # script that hosts the MCP server
+        "transport": "stdio"  # communicate via stdin/stdout (recommended)
+    },
+    "fun": {  # logical server for quotes/jokes/activities
+        "command": "python",
+        "args": ["fun_server.py"],
+        "transport": "stdio"
+    },
+    "info": {  # logical server for universities/country info/images
+        "command": "python",
+        "args": ["info_server.py"],
+        "transport": "stdio"
+    },
+    "search": {  # logical server for live web search
+        "command": "python",
+        "args": ["search_server.py"],
+        "transport": "stdio"
+    }
+}
+
+# Same servers mounted in this process behind an in-memory transport (PLUGGRAPH_MCP_MODE=inprocess):
+# no subprocesses or stdio pipes, one event loop and one shared HTTP pool
+IN_PROCESS_SERVERS = {
+    "weather": {"transport": "in_process", "module": "weather_server"},
+    "fun": {"transport": "in_process", "module": "fun_server"},
+    "info": {"transport": "in_process", "module": "info_server"},
+    "search": {"transport": "in_process", "module": "search_server"},
+}
+
+# Shared, already-running servers started with `python serve.py <name>` (PLUGGRAPH_MCP_MODE=http);
+# PLUGGRAPH_MCP_URLS="weather=http://tools:8001/mcp,..." overrides the local defaults
+HTTP_URLS = {
+    "weather": "http://127.0.0.1:8001/mcp",
+    "fun": "http://127.0.0.1:8002/mcp",
+    "info": "http://127.0.0.1:8003/mcp",
+    "search": "http://127.0.0.1:8004/mcp",
+}
+for _entry in filter(None, os.getenv("PLUGGRAPH_MCP_URLS", "").split(",")):
+    _name, _, _url = _entry.partition("=")
+    HTTP_URLS[_name.strip()] = _url.strip()
+HTTP_SERVERS = {
+    name: {
+        "transport": "streamable_http",
+        "url": url,
+        "source": f"{name}_server.py",  # local copy whose hash invalidates the cached tool schemas
+    }
+    for name, url in HTTP_URLS.items()
+}
+
+# "stdio" (default; one isolated process per server), "inprocess", or "http"
+MCP_MODE = os.getenv("PLUGGRAPH_MCP_MODE", "stdio").lower()
+
+# Spawn all servers in the background right after startup instead of on first tool call
+WARM_SERVERS = os.getenv("PLUGGRAPH_WARM_SERVERS", "0") == "1"
+
+# Stream tokens/tool events while the ReAct loop runs (set PLUGGRAPH_STREAM=0 for one-shot replies)
+STREAM = os.getenv("PLUGGRAPH_STREAM", "1") != "0"
+
+# Longest tool input/output preview printed inline while streaming
+TOOL_PREVIEW_CHARS = 120
+
+def _preview(value) -> str:
+    """Single-line, truncated text for inline tool events."""
+    text = getattr(value, "content", value)  # ToolMessage → its content
+    text = " ".join(str(text).split())  # collapse newlines/whitespace
+    return text if len(text) <= TOOL_PREVIEW_CHARS else text[:TOOL_PREVIEW_CHARS] + "…"
+
+async def stream_turn(agent, messages, config) -> dict:
+    """
+    Purpose:
+      - Run one agent turn with LangGraph's astream_events and print output as it arrives:
+        LLM tokens inline, tool-call start/finish as short status lines.
+      - Return per-turn timing: time to first byte (first visible output) and total latency.
+    """
+    start = time.perf_counter()  # turn start
+    ttfb = None  # seconds until the user saw anything
+    at_line_start = True  # whether the cursor is at the start of a line
+
+    def mark_first_byte():
+        nonlocal ttfb
+        if ttfb is None:
+            ttfb = time.perf_counter() - start
+
+    print("\nAgent:")
+    async for event in agent.astream_events({"messages": messages}, config=config, version="v2"):
+        kind = event["event"]  # e.g. on_chat_model_stream, on_tool_start, on_tool_end
+        if kind == "on_chat_model_stream":
+            if event["metadata"].get("langgraph_node") != "agent":
+                continue  # only the ReAct model node's reply is user-facing (not e.g. the history summarizer)
+            chunk = event["data"]["chunk"].content  # token text (empty for tool-call chunks)
+            if isinstance(chunk, str) and chunk:
+                mark_first_byte()
+                print(chunk, end="", flush=True)
+                at_line_start = chunk.endswith("\n")
+        elif kind == "on_tool_start":
+            mark_first_byte()
+            prefix = "" if at_line_start else "\n"
+            print(f"{prefix}  ↳ calling {event['name']}({_preview(event['data'].get('input', ''))})", flush=True)
+            at_line_start = True
+        elif kind == "on_tool_end":
+            elapsed = time.perf_counter() - start
+            print(f"  ✓ {event['name']} done at {elapsed:.2f}s: {_preview(event['data'].get('output', ''))}", flush=True)
+            at_line_start = True
+    total = time.perf_counter() - start
+    if not at_line_start:
+        print()
+    return {"ttfb": ttfb if ttfb is not None else total, "total": total}
+
+async def run_chat_loop(agent, toolset, history=None, dispatcher=None):
     """
     Purpose:
       - Provide an interactive CLI loop where the user can type messages.
       - Maintain memory (via LangGraph checkpointer) across turns.
-      - Forward each user message to the agent; print the agent's final reply.
+      - Forward each user message to the agent; stream (or print) the agent's reply.
+      - Record time-to-first-byte and total latency per turn (plus prompt tokens before/after trimming
+        and how much of the tool work ran in parallel).
     """
     print("Type 'exit' to quit.")
+    turn_metrics = []  # one {"ttfb", "total"} dict per turn
     # Infinite loop until user types 'exit'
     while True:
-        # Read a line of input from the terminal
-        user_input = input("\nYou: ").strip()  # strip whitespace to simplify checks
+        # Read a line of input from the terminal in a worker thread, so warming servers keep spawning while the user types
+        user_input = (await asyncio.to_thread(input, "\nYou: ")).strip()  # strip whitespace to simplify checks
         # If the user wants to exit, break the loop
         if user_input.lower() in {"exit", "quit"}:  # allow multiple exit keywords
             break  # leave the loop gracefully
         # Build the message list for the agent; using HumanMessage for clarity
         messages = [HumanMessage(content=user_input)]  # wrap input as a HumanMessage
-        # Send the message to the agent using ainvoke (async invoke)
-        # Provide configurable 'config' with a thread_id so memory is consistent
-        resp = await agent.ainvoke({"messages": messages}, config={"configurable": {"thread_id": THREAD_ID}})
-        # Extract the final LLM message content from LangGraph's response
-        final = resp["messages"][-1].content  # get the last message content
-        # Print the agent's response to console for the user to read
-        print(f"\nAgent:\n{final}")  # render the output
+        # Provide configurable 'config' with a thread_id so memory is consistent;
+        # the callback records a span per LLM call inside this turn's trace
+        config = {"configurable": {"thread_id": THREAD_ID}, "callbacks": [LLMSpanCallback()]}
+        # One trace per turn: LLM calls, MCP tool calls and the servers' upstream requests nest under it
+        with span("agent.turn", **{"thread.id": THREAD_ID, "turn": len(turn_metrics) + 1}), \
+                dispatcher.turn() if dispatcher else nullcontext():
+            if STREAM:
+                # Print tokens and tool events as the ReAct loop produces them
+                metrics = await stream_turn(agent, messages, config)
+            else:
+                # Send the message to the agent using ainvoke (async invoke) and wait for the full reply
+                start = time.perf_counter()
+                resp = await agent.ainvoke({"messages": messages}, config=config)
+                # Extract the final LLM message content from LangGraph's response
+                final = resp["messages"][-1].content  # get the last message content
+                # Print the agent's response to console for the user to read
+                print(f"\nAgent:\n{final}")  # render the output
+                elapsed = time.perf_counter() - start
+                metrics = {"ttfb": elapsed, "total": elapsed}  # nothing is shown before the full reply
+        # Prompt size per turn, before and after the history trimming pre-model hook
+        tokens = history.pop_turn_stats() if history else None
+        if tokens:
+            metrics.update(tokens)
+        # Tool steps this turn: wall time vs summed tool time shows the parallelism actually achieved
+        steps = dispatcher.pop_turn_stats() if dispatcher else None
+        if steps:
+            metrics.update(steps)
+        turn_metrics.append(metrics)
+        # Perceived latency (first byte) is tracked separately from total turn latency
+        line = f"turn {len(turn_metrics)}: first byte {metrics['ttfb']:.2f}s, total {metrics['total']:.2f}s"
+        if tokens:
+            line += f", prompt ~{tokens['prompt_tokens_before']}→{tokens['prompt_tokens_after']} tokens"
+        if steps:
+            line += (f", tools {steps['tool_calls']} calls in {steps['tool_steps']} steps "
+                     f"({steps['tool_wall_s']:.2f}s, {steps['tool_parallelism']:.1f}x parallel"
+                     f"{', ' + str(steps['tool_timeouts']) + ' timed out' if steps['tool_timeouts'] else ''})")
+        print(f"\n[{line}]")
 
-async def main():
+@asynccontextmanager
+async def agent_session():
     """
     Purpose:
-      - Start multiple MCP servers (weather, fun, info, search) via stdio.
-      - Discover their tools via MCP protocol.
+      - Load tool schemas for the MCP servers (weather, fun, info, search) from the manifest cache.
+      - Servers start via stdio on first tool call (or in the background with PLUGGRAPH_WARM_SERVERS=1).
       - Build a LangGraph ReAct agent with those tools and a memory checkpointer.
-      - Start an interactive chat loop.
+      - Yield (agent, toolset, history, dispatcher); servers and checkpointer are shut down on exit.
     """
-    # Initialize MCP client with multiple servers; each will be launched as a subprocess
-    client = MultiServerMCPClient({
-        "weather": {  # logical server name for weather tools
-            "command": "python",  # run via Python interpreter
-            "args": ["weather_server.py"],  # script that hosts the MCP server
-            "transport": "stdio"  # communicate via stdin/stdout (recommended)
-        },
-        "fun": {  # logical server for quotes/jokes/activities
-            "command": "python",
-            "args": ["fun_server.py"],
-            "transport": "stdio"
-        },
-        "info": {  # logical server for universities/country info/images
-            "command": "python",
-            "args": ["info_server.py"],
-            "transport": "stdio"
-        },
-        "search": {  # logical server for live web search
-            "command": "python",
-            "args": ["search_server.py"],
-            "transport": "stdio"
-        }
-    })
-
-    # Ask the MCP client to introspect all connected servers and return their tool schemas
-    tools = await client.get_tools()  # returns a list of ToolSpecifications for LangChain
-
-    # Create a simple in-memory checkpointer so the agent retains conversation state across turns
-    checkpointer = MemorySaver()  # ephemeral memory (per process) suitable for demos
+    # Tool schemas come from the on-disk manifest (refreshed only for servers whose file changed);
+    # each server subprocess is spawned the first time one of its tools is called
+    connections = {"inprocess": IN_PROCESS_SERVERS, "http": HTTP_SERVERS}.get(MCP_MODE, SERVERS)
+    toolset = LazyToolset(connections)
+    tools = await toolset.get_tools()  # returns LangChain tools for all configured servers
+    if WARM_SERVERS:
+        toolset.warm()  # spawn servers in the background while the user types
+
+    # Persistent checkpointer so the agent retains conversation state across turns and restarts;
+    # bounded by retention settings (PLUGGRAPH_CHECKPOINTER=memory restores the old MemorySaver)
+    checkpointer = checkpointer_from_env()
+
+    # Trim/summarize history before every LLM call so prompt size stays bounded as the session grows
+    history = history_from_env(lambda model: ChatOpenAI(model=model))  # cheaper model writes the summaries
+
+    # Tool calls from one model step run side by side, capped per server and bounded by the turn deadline
+    dispatcher = dispatcher_from_env(toolset.tool_servers)
 
     # Build a ReAct agent that can call any of the MCP tools as function calls
     agent = create_react_agent(
         llm,  # the OpenAI chat model
-        tools,  # the MCP tools discovered above
-        checkpointer=checkpointer  # memory handler for stateful conversations
+        ToolNode(tools, awrap_tool_call=dispatcher.awrap_tool_call),  # the MCP tools loaded above
+        checkpointer=checkpointer,  # memory handler for stateful conversations
+        pre_model_hook=history.pre_model_hook  # keep the prompt within the token budget
     )
 
-    # (Optional) Warm-up test: show it can call at least one tool (commented for clean demo)
-    # test = await agent.ainvoke({"messages": [HumanMessage(content="Say hi without tools.")]},
-    #                            config={"configurable": {"thread_id": THREAD_ID}})
-    # print(test["messages"][-1].content)
+    try:
+        yield agent, toolset, history, dispatcher
+    finally:
+        # Stop any MCP server subprocesses that were started
+        await toolset.aclose()
+        # Flush any batched checkpoint writes before exiting
+        if hasattr(checkpointer, "close"):
+            checkpointer.close()
+
+async def main():
+    """
+    Purpose:
+      - Build the agent (see agent_session) and start an interactive chat loop.
+    """
+    async with agent_session() as (agent, toolset, history, dispatcher):
+        # (Optional) Warm-up test: show it can call at least one tool (commented for clean demo)
+        # test = await agent.ainvoke({"messages": [HumanMessage(content="Say hi without tools.")]},
+        #                            config={"configurable": {"thread_id": THREAD_ID}})
+        # print(test["messages"][-1].content)
 
-    # Start the interactive chat loop so you can demo multi-tool conversations
-    await run_chat_loop(agent, client)  # run the REPL
+        # Start the interactive chat loop so you can demo multi-tool conversations
+        await run_chat_loop(agent, toolset, history, dispatcher)  # run the REPL
 
 # Standard async entrypoint guard
 if __name__ == "__main__":  # ensure this block runs only when script executed directly
+    configure_logging()  # PLUGGRAPH_LOG_LEVEL=INFO adds per-step tool timing and prompt tokens on stderr
     asyncio.run(main())  # start the asyncio event loop and run main()
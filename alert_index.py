@@ -0,0 +1,274 @@
+# alert_index.py
+# ---------------------------
+# Purpose:
+#   - Point lookups of active NWS alerts for weather_server.get_alerts. A state's
+#     /alerts/active feed lists every alert in the state; only the ones that cover the
+#     queried coordinate should be shown.
+#   - AlertIndex is built once per feed refresh:
+#       - storm-based alerts (polygon / multipolygon geometry): one entry per polygon with a
+#         precomputed bounding box, packed into an STR (sort-tile-recursive) R-tree; a lookup
+#         walks only the boxes that contain the point, then runs an exact ray-casting
+#         point-in-polygon test (holes respected)
+#       - zone-based alerts (geometry null): indexed by their UGC codes and matched against
+#         the point's forecast / county / fire-weather zones from NWS /points
+#       - expired alerts are skipped; hits are ordered by severity
+#   - StateAlerts keeps one index per state, shared by all calls. The first call for a state
+#     fetches the feed; after that it refreshes in the background every PLUGGRAPH_ALERT_REFRESH
+#     seconds while the state is being queried, and a failed refresh keeps the previous index.
+#   - Configuration:
+#       PLUGGRAPH_ALERT_REFRESH=60   seconds between background refreshes of a state's feed (0 = fetch per call)
+#       PLUGGRAPH_ALERT_IDLE=900     stop refreshing a state nobody queried for this long
+# ---------------------------
+
+import os
+import sys
+import math
+import asyncio
+from datetime import datetime, timezone
+from time import monotonic
+from typing import Awaitable, Callable, Iterable, List, Optional, Sequence, Tuple
+
+from scheduler import background
+from single_flight import SingleFlight
+
+NODE_SIZE = 16  # children per R-tree node
+
+# Most severe first; CAP severities outside this list sort last
+SEVERITY_ORDER = {"Extreme": 0, "Severe": 1, "Moderate": 2, "Minor": 3}
+
+# Alert properties kept in the index (descriptions dominate the feed; everything else is dropped)
+KEEP = ("event", "areaDesc", "headline", "description", "severity", "onset", "expires", "ends")
+
+Box = Tuple[float, float, float, float]  # min lon, min lat, max lon, max lat
+Ring = List[Tuple[float, float]]
+
+
+def _bbox(ring: Ring) -> Box:
+    xs = [p[0] for p in ring]
+    ys = [p[1] for p in ring]
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+def _in_ring(x: float, y: float, ring: Ring) -> bool:
+    """Ray casting: an odd number of edge crossings to the right of the point means inside."""
+    inside = False
+    xj, yj = ring[-1]
+    for xi, yi in ring:
+        if (yi > y) != (yj > y) and x < (xj - xi) * (y - yi) / (yj - yi) + xi:
+            inside = not inside
+        xj, yj = xi, yi
+    return inside
+
+
+def _polygons(geometry: Optional[dict]) -> List[List[Ring]]:
+    """GeoJSON Polygon / MultiPolygon as a list of polygons (outer ring first, then holes)."""
+    if not isinstance(geometry, dict):
+        return []
+    coords = geometry.get("coordinates") or []
+    kind = geometry.get("type")
+    parts = [coords] if kind == "Polygon" else coords if kind == "MultiPolygon" else []
+    out = []
+    for part in parts:
+        rings = [[(float(p[0]), float(p[1])) for p in ring] for ring in part if len(ring) >= 3]
+        if rings:
+            out.append(rings)
+    return out
+
+
+def _parse_time(value: Optional[str]) -> Optional[float]:
+    try:
+        return datetime.fromisoformat(value).timestamp() if value else None
+    except (TypeError, ValueError):
+        return None
+
+
+class _RTree:
+    """Static R-tree over bounding boxes, bulk-loaded with sort-tile-recursive packing."""
+
+    def __init__(self, boxes: Sequence[Box]):
+        # A node is (box, children, leaf); leaf children are (box, index) pairs, inner ones are nodes
+        level = list(zip(boxes, range(len(boxes))))
+        self.height = 0
+        while len(level) > 1 or self.height == 0:
+            level = self._pack(level, leaf=self.height == 0)
+            self.height += 1
+        self.root = level[0] if level else None
+
+    @staticmethod
+    def _pack(entries: list, leaf: bool) -> list:
+        n = len(entries)
+        slices = max(1, math.ceil(math.sqrt(math.ceil(n / NODE_SIZE))))
+        per_slice = slices * NODE_SIZE
+        entries = sorted(entries, key=lambda e: e[0][0] + e[0][2])  # by center longitude
+        nodes = []
+        for s in range(0, n, per_slice):
+            column = sorted(entries[s:s + per_slice], key=lambda e: e[0][1] + e[0][3])  # by center latitude
+            for c in range(0, len(column), NODE_SIZE):
+                group = column[c:c + NODE_SIZE]
+                box = (min(e[0][0] for e in group), min(e[0][1] for e in group),
+                       max(e[0][2] for e in group), max(e[0][3] for e in group))
+                nodes.append((box, group, leaf))
+        return nodes
+
+    def query(self, x: float, y: float) -> Iterable[int]:
+        """Indices of the boxes that contain the point."""
+        if self.root is None:
+            return
+        x0, y0, x1, y1 = self.root[0]
+        if not (x0 <= x <= x1 and y0 <= y <= y1):
+            return
+        stack = [self.root]
+        while stack:
+            _, children, leaf = stack.pop()
+            for child in children:
+                x0, y0, x1, y1 = child[0]
+                if x0 <= x <= x1 and y0 <= y <= y1:
+                    if leaf:
+                        yield child[1]
+                    else:
+                        stack.append(child)
+
+
+class AlertIndex:
+    """Spatial index over one /alerts/active feed."""
+
+    def __init__(self, features: List[dict]):
+        self.alerts: List[dict] = []
+        self._expires: List[Optional[float]] = []
+        self._shapes: List[Tuple[int, List[Ring]]] = []  # (alert id, rings) per polygon
+        boxes: List[Box] = []
+        self.zones: dict = {}  # UGC code -> alert ids, for alerts without geometry
+        for f in features:
+            p = f.get("properties") or {}
+            i = len(self.alerts)
+            self.alerts.append({k: p.get(k) for k in KEEP})
+            self._expires.append(_parse_time(p.get("ends") or p.get("expires")))
+            polygons = _polygons(f.get("geometry"))
+            for rings in polygons:
+                self._shapes.append((i, rings))
+                boxes.append(_bbox(rings[0]))
+            if not polygons:
+                for code in (p.get("geocode") or {}).get("UGC") or []:
+                    self.zones.setdefault(code, []).append(i)
+        self._tree = _RTree(boxes)
+
+    def __len__(self) -> int:
+        return len(self.alerts)
+
+    def covering(self, latitude: float, longitude: float, zones: Iterable[str] = (),
+                 now: Optional[float] = None) -> List[dict]:
+        """Unexpired alerts whose polygon contains the point or whose zones include it, most severe first."""
+        hits = set()
+        for s in self._tree.query(longitude, latitude):
+            i, rings = self._shapes[s]
+            if i not in hits and _in_ring(longitude, latitude, rings[0]) \
+                    and not any(_in_ring(longitude, latitude, hole) for hole in rings[1:]):
+                hits.add(i)
+        for code in zones:
+            hits.update(self.zones.get(code, ()))
+        now = datetime.now(timezone.utc).timestamp() if now is None else now
+        live = [i for i in hits if self._expires[i] is None or self._expires[i] > now]
+        live.sort(key=lambda i: (SEVERITY_ORDER.get(self.alerts[i].get("severity"), len(SEVERITY_ORDER)), i))
+        return [self.alerts[i] for i in live]
+
+    def stats(self) -> dict:
+        return {"alerts": len(self.alerts), "polygons": len(self._shapes),
+                "zones": len(self.zones), "tree_height": self._tree.height}
+
+
+class _State:
+    __slots__ = ("index", "loaded_at", "used_at", "task")
+
+    def __init__(self, index: AlertIndex):
+        self.index = index
+        self.loaded_at = monotonic()
+        self.used_at = self.loaded_at
+        self.task: Optional[asyncio.Task] = None
+
+
+class StateAlerts:
+    """Per-state AlertIndex shared across calls, refreshed in the background while in use."""
+
+    def __init__(self, fetch: Callable[[str], Awaitable[Optional[List[dict]]]],
+                 refresh: Optional[float] = None, idle: Optional[float] = None):
+        self.fetch = fetch  # state -> list of GeoJSON features (None on failure)
+        self.refresh = refresh if refresh is not None else float(os.getenv("PLUGGRAPH_ALERT_REFRESH", "60"))
+        self.idle = idle if idle is not None else float(os.getenv("PLUGGRAPH_ALERT_IDLE", "900"))
+        self._states: dict = {}
+        self._flight = SingleFlight()
+        self.lookups = 0
+        self.loads = 0
+        self.refreshes = 0
+        self.failures = 0
+
+    async def index(self, state: str) -> Optional[AlertIndex]:
+        """The state's index; only the first call for a state (or one after it went idle) waits on the feed."""
+        entry = self._states.get(state)
+        if entry is None or entry.task is None or entry.task.done():
+            entry = await self._flight.do(state, lambda: self._load(state))
+            if entry is None:
+                return None
+        entry.used_at = monotonic()
+        return entry.index
+
+    async def covering(self, state: str, latitude: float, longitude: float,
+                       zones: Iterable[str] = ()) -> Optional[List[dict]]:
+        """Alerts covering the point, or None when the state's feed is unavailable."""
+        index = await self.index(state)
+        if index is None:
+            return None
+        self.lookups += 1
+        return index.covering(latitude, longitude, zones)
+
+    async def _load(self, state: str) -> Optional[_State]:
+        entry = self._states.get(state)
+        if entry is not None and entry.task is not None and not entry.task.done():
+            return entry  # another caller finished loading while this one queued
+        features = await self.fetch(state)
+        if features is None:
+            self.failures += 1
+            return None
+        self.loads += 1
+        entry = _State(AlertIndex(features))
+        if self.refresh > 0:
+            entry.task = asyncio.ensure_future(self._keep_fresh(state, entry))
+        self._states[state] = entry
+        return entry
+
+    async def _keep_fresh(self, state: str, entry: _State) -> None:
+        while True:
+            await asyncio.sleep(self.refresh)
+            if monotonic() - entry.used_at > self.idle:
+                if self._states.get(state) is entry:
+                    del self._states[state]  # nobody is asking; the next call loads it again
+                return
+            try:
+                with background():
+                    features = await self.fetch(state)
+            except Exception as e:
+                features = None
+                print(f"alerts refresh for {state} failed: {e}", file=sys.stderr)  # stdout belongs to the MCP stdio stream
+            if features is None:
+                self.failures += 1  # keep serving the previous index
+                continue
+            entry.index = AlertIndex(features)
+            entry.loaded_at = monotonic()
+            self.refreshes += 1
+
+    def clear(self) -> None:
+        """Drop every state's index and stop its refresh loop (benchmarks reset between runs)."""
+        for entry in self._states.values():
+            if entry.task is not None:
+                entry.task.cancel()
+        self._states.clear()
+
+    def stats(self) -> dict:
+        now = monotonic()
+        return {
+            "states": {st: dict(e.index.stats(), age_s=round(now - e.loaded_at, 1)) for st, e in self._states.items()},
+            "refresh_s": self.refresh,
+            "lookups": self.lookups,
+            "loads": self.loads,
+            "refreshes": self.refreshes,
+            "failures": self.failures,
+        }
@@ -0,0 +1,161 @@
+# batch.py
+# ---------------------------
+# Purpose:
+#   - Headless agent runner for regression and throughput workloads:
+#       python batch.py prompts.jsonl -o results.jsonl -c 8
+#   - Input: one JSON object per line. The id comes from "id" or "request_id". The prompt is
+#     "prompt" (one turn), "prompts" (a list of turns in one conversation), or "body"
+#     (+ "title"), so a requests.jsonl-style file can be replayed as-is.
+#   - Items run concurrently (at most `-c` at once); each gets its own thread_id.
+#   - One result line per item is written as soon as it finishes: latency (total and per turn),
+#     tool calls made, tool-step timing per turn, token usage, final reply and any error.
+#   - A summary (throughput, latency percentiles, errors) is printed at the end.
+# ---------------------------
+
+import sys
+import json
+import time
+import asyncio
+import argparse
+from typing import List, Optional
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+from agent import agent_session
+from tracing import LLMSpanCallback, configure_logging, span
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile (pct in 0-100) of `values`, or None if empty."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, min(len(ordered), round(pct / 100 * len(ordered) + 0.5)))
+    return ordered[rank - 1]
+
+
+def item_prompts(item: dict) -> List[str]:
+    """The user turns of one input item."""
+    if isinstance(item.get("prompts"), list):
+        return [str(p) for p in item["prompts"]]
+    if item.get("prompt"):
+        return [str(item["prompt"])]
+    if item.get("body"):
+        return ["\n\n".join(filter(None, [item.get("title"), item["body"]]))]
+    raise ValueError("item has no prompt, prompts or body")
+
+
+def turn_report(messages: list) -> dict:
+    """Tool calls, token usage and final reply from the messages produced by one turn."""
+    # Only messages after the turn's HumanMessage belong to it (earlier ones are history)
+    start = max((i for i, m in enumerate(messages) if isinstance(m, HumanMessage)), default=-1) + 1
+    produced = messages[start:]
+    results = {m.tool_call_id: m for m in produced if isinstance(m, ToolMessage)}
+    tools, usage = [], {"input_tokens": 0, "output_tokens": 0, "total_tokens": 0}
+    for message in produced:
+        if not isinstance(message, AIMessage):
+            continue
+        for key in usage:
+            usage[key] += (message.usage_metadata or {}).get(key, 0)
+        for call in message.tool_calls:
+            result = results.get(call["id"])
+            tools.append({
+                "name": call["name"],
+                "args": call["args"],
+                "status": getattr(result, "status", None) if result is not None else "missing",
+            })
+    final = messages[-1].content if messages else ""
+    return {"tool_calls": tools, "usage": usage, "reply": final if isinstance(final, str) else str(final)}
+
+
+async def run_item(agent, dispatcher, item: dict, index: int, run_id: str) -> dict:
+    item_id = str(item.get("id", item.get("request_id", index)))
+    out = {"id": item_id, "thread_id": f"batch-{run_id}-{item_id}", "turns": []}
+    config = {"configurable": {"thread_id": out["thread_id"]}, "callbacks": [LLMSpanCallback()]}
+    start = time.perf_counter()
+    try:
+        for number, prompt in enumerate(item_prompts(item), 1):
+            turn_start = time.perf_counter()
+            with span("agent.turn", **{"thread.id": out["thread_id"], "turn": number}) as turn, \
+                    dispatcher.turn() as steps:
+                resp = await agent.ainvoke({"messages": [HumanMessage(content=prompt)]}, config=config)
+            report = turn_report(resp["messages"])
+            report["latency"] = round(time.perf_counter() - turn_start, 3)
+            report["tool_steps"] = dispatcher.turn_stats(steps)  # wall vs summed tool time, timeouts
+            report["trace_id"] = turn.trace_id
+            out["turns"].append(report)
+    except Exception as e:  # one failing item must not stop the run
+        out["error"] = f"{type(e).__name__}: {e}"
+    out["latency"] = round(time.perf_counter() - start, 3)
+    out["tool_calls"] = sum(len(t["tool_calls"]) for t in out["turns"])
+    out["usage"] = {
+        key: sum(t["usage"][key] for t in out["turns"])
+        for key in ("input_tokens", "output_tokens", "total_tokens")
+    }
+    return out
+
+
+async def run_batch(items: List[dict], output, concurrency: int) -> dict:
+    """Run all items (at most `concurrency` at once), streaming result lines to `output`."""
+    run_id = time.strftime("%Y%m%d%H%M%S")
+    limit = asyncio.Semaphore(max(1, concurrency))
+    latencies, errors, tokens = [], 0, 0
+
+    async with agent_session() as (agent, toolset, history, dispatcher):
+
+        async def one(index: int, item: dict) -> None:
+            nonlocal errors, tokens
+            async with limit:
+                result = await run_item(agent, dispatcher, item, index, run_id)
+            output.write(json.dumps(result, ensure_ascii=False, default=str) + "\n")
+            output.flush()
+            latencies.append(result["latency"])
+            errors += "error" in result
+            tokens += result["usage"]["total_tokens"]
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i, item) for i, item in enumerate(items)))
+        elapsed = time.perf_counter() - start
+
+    return {
+        "items": len(items),
+        "errors": errors,
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 3),
+        "items_per_second": round(len(items) / elapsed, 3) if elapsed else None,
+        "latency_p50": percentile(latencies, 50),
+        "latency_p95": percentile(latencies, 95),
+        "latency_max": max(latencies, default=None),
+        "total_tokens": tokens,
+    }
+
+
+def read_items(path: str) -> List[dict]:
+    items = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                items.append(json.loads(line))
+    return items
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run prompts from a JSONL file through the agent.")
+    parser.add_argument("input", help="JSONL file with one prompt/conversation per line")
+    parser.add_argument("-o", "--output", default="-", help="results JSONL (default: stdout)")
+    parser.add_argument("-c", "--concurrency", type=int, default=4, help="items in flight at once")
+    args = parser.parse_args()
+    configure_logging("INFO")  # per-step tool timing etc. on stderr; results go to the output file
+
+    items = read_items(args.input)
+    output = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    try:
+        summary = asyncio.run(run_batch(items, output, args.concurrency))
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    print(json.dumps(summary), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+# bench.py
+# ---------------------------
+# Purpose:
+#   - Offline benchmark for the MCP tool functions: no third-party API is contacted.
+#     A local stub (bench_stub.py) replays recorded responses with configurable latency and
+#     injected errors, and http_pool sends all upstream traffic there (PLUGGRAPH_UPSTREAM_OVERRIDE).
+#   - Calls each @mcp.tool() function directly (get_weather, get_forecast, search_universities,
+#     image_of, images_of, web_search, ...) at several concurrency levels and reports p50/p95/p99
+#     latency, throughput, error count, upstream requests and RSS.
+#   - Baselines: --save-baseline writes the results; --baseline compares against them and exits 1
+#     when p95 latency or throughput regress by more than --tolerance.
+#   - Usage:
+#       python bench.py                                   # all tools, concurrency 1,8,32
+#       python bench.py --tools get_weather,image_of --levels 1,64 --latency 0.05 --error-rate 0.02
+#       python bench.py --save-baseline bench_baseline.json
+#       python bench.py --baseline bench_baseline.json --tolerance 0.2
+# ---------------------------
+
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import argparse
+import importlib
+import statistics
+import subprocess
+from typing import Callable, Dict, List, Tuple
+
+import httpx
+
+CITIES = [
+    "Austin, Texas", "Chennai", "Paris", "Tokyo", "Berlin", "Nairobi", "Lima", "Toronto",
+    "Sydney", "Cairo", "Denver", "Oslo", "Mumbai", "Seattle", "Madrid", "Seoul",
+    "Boston", "Lagos", "Dublin", "Miami", "Hanoi", "Quito", "Perth", "Vienna",
+]
+COUNTRIES = ["Japan", "India", "France", "Kenya", "Peru", "Canada", "Norway", "Egypt"]
+TOPICS = ["Eiffel Tower", "Mount Fuji", "Taj Mahal", "Golden Gate Bridge", "Colosseum", "Great Wall of China"]
+QUERIES = ["python programming", "langgraph", "model context protocol", "asyncio", "http keep-alive"]
+
+# Result text that means the tool fell back instead of answering
+FAILURE_MARKERS = ("Unable to fetch", "unavailable", "Could not", "Couldn't", "No jokes", "No image found")
+
+# tool -> (server module, function name, arguments for the i-th call)
+SCENARIOS: Dict[str, Tuple[str, str, Callable[[int], dict]]] = {
+    "geocode": ("weather_server", "geocode", lambda i: {"location": CITIES[i % len(CITIES)]}),
+    "get_forecast": ("weather_server", "get_forecast",
+                     lambda i: {"latitude": 30.0 + (i % 40) * 0.37, "longitude": -97.0 + (i % 40) * 0.41}),
+    "get_alerts": ("weather_server", "get_alerts",
+                   lambda i: {"latitude": 30.0 + (i % 40) * 0.37, "longitude": -97.0 + (i % 40) * 0.41}),
+    "get_weather": ("weather_server", "get_weather", lambda i: {"location": CITIES[i % len(CITIES)]}),
+    "get_weather_batch": ("weather_server", "get_weather_batch",
+                          lambda i: {"locations": [CITIES[(i + k) % len(CITIES)] for k in range(4)]}),
+    "search_universities": ("info_server", "search_universities",
+                            lambda i: {"country": COUNTRIES[i % len(COUNTRIES)], "name": ""}),
+    "country_info": ("info_server", "country_info", lambda i: {"query": COUNTRIES[i % len(COUNTRIES)]}),
+    "image_of": ("info_server", "image_of", lambda i: {"query": TOPICS[i % len(TOPICS)]}),
+    "images_of": ("info_server", "images_of",
+                  lambda i: {"queries": [TOPICS[(i + k) % len(TOPICS)] for k in range(3)]}),
+    "web_search": ("search_server", "web_search", lambda i: {"query": QUERIES[i % len(QUERIES)]}),
+    "get_quote": ("fun_server", "get_quote", lambda i: {}),
+    "get_joke": ("fun_server", "get_joke", lambda i: {}),
+    "get_activity": ("fun_server", "get_activity", lambda i: {}),
+}
+
+
+def _failed(result) -> bool:
+    if result is None or result == [] or result == {}:
+        return True
+    if isinstance(result, dict):
+        return "error" in result
+    return isinstance(result, str) and any(marker in result for marker in FAILURE_MARKERS)
+
+
+def rss_mb() -> Tuple[float, float]:
+    """(current, peak) resident set size of this process in MB."""
+    current = peak = 0.0
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    current = int(line.split()[1]) / 1024
+                elif line.startswith("VmHWM:"):
+                    peak = int(line.split()[1]) / 1024
+    except OSError:  # not Linux: peak only
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+    return round(current, 1), round(peak, 1)
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_stub(args) -> Tuple[str, subprocess.Popen]:
+    port = _free_port()
+    cmd = [sys.executable, "bench_stub.py", "--port", str(port), "--fixtures", args.fixtures,
+           "--latency", str(args.latency), "--jitter", str(args.jitter),
+           "--error-rate", str(args.error_rate), "--throttle-rate", str(args.throttle_rate)]
+    proc = subprocess.Popen(cmd)
+    url = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        try:
+            if httpx.get(f"{url}/__stub/health", timeout=0.5).status_code == 200:
+                return url, proc
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.1)
+    proc.terminate()
+    raise RuntimeError("benchmark stub did not start")
+
+
+def configure_env(stub_url: str, keep_rate_limits: bool) -> None:
+    """Point the HTTP layer at the stub; must run before the servers build the shared pool."""
+    os.environ["PLUGGRAPH_UPSTREAM_OVERRIDE"] = stub_url
+    os.environ.pop("PLUGGRAPH_GAZETTEER", None)   # geocode goes through the (stub) Nominatim path
+    os.environ.pop("PLUGGRAPH_CACHE_PATH", None)  # no persistent cache carried between runs
+    if not keep_rate_limits:
+        from scheduler import DEFAULT_LIMITS
+        # the stub has no quotas; measure the servers, not the politeness delays
+        os.environ["PLUGGRAPH_RATE_LIMITS"] = ",".join(f"{host}=100000/100000" for host in DEFAULT_LIMITS)
+
+
+def reset_caches(modules: dict) -> None:
+    from response_cache import get_cache
+    get_cache().clear()
+    for module in modules.values():
+        for value in vars(module).values():
+            if hasattr(value, "clear") and type(value).__name__ in ("GridCache", "ContentPool", "StateAlerts"):
+                value.clear()
+
+
+async def run_level(fn, make_args: Callable[[int], dict], requests: int, concurrency: int) -> dict:
+    limit = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    errors = 0
+
+    async def one(i: int) -> None:
+        nonlocal errors
+        async with limit:
+            start = time.perf_counter()
+            try:
+                failed = _failed(await fn(**make_args(i)))
+            except Exception:
+                failed = True
+            latencies.append(time.perf_counter() - start)
+            errors += failed
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    elapsed = time.perf_counter() - start
+    cuts = statistics.quantiles(latencies, n=100, method="inclusive") if len(latencies) > 1 else latencies * 99
+    return {
+        "requests": requests,
+        "errors": errors,
+        "p50_ms": round(cuts[49] * 1000, 2),
+        "p95_ms": round(cuts[94] * 1000, 2),
+        "p99_ms": round(cuts[98] * 1000, 2),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 2),
+        "throughput_rps": round(requests / elapsed, 1),
+    }
+
+
+async def run(args, stub_url: str) -> List[dict]:
+    names = args.tools.split(",") if args.tools else list(SCENARIOS)
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        raise SystemExit(f"unknown tools: {', '.join(unknown)} (choose from {', '.join(SCENARIOS)})")
+    modules = {m: importlib.import_module(m) for m in sorted({SCENARIOS[n][0] for n in names})}
+    levels = [int(level) for level in args.levels.split(",")]
+    results = []
+    async with httpx.AsyncClient() as stub:
+        for name in names:
+            module, fn_name, make_args = SCENARIOS[name]
+            fn = getattr(modules[module], fn_name)
+            for concurrency in levels:
+                if not args.warm:
+                    reset_caches(modules)
+                before = (await stub.get(f"{stub_url}/__stub/stats")).json()["requests"]
+                row = {"tool": name, "concurrency": concurrency}
+                row.update(await run_level(fn, make_args, args.requests, concurrency))
+                after = (await stub.get(f"{stub_url}/__stub/stats")).json()["requests"]
+                row["upstream_requests"] = sum(after.values()) - sum(before.values())
+                row["rss_mb"], row["peak_rss_mb"] = rss_mb()
+                results.append(row)
+                print(f"{name:<20} c={concurrency:<4} p50={row['p50_ms']:>8.2f}ms p95={row['p95_ms']:>8.2f}ms "
+                      f"p99={row['p99_ms']:>8.2f}ms {row['throughput_rps']:>8.1f} req/s "
+                      f"errors={row['errors']:<4} upstream={row['upstream_requests']:<5} rss={row['rss_mb']}MB",
+                      flush=True)
+    return results
+
+
+def compare(results: List[dict], baseline: List[dict], tolerance: float) -> List[str]:
+    """Regressions against a saved baseline: p95 slower or throughput lower by more than `tolerance`."""
+    base = {(r["tool"], r["concurrency"]): r for r in baseline}
+    problems = []
+    for row in results:
+        ref = base.get((row["tool"], row["concurrency"]))
+        if ref is None:
+            continue
+        label = f"{row['tool']} c={row['concurrency']}"
+        if row["p95_ms"] > ref["p95_ms"] * (1 + tolerance):
+            problems.append(f"{label}: p95 {ref['p95_ms']}ms -> {row['p95_ms']}ms")
+        if row["throughput_rps"] < ref["throughput_rps"] * (1 - tolerance):
+            problems.append(f"{label}: throughput {ref['throughput_rps']} -> {row['throughput_rps']} req/s")
+        if row["errors"] > ref["errors"]:
+            problems.append(f"{label}: errors {ref['errors']} -> {row['errors']}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark of the MCP tool functions.")
+    parser.add_argument("--tools", default="", help="comma-separated tools (default: all)")
+    parser.add_argument("--levels", default="1,8,32", help="comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=200, help="calls per tool and level")
+    parser.add_argument("--warm", action="store_true", help="keep caches between runs (default: reset)")
+    parser.add_argument("--stub-url", default="", help="use an already running bench_stub.py")
+    parser.add_argument("--fixtures", default="bench_fixtures.json")
+    parser.add_argument("--latency", type=float, default=0.02, help="stub latency per upstream request (s)")
+    parser.add_argument("--jitter", type=float, default=0.005)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--keep-rate-limits", action="store_true", help="apply the real per-host quotas")
+    parser.add_argument("--output", default="", help="write results JSON here")
+    parser.add_argument("--save-baseline", default="", help="write results as a baseline file")
+    parser.add_argument("--baseline", default="", help="compare against this baseline file")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed regression (fraction)")
+    args = parser.parse_args()
+
+    proc = None
+    stub_url = args.stub_url
+    if not stub_url:
+        stub_url, proc = start_stub(args)
+    try:
+        configure_env(stub_url, args.keep_rate_limits)
+        results = asyncio.run(run(args, stub_url))
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait()
+
+    report = {
+        "settings": {k: getattr(args, k) for k in ("requests", "levels", "latency", "jitter", "error_rate",
+                                                   "throttle_rate", "warm", "keep_rate_limits")},
+        "results": results,
+    }
+    for path in filter(None, [args.output, args.save_baseline]):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=1)
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            problems = compare(results, json.load(f)["results"], args.tolerance)
+        for problem in problems:
+            print(f"REGRESSION {problem}")
+        if problems:
+            sys.exit(1)
+        print(f"no regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+
+
+if __name__ == "__main__":
+    main()
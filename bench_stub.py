@@ -0,0 +1,135 @@
+# bench_stub.py
+# ---------------------------
+# Purpose:
+#   - Local stand-in for every upstream API the MCP servers call (Nominatim, Open-Meteo, NWS,
+#     REST Countries, Hipolabs, Wikipedia, DuckDuckGo, ZenQuotes, the joke and activity APIs),
+#     so the tool servers can be benchmarked offline and without rate limits.
+#   - Replays recorded responses from bench_fixtures.json. Servers reach it through
+#     PLUGGRAPH_UPSTREAM_OVERRIDE (see http_pool.py), which keeps the real host in X-Upstream-Host.
+#   - Nominatim answers get coordinates derived from the query, so different places land in
+#     different grid cells, as they would against the real service; multi-location Open-Meteo
+#     requests get one recorded entry per location.
+#   - Configurable latency (+ jitter) and error injection (HTTP 500, or 429 with Retry-After).
+#   - Usage:  python bench_stub.py --port 9100 --latency 0.05 --jitter 0.02 --error-rate 0.01
+# ---------------------------
+
+import json
+import random
+import asyncio
+import hashlib
+import argparse
+from fnmatch import fnmatch
+from collections import Counter
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+DEFAULT_FIXTURES = "bench_fixtures.json"
+
+
+def _dumps(body) -> bytes:
+    return json.dumps(body, separators=(",", ":")).encode()
+
+
+def _coords(query: str) -> tuple:
+    """Deterministic pseudo-coordinates for a place name (stable across runs)."""
+    digest = hashlib.sha256(query.strip().lower().encode()).digest()
+    lat = int.from_bytes(digest[:4], "big") / 2**32 * 120 - 55   # -55 .. 65
+    lon = int.from_bytes(digest[4:8], "big") / 2**32 * 360 - 180
+    return round(lat, 4), round(lon, 4)
+
+
+class Stub:
+    def __init__(self, fixtures: list, latency: float = 0.0, jitter: float = 0.0,
+                 error_rate: float = 0.0, throttle_rate: float = 0.0, seed: int = 0):
+        self.fixtures = fixtures
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.random = random.Random(seed)
+        self.requests = Counter()
+        self.injected = Counter()
+        # bodies are encoded once; replaying a fixture costs no serialization
+        self._encoded = [_dumps(f["body"]) for f in fixtures]
+
+    def find(self, host: str, path: str, params) -> int:
+        for i, fixture in enumerate(self.fixtures):
+            if fixture["host"] != host or not fnmatch(path, fixture["path"]):
+                continue
+            if all(params.get(k) == v for k, v in fixture.get("match", {}).items()):
+                return i
+        return -1
+
+    def body(self, index: int, host: str, path: str, params) -> bytes:
+        if host == "nominatim.openstreetmap.org" and path == "/search" and params.get("q"):
+            places = [dict(place) for place in self.fixtures[index]["body"]]
+            if places:
+                lat, lon = _coords(params["q"])
+                places[0].update(lat=str(lat), lon=str(lon), display_name=params["q"])
+            return _dumps(places)
+        if host == "api.open-meteo.com" and "," in params.get("latitude", ""):
+            # multi-location request: one copy of the recorded location per coordinate pair
+            count = params["latitude"].count(",") + 1
+            return b"[" + b",".join([self._encoded[index]] * count) + b"]"
+        return self._encoded[index]
+
+    async def handle(self, request: Request) -> Response:
+        host = request.headers.get("x-upstream-host") or request.url.hostname
+        path = request.url.path
+        self.requests[host] += 1
+        delay = self.latency + (self.random.uniform(-self.jitter, self.jitter) if self.jitter else 0.0)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        roll = self.random.random()
+        if roll < self.error_rate:
+            self.injected["500"] += 1
+            return JSONResponse({"error": "injected failure"}, status_code=500)
+        if roll < self.error_rate + self.throttle_rate:
+            self.injected["429"] += 1
+            return JSONResponse({"error": "injected throttle"}, status_code=429, headers={"Retry-After": "1"})
+        index = self.find(host, path, request.query_params)
+        if index < 0:
+            return JSONResponse({"error": f"no fixture for {host}{path}"}, status_code=404)
+        return Response(self.body(index, host, path, request.query_params), media_type="application/json")
+
+    async def stats(self, request: Request) -> JSONResponse:
+        return JSONResponse({"requests": dict(self.requests), "injected": dict(self.injected)})
+
+    async def health(self, request: Request) -> JSONResponse:
+        return JSONResponse({"status": "ok"})
+
+    def app(self) -> Starlette:
+        return Starlette(routes=[
+            Route("/__stub/health", self.health),
+            Route("/__stub/stats", self.stats),
+            Route("/{path:path}", self.handle),
+        ])
+
+
+def load_fixtures(path: str = DEFAULT_FIXTURES) -> list:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve recorded upstream responses for offline benchmarks.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--fixtures", default=DEFAULT_FIXTURES)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="± seconds of uniform random jitter")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 500")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="fraction answered with 429 + Retry-After")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    stub = Stub(load_fixtures(args.fixtures), args.latency, args.jitter, args.error_rate, args.throttle_rate, args.seed)
+    uvicorn.run(stub.app(), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
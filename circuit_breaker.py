@@ -0,0 +1,143 @@
+# circuit_breaker.py
+# ---------------------------
+# Purpose:
+#   - Bound tail latency when an upstream degrades (used by http_pool for every request).
+#   - CircuitBreaker (one per host): after repeated failures or slow responses the circuit
+#     opens and requests fail fast instead of each waiting out the full timeout. After a
+#     cool-down one probe request is let through (half-open); success closes the circuit,
+#     failure re-opens it with a longer cool-down.
+#   - LatencyWindow: recent response times per host; its p95 is the delay after which an
+#     idempotent GET is hedged (a second copy is sent and the first answer wins).
+#   - Configuration:
+#       PLUGGRAPH_BREAKER_FAILURES=5   consecutive failures/slow responses that open the circuit
+#       PLUGGRAPH_BREAKER_SLOW=5       seconds after which a response counts as slow (0 = never)
+#       PLUGGRAPH_BREAKER_OPEN=30      seconds the circuit stays open before a probe (doubles, max 300)
+#       PLUGGRAPH_HEDGE=0              1 = hedge GETs after the host's p95 latency
+# ---------------------------
+
+import os
+from collections import deque
+from time import monotonic
+from typing import Optional
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+MAX_OPEN_SECONDS = 300.0
+
+HEDGE_MIN_SAMPLES = 20     # no hedging until the host's latency distribution is known
+HEDGE_MIN_DELAY = 0.05     # never hedge sooner than this (seconds)
+
+
+class CircuitOpen(Exception):
+    """Raised instead of sending a request while the host's circuit is open."""
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker with a single half-open probe."""
+
+    def __init__(self, host: str, failures: int = 5, slow: float = 5.0, open_seconds: float = 30.0):
+        self.host = host
+        self.failure_threshold = max(1, failures)
+        self.slow = slow
+        self.base_open = open_seconds
+        self.state = CLOSED
+        self.consecutive = 0
+        self.open_for = open_seconds
+        self.open_until = 0.0
+        self.probing = False
+        self.opened = 0
+        self.rejected = 0
+
+    def before(self) -> None:
+        """Call before sending; raises CircuitOpen when the request should fail fast."""
+        if self.state == CLOSED:
+            return
+        now = monotonic()
+        if self.state == OPEN and now >= self.open_until:
+            self.state = HALF_OPEN
+        if self.state == HALF_OPEN and not self.probing:
+            self.probing = True  # this request is the probe
+            return
+        self.rejected += 1
+        raise CircuitOpen(f"{self.host}: circuit {self.state}, retry in {max(0.0, self.open_until - now):.0f}s")
+
+    def record(self, ok: bool, seconds: float) -> None:
+        """Outcome of a request let through by before()."""
+        if ok and self.slow and seconds > self.slow:
+            ok = False  # a response this slow is as bad as a failure for the caller
+        if self.state == HALF_OPEN:
+            self.probing = False
+            if ok:
+                self._close()
+            else:
+                self._open(self.open_for * 2)
+            return
+        if ok:
+            self.consecutive = 0
+            return
+        self.consecutive += 1
+        if self.state == CLOSED and self.consecutive >= self.failure_threshold:
+            self._open(self.base_open)
+
+    def cancelled(self) -> None:
+        """The caller gave up before an outcome was known; free the probe slot."""
+        if self.state == HALF_OPEN:
+            self.probing = False
+
+    def _open(self, seconds: float) -> None:
+        self.state = OPEN
+        self.opened += 1
+        self.open_for = min(MAX_OPEN_SECONDS, seconds)
+        self.open_until = monotonic() + self.open_for
+
+    def _close(self) -> None:
+        self.state = CLOSED
+        self.consecutive = 0
+        self.open_for = self.base_open
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive,
+            "opened": self.opened,
+            "rejected": self.rejected,
+            "retry_in": round(max(0.0, self.open_until - monotonic()), 1) if self.state != CLOSED else 0.0,
+        }
+
+
+class LatencyWindow:
+    """Recent successful response times for one host; p95 drives the hedge delay."""
+
+    def __init__(self, size: int = 200):
+        self.samples: deque = deque(maxlen=size)
+        self._p95: Optional[float] = None
+        self._since = 0
+
+    def observe(self, seconds: float) -> None:
+        self.samples.append(seconds)
+        self._since += 1
+        if self._since >= 20:  # re-sort every 20 samples, not on every request
+            self._p95 = None
+
+    def p95(self) -> Optional[float]:
+        if len(self.samples) < HEDGE_MIN_SAMPLES:
+            return None
+        if self._p95 is None:
+            ordered = sorted(self.samples)
+            self._p95 = ordered[int(0.95 * (len(ordered) - 1))]
+            self._since = 0
+        return self._p95
+
+    def hedge_delay(self) -> Optional[float]:
+        p95 = self.p95()
+        return None if p95 is None else max(HEDGE_MIN_DELAY, p95)
+
+
+def breaker_settings_from_env() -> dict:
+    return {
+        "failures": int(os.getenv("PLUGGRAPH_BREAKER_FAILURES", "5")),
+        "slow": float(os.getenv("PLUGGRAPH_BREAKER_SLOW", "5")),
+        "open_seconds": float(os.getenv("PLUGGRAPH_BREAKER_OPEN", "30")),
+    }
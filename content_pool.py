@@ -0,0 +1,180 @@
+# content_pool.py
+# ---------------------------
+# Purpose:
+#   - In-memory pools of ready-to-serve random content (quotes, jokes, activities) for fun_server.
+#     The content is not tied to the request, so tool calls pop a prefetched item instead of
+#     waiting on an upstream round-trip.
+#   - Each ContentPool:
+#       - refills in the background (bulk fetches where the API has them) when it drops below
+#         its low watermark, up to its high watermark
+#       - never queues an item served within the last `no_repeat` calls
+#       - keeps an archive of everything it has fetched; if the pool is empty and the upstream
+#         is down, a tool is answered from the archive instead of with an error string
+#       - a call that finds the pool empty waits only for the refill's first batch (at most
+#         COLD_WAIT seconds); the rest of the top-up carries on in the background
+#       - refills of a non-empty pool are queued as background work (scheduler.py)
+#       - backs off for a while when a refill brings nothing new (upstream down or exhausted)
+#   - Configuration:
+#       PLUGGRAPH_FUN_NO_REPEAT=50   calls within which the same item is not served twice
+# ---------------------------
+
+import os
+import sys
+import random
+import asyncio
+from collections import deque
+from contextlib import nullcontext
+from time import monotonic
+from typing import Awaitable, Callable, List, Optional
+
+from scheduler import background
+
+REFILL_BACKOFF = 30.0  # seconds before retrying a refill that brought nothing new
+COLD_WAIT = 10.0  # most seconds a call on an empty pool waits for the refill's first items
+
+
+class ContentPool:
+    """Background-refilled buffer of formatted items for one random-content tool."""
+
+    def __init__(self, name: str, fetch: Callable[[], Awaitable[List[str]]], high: int = 50,
+                 low: int = 10, no_repeat: Optional[int] = None, archive: int = 500):
+        self.name = name
+        self.fetch = fetch  # one upstream call -> list of formatted items ([] on failure)
+        self.high = high
+        self.low = min(low, high)
+        window = no_repeat if no_repeat is not None else int(os.getenv("PLUGGRAPH_FUN_NO_REPEAT", "50"))
+        self.no_repeat = max(0, window)
+        self.archive_size = max(archive, high)
+        self.items: deque = deque()
+        self._queued: set = set()
+        self.recent: deque = deque()
+        self._recent: set = set()
+        self.archive: dict = {}  # insertion-ordered set of every item fetched
+        self._task: Optional[asyncio.Task] = None
+        self._arrived = asyncio.Event()  # set whenever a refill queues items or ends
+        self._retry_at = 0.0
+        self.served = 0
+        self.fallbacks = 0
+        self.refills = 0
+        self.fetched = 0
+        self.duplicates = 0
+
+    # ---- serving ----
+
+    async def take(self) -> Optional[str]:
+        """Next item; waits for a refill's first items only when the pool is empty. None if nothing was ever fetched."""
+        if not self.items:
+            self.refill_soon()
+            await self._first_items()
+        if self.items:
+            item = self.items.popleft()
+            self._queued.discard(item)
+            self._remember(item)
+            self.served += 1
+            self.refill_soon()
+            return item
+        return self._fallback()
+
+    async def _first_items(self) -> None:
+        """Wait until the running refill queues something (or ends), for at most COLD_WAIT seconds."""
+        deadline = monotonic() + COLD_WAIT
+        while not self.items and self._task is not None and not self._task.done():
+            remaining = deadline - monotonic()
+            if remaining <= 0:
+                return
+            self._arrived.clear()  # other callers may have drained the last batch already
+            try:
+                await asyncio.wait_for(self._arrived.wait(), remaining)  # never cancels the refill itself
+            except asyncio.TimeoutError:
+                return
+
+    def _fallback(self) -> Optional[str]:
+        if not self.archive:
+            return None
+        candidates = [item for item in self.archive if item not in self._recent] or list(self.archive)
+        item = random.choice(candidates)
+        self._remember(item)
+        self.fallbacks += 1
+        return item
+
+    def _remember(self, item: str) -> None:
+        if not self.no_repeat:
+            return
+        if len(self.recent) >= self.no_repeat:
+            self._recent.discard(self.recent.popleft())
+        self.recent.append(item)
+        self._recent.add(item)
+
+    # ---- refilling ----
+
+    def refill_soon(self) -> None:
+        """Start a background refill if the pool is below its low watermark (no-op otherwise)."""
+        if len(self.items) >= max(1, self.low):
+            return
+        if monotonic() < self._retry_at or (self._task is not None and not self._task.done()):
+            return
+        self._task = asyncio.ensure_future(self._fill())
+
+    async def _fill(self) -> None:
+        self.refills += 1
+        added = 0
+        try:
+            while len(self.items) < self.high:
+                new = 0
+                # Topping up a non-empty pool yields to interactive upstream requests
+                with background() if self.items else nullcontext():
+                    batch = await self.fetch()
+                for item in batch:
+                    self.fetched += 1
+                    if item in self._queued or item in self._recent:
+                        self.duplicates += 1
+                        continue
+                    self.items.append(item)
+                    self._queued.add(item)
+                    self._archive(item)
+                    new += 1
+                if not new:
+                    break  # upstream failed or has nothing fresh right now
+                added += new
+                self._arrived.set()  # wake callers waiting on an empty pool
+        except Exception as e:  # fetch helpers return [] on upstream errors; anything else is a bug
+            print(f"{self.name} refill failed: {e}", file=sys.stderr)  # stdout belongs to the MCP stdio stream
+        finally:
+            if not added:
+                self._retry_at = monotonic() + REFILL_BACKOFF
+            self._arrived.set()
+
+    def _archive(self, item: str) -> None:
+        self.archive.pop(item, None)
+        self.archive[item] = None
+        if len(self.archive) > self.archive_size:
+            del self.archive[next(iter(self.archive))]
+
+    # ---- housekeeping ----
+
+    def clear(self) -> None:
+        """Drop buffered, recent and archived items (benchmarks reset between runs)."""
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+        self._task = None
+        self._arrived = asyncio.Event()
+        self.items.clear()
+        self._queued.clear()
+        self.recent.clear()
+        self._recent.clear()
+        self.archive.clear()
+        self._retry_at = 0.0
+
+    def stats(self) -> dict:
+        return {
+            "buffered": len(self.items),
+            "low": self.low,
+            "high": self.high,
+            "archived": len(self.archive),
+            "served": self.served,
+            "fallbacks": self.fallbacks,
+            "refills": self.refills,
+            "fetched": self.fetched,
+            "duplicates": self.duplicates,
+            "backing_off": monotonic() < self._retry_at,
+        }
@@ -0,0 +1,184 @@
+# countries.py
+# ---------------------------
+# Purpose:
+#   - Optional local snapshot of the ~250 REST Countries records for info_server.country_info,
+#     so a lookup is a dict probe instead of a network round-trip (and the partial-match API
+#     no longer picks "British Indian Ocean Territory" for "India").
+#   - The snapshot is loaded into a precomputed alias index:
+#       - common and official names               (strongest)
+#       - ISO alpha-2 / alpha-3 codes and alternate spellings
+#       - native names and demonyms ("German", "Japanese")
+#     Exact alias → prefix → fuzzy (typo) match; ties go to the stronger alias, then the larger country.
+#     Answers are precomputed in country_info's output shape.
+#   - The live API is only used to refresh the snapshot in the background (snapshot.py).
+#   - Configuration:
+#       PLUGGRAPH_COUNTRIES=/path/to/countries.json   (unset = disabled, live API per call)
+#       PLUGGRAPH_COUNTRIES_REFRESH=604800   seconds between refreshes (0 = use the file as-is)
+#   - CLI:
+#       python countries.py sync
+#       python countries.py lookup "Deutschland"
+# ---------------------------
+
+import os
+import sys
+import json
+import asyncio
+from bisect import bisect_left
+from difflib import get_close_matches
+from typing import List, Optional
+
+from gazetteer import normalize
+from snapshot import keep_fresh, refresh_file
+
+COUNTRIES_URL = "https://restcountries.com/v3.1/all"
+# /all must name its fields (at most ten); these are exactly what country_info and the aliases use
+FIELDS = "name,capital,population,region,currencies,languages,cca2,cca3,altSpellings,demonyms"
+
+FUZZY_MIN = 0.8        # minimum similarity for a typo-tolerant match
+MISS_CACHE = 1024      # remembered prefix/fuzzy results (misses included)
+
+# Alias strength: a country's own name beats a code or spelling, which beats a demonym
+NAME, CODE, OTHER = 3, 2, 1
+
+
+def facts(country: dict) -> dict:
+    """A REST Countries record in country_info's output shape."""
+    return {
+        "name": (country.get("name") or {}).get("official"),
+        "capital": (country.get("capital") or ["N/A"])[0],
+        "population": country.get("population"),
+        "region": country.get("region"),
+        "currencies": list((country.get("currencies") or {}).keys()),
+        "languages": list((country.get("languages") or {}).values()),
+    }
+
+
+class CountryIndex:
+    """In-memory alias index over a list of REST Countries records."""
+
+    def __init__(self, countries: List[dict]):
+        self.facts = [facts(c) for c in countries]
+        self.population = [c.get("population") or 0 for c in countries]
+        self.aliases: dict = {}  # normalized alias -> (strength, country id)
+        for i, c in enumerate(countries):
+            name = c.get("name") or {}
+            self._add(name.get("common"), NAME, i)
+            self._add(name.get("official"), NAME, i)
+            for code in (c.get("cca2"), c.get("cca3")):
+                self._add(code, CODE, i)
+            for spelling in c.get("altSpellings") or []:
+                self._add(spelling, CODE, i)
+            for native in (name.get("nativeName") or {}).values():
+                self._add(native.get("common"), OTHER, i)
+                self._add(native.get("official"), OTHER, i)
+            for forms in (c.get("demonyms") or {}).values():
+                self._add(forms.get("m"), OTHER, i)
+                self._add(forms.get("f"), OTHER, i)
+        self.keys = sorted(self.aliases)
+        self._cache: dict = {}
+
+    def __len__(self) -> int:
+        return len(self.facts)
+
+    def _add(self, alias: Optional[str], strength: int, i: int) -> None:
+        key = normalize(alias or "")
+        if not key:
+            return
+        current = self.aliases.get(key)
+        if current is None or (strength, self.population[i]) > (current[0], self.population[current[1]]):
+            self.aliases[key] = (strength, i)
+
+    def _best(self, keys: List[str]) -> Optional[int]:
+        if not keys:
+            return None
+        return max((self.aliases[k] for k in keys), key=lambda a: (a[0], self.population[a[1]]))[1]
+
+    def _resolve(self, key: str) -> Optional[int]:
+        hit = self.aliases.get(key)
+        if hit is not None:
+            return hit[1]
+        if key in self._cache:
+            return self._cache[key]
+        found = None
+        if len(key) >= 3:
+            # Prefix match, like the API's partial names ("united k" → United Kingdom)
+            start, prefixed = bisect_left(self.keys, key), []
+            for k in self.keys[start:start + 50]:
+                if not k.startswith(key):
+                    break
+                prefixed.append(k)
+            found = self._best(prefixed)
+        if found is None and len(key) >= 4:
+            found = self._best(get_close_matches(key, self.keys, n=3, cutoff=FUZZY_MIN))
+        if len(self._cache) >= MISS_CACHE:
+            self._cache.clear()
+        self._cache[key] = found
+        return found
+
+    def find(self, query: str) -> Optional[dict]:
+        """Facts for the best match of `query`, or None."""
+        key = normalize(query)
+        i = self._resolve(key) if key else None
+        return None if i is None else dict(self.facts[i])
+
+
+_INDEX: Optional[CountryIndex] = None
+_LOADED = False
+_SYNC_TASK: Optional[asyncio.Task] = None
+
+
+def load_countries(path: str) -> Optional[CountryIndex]:
+    """Index the snapshot at `path` (None when it is missing or unreadable)."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if not isinstance(data, list) or not data:
+            raise ValueError("not a list of countries")
+        return CountryIndex(data)
+    except (OSError, ValueError) as e:
+        if os.path.exists(path):
+            print(f"countries snapshot disabled: {e}", file=sys.stderr)  # stdout belongs to the MCP stdio stream
+        return None
+
+
+async def sync_countries(path: str) -> bool:
+    """Refresh the snapshot from the live API and swap in the new index if it changed."""
+    global _INDEX, _LOADED
+    changed = await refresh_file(
+        path, COUNTRIES_URL, params={"fields": FIELDS},
+        validate=lambda data: isinstance(data, list) and len(data) > 100,
+    )
+    if changed or _INDEX is None:
+        index = load_countries(path)
+        if index is not None:
+            _INDEX, _LOADED = index, True
+    return changed
+
+
+async def country_snapshot() -> Optional[CountryIndex]:
+    """Snapshot index for async callers; starts the background refresh on first use."""
+    global _INDEX, _LOADED, _SYNC_TASK
+    path = os.getenv("PLUGGRAPH_COUNTRIES")
+    if not path:
+        return None
+    if not _LOADED and os.path.exists(path):
+        _INDEX, _LOADED = load_countries(path), True  # ~250 records: milliseconds, once
+    if _SYNC_TASK is None:
+        refresh = float(os.getenv("PLUGGRAPH_COUNTRIES_REFRESH", str(7 * 24 * 3600)))
+        _SYNC_TASK = asyncio.ensure_future(keep_fresh(path, refresh, lambda: sync_countries(path), "countries"))
+    return _INDEX
+
+
+if __name__ == "__main__":
+    snapshot = os.getenv("PLUGGRAPH_COUNTRIES")
+    if not snapshot:
+        sys.exit("Set PLUGGRAPH_COUNTRIES to the local snapshot path first.")
+    if len(sys.argv) == 2 and sys.argv[1] == "sync":
+        print("updated" if asyncio.run(sync_countries(snapshot)) else "up to date")
+    elif len(sys.argv) == 3 and sys.argv[1] == "lookup":
+        index = load_countries(snapshot)
+        if index is None:
+            sys.exit("No snapshot yet; run `python countries.py sync`.")
+        print(json.dumps(index.find(sys.argv[2]), ensure_ascii=False))
+    else:
+        sys.exit("usage: python countries.py sync | lookup <country>")
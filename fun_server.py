@@ -5,27 +5,69 @@
 #       1) get_quote() -> random motivational quote (ZenQuotes).
 #       2) get_joke() -> random joke (Official Joke API).
 #       3) get_activity() -> random activity (Bored API).
+#   - Items come from prefetched in-memory pools (content_pool.py) refilled in bulk in the
+#     background, so a call does not wait on the upstream; stats://content shows the pools.
 # ---------------------------
 
-import httpx  # async HTTP client
+import json  # stats resource
+from contextlib import asynccontextmanager  # lifespan helper
 from typing import Optional  # typing helper
 from mcp.server.fastmcp import FastMCP  # MCP server
-
-# Instantiate the MCP server with a logical name
-mcp = FastMCP("fun")  # server name used by the client
+from http_pool import get_pool, lifespan, register_stats  # shared pooled HTTP layer
+from content_pool import ContentPool  # prefetched random-content buffers
+from tracing import instrument_tools  # spans + latency metrics for every tool
 
 # Helper to fetch JSON with basic error handling
 async def _get_json(url: str, params: Optional[dict] = None) -> Optional[dict | list]:
     """
     Helper to GET JSON with simple error handling.
     """
-    async with httpx.AsyncClient(timeout=15) as client:  # create client
-        try:  # attempt GET
-            r = await client.get(url, params=params)  # perform request
-            r.raise_for_status()  # raise HTTPError on 4xx/5xx
-            return r.json()  # parse JSON
-        except Exception:  # swallow network/API errors
-            return None  # signal failure
+    # Reuse the long-lived per-host client (keep-alive); returns None on any error
+    return await get_pool().get_json(url, params=params, timeout=15)
+
+async def _fetch_quotes() -> list:
+    """ZenQuotes bulk endpoint: ~50 random quotes per call."""
+    data = await _get_json("https://zenquotes.io/api/quotes")  # bulk quotes
+    if not isinstance(data, list):  # validate response shape
+        return []
+    return [f"“{q.get('q','...')}” — {q.get('a','Unknown')}" for q in data if isinstance(q, dict) and q.get("q")]
+
+async def _fetch_jokes() -> list:
+    """Official Joke API bulk endpoint: ten jokes per call."""
+    data = await _get_json("https://official-joke-api.appspot.com/jokes/ten")  # ten jokes
+    if not isinstance(data, list):  # validate
+        return []
+    return [f"{j.get('setup','...')}\n{j.get('punchline','')}" for j in data if isinstance(j, dict) and j.get("setup")]
+
+async def _fetch_activity() -> list:
+    """Bored API has no bulk endpoint: one activity per call (the pool loops until full)."""
+    data = await _get_json("https://www.boredapi.com/api/activity")  # bored API
+    if not isinstance(data, dict) or not data.get("activity"):  # validate
+        return []
+    return [f"Try this: {data['activity']}"]
+
+# Prefetched pools: tools answer from memory, refills run in the background
+QUOTES = ContentPool("quotes", _fetch_quotes, high=50, low=10)
+JOKES = ContentPool("jokes", _fetch_jokes, high=30, low=10)
+ACTIVITIES = ContentPool("activities", _fetch_activity, high=10, low=3)
+POOLS = (QUOTES, JOKES, ACTIVITIES)
+
+@asynccontextmanager
+async def fun_lifespan(server):
+    """HTTP pool lifespan, plus start filling the content pools before the first tool call."""
+    async with lifespan(server) as state:
+        for pool in POOLS:
+            pool.refill_soon()
+        yield state
+
+# Instantiate the MCP server with a logical name
+mcp = FastMCP("fun", lifespan=fun_lifespan)  # server name used by the client
+register_stats(mcp)  # expose pool hit/miss counters as a resource
+
+@mcp.resource("stats://content", name="content_stats", mime_type="application/json")
+def content_stats() -> str:
+    """Prefetched quote/joke/activity pools (buffered items, refills, archive fallbacks)."""
+    return json.dumps({pool.name: pool.stats() for pool in POOLS}, indent=2)
 
 @mcp.tool()
 async def get_quote() -> str:
@@ -34,11 +76,8 @@ async def get_quote() -> str:
     Returns:
       - A short quote and author if available.
     """
-    data = await _get_json("https://zenquotes.io/api/random")  # call ZenQuotes
-    if not data or not isinstance(data, list):  # validate response shape
-        return "Could not fetch a quote right now."  # fallback
-    q = data[0]  # first item
-    return f"“{q.get('q','...')}” — {q.get('a','Unknown')}"  # format nicely
+    quote = await QUOTES.take()  # prefetched; waits on ZenQuotes only when the pool is empty
+    return quote or "Could not fetch a quote right now."  # fallback
 
 @mcp.tool()
 async def get_joke() -> str:
@@ -47,10 +86,8 @@ async def get_joke() -> str:
     Returns:
       - A simple two-line joke setup + punchline.
     """
-    data = await _get_json("https://official-joke-api.appspot.com/jokes/random")  # joke API
-    if not data or not isinstance(data, dict):  # validate
-        return "No jokes right now, sorry."  # fallback
-    return f"{data.get('setup','...')}\n{data.get('punchline','')}"  # two lines
+    joke = await JOKES.take()  # prefetched from /jokes/ten
+    return joke or "No jokes right now, sorry."  # fallback
 
 @mcp.tool()
 async def get_activity() -> str:
@@ -59,10 +96,10 @@ async def get_activity() -> str:
     Returns:
       - A random activity suggestion (from Bored API).
     """
-    data = await _get_json("https://www.boredapi.com/api/activity")  # bored API
-    if not data or not isinstance(data, dict):  # validate
-        return "Couldn't find an activity right now."  # fallback
-    return f"Try this: {data.get('activity','Something interesting')}"  # format
+    activity = await ACTIVITIES.take()  # prefetched activity suggestions
+    return activity or "Couldn't find an activity right now."  # fallback
+
+instrument_tools(mcp)  # trace and time every tool registered above
 
 # Start MCP server
 if __name__ == "__main__":  # only when run directly
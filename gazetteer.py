@@ -0,0 +1,325 @@
+# gazetteer.py
+# ---------------------------
+# Purpose:
+#   - Optional offline geocoder for weather_server.geocode, backed by a GeoNames cities dump
+#     (e.g. cities15000.txt / cities500.txt from https://download.geonames.org/export/dump/).
+#   - The dump is compiled once into a compact binary index (`<dump>.idx`) that is memory-mapped,
+#     so ~200k places cost a few MB of page cache instead of millions of Python objects.
+#   - Lookups: normalized exact match → name-prefix / fuzzy match, ranked by population.
+#     Optional ", qualifier" parts narrow the candidates: a country or admin1 code ("Austin, TX",
+#     "Paris, FR") or, when the GeoNames countryInfo.txt / admin1CodesASCII.txt files sit next
+#     to the dump, a country or admin1 name ("Paris, France", "Austin, Texas").
+#   - Configuration:
+#       PLUGGRAPH_GAZETTEER=/path/to/cities15000.txt   (unset = disabled, Nominatim only)
+#   - CLI:
+#       python gazetteer.py build cities15000.txt      # (re)compile the index
+#       python gazetteer.py lookup "San Francisco, CA"
+# ---------------------------
+
+import os
+import sys
+import mmap
+import math
+import struct
+import threading
+import unicodedata
+from difflib import SequenceMatcher
+from typing import List, Optional
+
+MAGIC = b"PGGAZ002"
+HEADER = struct.Struct("<8sIIII")     # magic, n_places, n_keys, n_qualifiers, strings_size
+PLACE = struct.Struct("<ffIII2s2x")    # lat, lon, population, name_off, admin1_off, country
+KEY = struct.Struct("<II")             # key string offset, place index
+QUALIFIER = struct.Struct("<II")       # normalized name offset, code offset ("FR" or "US.TX")
+
+# GeoNames companion files read from the dump's directory (same download site)
+COUNTRY_INFO = "countryInfo.txt"
+ADMIN1_CODES = "admin1CodesASCII.txt"
+
+FUZZY_MIN = 0.85        # minimum similarity for a fuzzy match to be trusted
+PREFIX_SCAN = 4000      # max index entries scanned for prefix / fuzzy candidates
+
+
+def normalize(text: str) -> str:
+    """Fold case and accents, keep only letters/digits separated by single spaces ("São Paulo" → "sao paulo")."""
+    text = unicodedata.normalize("NFKD", text)
+    out = []
+    for ch in text:
+        if unicodedata.combining(ch):
+            continue
+        out.append(ch.casefold() if ch.isalnum() else " ")
+    return " ".join("".join(out).split())
+
+
+# ---- build ----
+
+def companion_files(source: str) -> List[str]:
+    """The GeoNames country/admin1 name files next to `source` that exist."""
+    folder = os.path.dirname(os.path.abspath(source))
+    paths = [os.path.join(folder, name) for name in (COUNTRY_INFO, ADMIN1_CODES)]
+    return [p for p in paths if os.path.exists(p)]
+
+
+def _qualifier_names(source: str) -> set:
+    """(normalized name, code) pairs for country names ("france" → FR) and admin1 names ("texas" → US.TX)."""
+    pairs = set()
+    for path in companion_files(source):
+        admin1 = path.endswith(ADMIN1_CODES)
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("#"):
+                    continue
+                cols = line.rstrip("\n").split("\t")
+                if admin1 and len(cols) >= 3:      # US.TX  Texas  Texas  geonameid
+                    code, names = cols[0], cols[1:3]
+                elif not admin1 and len(cols) >= 5:  # FR  FRA  250  FR  France  ...
+                    code, names = cols[0], [cols[1], cols[4]]
+                else:
+                    continue
+                for name in names:
+                    key = normalize(name)
+                    if key:
+                        pairs.add((key, code.upper()))
+    return pairs
+
+
+def build_index(source: str, target: Optional[str] = None) -> str:
+    """Compile a GeoNames TSV dump into the binary index; returns the index path."""
+    target = target or source + ".idx"
+    strings = bytearray(b"\0")      # offset 0 is the empty string
+    offsets = {}
+
+    def intern(s: str) -> int:
+        off = offsets.get(s)
+        if off is None:
+            off = offsets[s] = len(strings)
+            strings.extend(s.encode("utf-8") + b"\0")
+        return off
+
+    places = bytearray()
+    keys = []
+    n_places = 0
+    with open(source, encoding="utf-8") as f:
+        for line in f:
+            cols = line.rstrip("\n").split("\t")
+            if len(cols) < 15:
+                continue
+            name, ascii_name, alternates = cols[1], cols[2], cols[3]
+            try:
+                lat, lon = float(cols[4]), float(cols[5])
+                population = int(cols[14] or 0)
+            except ValueError:
+                continue
+            country = cols[8][:2].upper().encode("ascii", "ignore").ljust(2)
+            places += PLACE.pack(lat, lon, min(population, 0xFFFFFFFF), intern(name), intern(cols[10]), country)
+            names = {normalize(name), normalize(ascii_name)}
+            for alt in alternates.split(","):
+                # alternate names also carry airport codes, URLs and postcodes; keep real names only
+                if len(alt) > 2 and not any(c.isdigit() for c in alt) and "://" not in alt:
+                    names.add(normalize(alt))
+            for key in names:
+                if key:
+                    keys.append((key.encode("utf-8"), n_places))
+            n_places += 1
+
+    keys.sort()
+    key_table = bytearray()
+    for key, idx in keys:
+        key_table += KEY.pack(intern(key.decode("utf-8")), idx)
+
+    qualifiers = sorted(_qualifier_names(source))
+    qualifier_table = bytearray()
+    for name, code in qualifiers:
+        qualifier_table += QUALIFIER.pack(intern(name), intern(code))
+
+    tmp = target + ".tmp"
+    with open(tmp, "wb") as out:
+        out.write(HEADER.pack(MAGIC, n_places, len(keys), len(qualifiers), len(strings)))
+        out.write(places)
+        out.write(key_table)
+        out.write(qualifier_table)
+        out.write(strings)
+    os.replace(tmp, target)  # atomic swap so readers never see a half-written index
+    return target
+
+
+# ---- lookup ----
+
+class Gazetteer:
+    """Read-only view over a memory-mapped index built by `build_index`."""
+
+    def __init__(self, index_path: str):
+        self._file = open(index_path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.n_places, self.n_keys, n_qualifiers, _ = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{index_path} is not a gazetteer index")
+        self._places = HEADER.size
+        self._keys = self._places + self.n_places * PLACE.size
+        qualifier_table = self._keys + self.n_keys * KEY.size
+        self._strings = qualifier_table + n_qualifiers * QUALIFIER.size
+        # A few thousand country/admin1 names: small enough to keep as a dict
+        self.qualifiers: dict = {}
+        for i in range(n_qualifiers):
+            name_off, code_off = QUALIFIER.unpack_from(self._mm, qualifier_table + i * QUALIFIER.size)
+            self.qualifiers.setdefault(self._string(name_off).decode("utf-8"), set()).add(
+                self._string(code_off).decode("utf-8"))
+
+    def close(self) -> None:
+        self._mm.close()
+        self._file.close()
+
+    def _string(self, off: int) -> bytes:
+        start = self._strings + off
+        return self._mm[start:self._mm.find(b"\0", start)]
+
+    def _key(self, i: int) -> tuple:
+        key_off, place = KEY.unpack_from(self._mm, self._keys + i * KEY.size)
+        return self._string(key_off), place
+
+    def _lower_bound(self, key: bytes) -> int:
+        lo, hi = 0, self.n_keys
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key(mid)[0] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _place(self, idx: int) -> dict:
+        lat, lon, population, name_off, admin1_off, country = PLACE.unpack_from(self._mm, self._places + idx * PLACE.size)
+        return {
+            "name": self._string(name_off).decode("utf-8"),
+            "admin1": self._string(admin1_off).decode("utf-8"),
+            "country_code": country.decode("ascii").strip(),
+            "latitude": round(lat, 5),
+            "longitude": round(lon, 5),
+            "population": population,
+        }
+
+    def search(self, query: str, limit: int = 5) -> List[dict]:
+        """Ranked candidates for "name[, qualifier...]"; each carries a `score` in [0, 1+]."""
+        name, *qualifiers = [part.strip() for part in query.split(",")]
+        key = normalize(name)
+        if not key:
+            return []
+        wanted = set()  # country codes, admin1 codes and "CC.ADMIN1" codes any of which may match
+        for q in qualifiers:
+            if q:
+                wanted.add(q.upper())
+                wanted.update(self.qualifiers.get(normalize(q), ()))
+        raw = key.encode("utf-8")
+
+        scores = {}
+        start = self._lower_bound(raw)
+        # Exact matches and whole-word prefixes ("new york" → "new york city") sit right after `start`
+        for i in range(start, min(start + PREFIX_SCAN, self.n_keys)):
+            k, place = self._key(i)
+            if not k.startswith(raw) or (k != raw and len(raw) < 4):
+                break
+            if k == raw:
+                score = 1.0
+            elif k[len(raw):len(raw) + 1] == b" " and len(raw) >= 4:
+                score = 0.9
+            else:
+                continue
+            scores[place] = max(scores.get(place, 0.0), score)
+
+        if not scores and len(raw) >= 4:
+            # Fuzzy pass over names sharing the first three characters (typos like "chenai")
+            stem = raw[:3]
+            first = self._lower_bound(stem)
+            for i in range(first, min(first + PREFIX_SCAN, self.n_keys)):
+                k, place = self._key(i)
+                if not k.startswith(stem):
+                    break
+                matcher = SequenceMatcher(None, raw, k)
+                if matcher.real_quick_ratio() < FUZZY_MIN or matcher.quick_ratio() < FUZZY_MIN:
+                    continue
+                ratio = matcher.ratio()
+                if ratio >= FUZZY_MIN:
+                    scores[place] = max(scores.get(place, 0.0), ratio)
+
+        results = []
+        for idx, score in scores.items():
+            place = self._place(idx)
+            country, admin1 = place["country_code"], place["admin1"].upper()
+            if wanted and not wanted & {country, admin1, f"{country}.{admin1}"}:
+                continue
+            # Population weighting: a 10M city outranks a 1k village with the same name
+            place["score"] = round(score + math.log10(place["population"] + 1) / 100, 4)
+            results.append(place)
+        results.sort(key=lambda p: (-p["score"], -p["population"]))
+        return results[:limit]
+
+    def lookup(self, query: str) -> Optional[dict]:
+        """Best match shaped like weather_server.geocode output, or None on a local miss."""
+        hits = self.search(query, limit=1)
+        if not hits:
+            return None
+        top = hits[0]
+        parts = [top["name"]]
+        if top["admin1"].isalpha():  # US/CA-style state codes read well; numeric admin codes do not
+            parts.append(top["admin1"])
+        parts.append(top["country_code"])
+        return {
+            "latitude": top["latitude"],
+            "longitude": top["longitude"],
+            "display_name": ", ".join(p for p in parts if p),
+            "country_code": top["country_code"],
+        }
+
+
+def _stale(source: str, index: str) -> bool:
+    """True when the index is missing, older than the dump or a name file, or from an older format."""
+    if not os.path.exists(index):
+        return True
+    built = os.path.getmtime(index)
+    if any(os.path.getmtime(p) > built for p in [source] + companion_files(source)):
+        return True
+    with open(index, "rb") as f:
+        return f.read(len(MAGIC)) != MAGIC
+
+
+_GAZETTEER: Optional[Gazetteer] = None
+_LOADED = False
+_LOCK = threading.Lock()
+
+
+def load_gazetteer() -> Optional[Gazetteer]:
+    """
+    Return the configured gazetteer (None when PLUGGRAPH_GAZETTEER is unset or unreadable).
+    Builds the index on first use when it is missing or older than the dump; blocking, so
+    async callers should run it in a thread.
+    """
+    global _GAZETTEER, _LOADED
+    with _LOCK:
+        if _LOADED:
+            return _GAZETTEER
+        _LOADED = True
+        source = os.getenv("PLUGGRAPH_GAZETTEER")
+        if not source:
+            return None
+        try:
+            index = source if source.endswith(".idx") else source + ".idx"
+            if index != source and _stale(source, index):
+                build_index(source, index)
+            _GAZETTEER = Gazetteer(index)
+        except (OSError, ValueError) as e:
+            print(f"gazetteer disabled: {e}", file=sys.stderr)  # stdout belongs to the MCP stdio stream
+            _GAZETTEER = None
+        return _GAZETTEER
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == "build":
+        print(build_index(sys.argv[2]))
+    elif len(sys.argv) == 3 and sys.argv[1] == "lookup":
+        gaz = load_gazetteer()
+        if gaz is None:
+            sys.exit("Set PLUGGRAPH_GAZETTEER to a GeoNames dump first.")
+        for hit in gaz.search(sys.argv[2]):
+            print(hit)
+    else:
+        sys.exit("usage: python gazetteer.py build <dump.txt> | lookup <place>")
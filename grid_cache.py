@@ -0,0 +1,132 @@
+# grid_cache.py
+# ---------------------------
+# Purpose:
+#   - Spatially snapped cache for point-based weather endpoints (forecast, warnings).
+#   - Open-Meteo serves model grid data, so 13.0827,80.2707 and 13.0830,80.2710 get the
+#     same answer; both are snapped to one grid cell and share one cached result.
+#   - Cells are indexed by integer (row, col) in a spatial hash, bounded by LRU, with a TTL.
+#   - Concurrent misses for the same cell are merged into a single upstream fetch, so the
+#     request rate scales with distinct cells rather than with users.
+#   - A cell's fetch runs to completion even if every caller waiting on it gives up (deadline,
+#     cancellation): it still fills the cell, and later callers join it instead of starting over.
+#   - Configuration:
+#       PLUGGRAPH_GRID_RES=0.05   cell size in degrees (~5 km at the equator)
+# ---------------------------
+
+import os
+import math
+import time
+import asyncio
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from single_flight import SingleFlight
+
+Cell = Tuple[int, int]
+
+DEFAULT_RESOLUTION = float(os.getenv("PLUGGRAPH_GRID_RES", "0.05"))
+
+
+class GridCache:
+    """TTL + LRU cache keyed by grid cell, with in-flight merging of misses per cell."""
+
+    def __init__(self, ttl: float, resolution: float = DEFAULT_RESOLUTION, max_cells: int = 4096):
+        self.ttl = ttl
+        self.resolution = resolution
+        self.max_cells = max_cells
+        self._cells: "OrderedDict[Cell, Tuple[float, Any]]" = OrderedDict()
+        self._flight = SingleFlight()
+        self._fills: Dict[Cell, asyncio.Task] = {}  # fetches that outlive their callers
+        self.hits = 0
+        self.misses = 0
+
+    # ---- geometry ----
+
+    def cell(self, latitude: float, longitude: float) -> Cell:
+        """Integer cell index containing the point."""
+        return (math.floor(latitude / self.resolution), math.floor(longitude / self.resolution))
+
+    def center(self, cell: Cell) -> Tuple[float, float]:
+        """Cell centre, rounded so the upstream request (and its cache key) is stable."""
+        digits = max(0, -math.floor(math.log10(self.resolution)) + 1)
+        lat = round((cell[0] + 0.5) * self.resolution, digits)
+        lon = round((cell[1] + 0.5) * self.resolution, digits)
+        return lat, lon
+
+    def snap(self, latitude: float, longitude: float) -> Tuple[float, float]:
+        return self.center(self.cell(latitude, longitude))
+
+    # ---- cache ----
+
+    def peek(self, latitude: float, longitude: float) -> Optional[Any]:
+        """Cached value for the point's cell, or None (counts as hit/miss)."""
+        cell = self.cell(latitude, longitude)
+        entry = self._cells.get(cell)
+        if entry is not None:
+            expires, value = entry
+            if expires > time.monotonic():
+                self._cells.move_to_end(cell)
+                self.hits += 1
+                return value
+            del self._cells[cell]
+        self.misses += 1
+        return None
+
+    def put(self, latitude: float, longitude: float, value: Any) -> None:
+        """Store a value for the point's cell (None, i.e. a failed fetch, is never cached)."""
+        if value is None:
+            return
+        cell = self.cell(latitude, longitude)
+        self._cells[cell] = (time.monotonic() + self.ttl, value)
+        self._cells.move_to_end(cell)
+        while len(self._cells) > self.max_cells:
+            self._cells.popitem(last=False)
+
+    async def get(self, latitude: float, longitude: float,
+                  fetch: Callable[[float, float], Awaitable[Any]]) -> Any:
+        """
+        Return the cell's value, calling `fetch(center_lat, center_lon)` on a miss.
+        Callers missing on the same cell at the same time await one shared fetch.
+        """
+        value = self.peek(latitude, longitude)
+        if value is not None:
+            return value
+        cell = self.cell(latitude, longitude)
+        # single-flight per cell for waiter accounting; the fill itself is shielded, so even the
+        # last caller hitting its deadline does not cancel it
+        return await self._flight.do(cell, lambda: asyncio.shield(self._fill_task(cell, fetch)))
+
+    def _fill_task(self, cell: Cell, fetch: Callable[[float, float], Awaitable[Any]]) -> asyncio.Task:
+        task = self._fills.get(cell)
+        if task is None:
+            task = self._fills[cell] = asyncio.ensure_future(self._fill(cell, fetch))
+            task.add_done_callback(lambda t, cell=cell: self._fill_done(cell, t))
+        return task
+
+    def _fill_done(self, cell: Cell, task: asyncio.Task) -> None:
+        if self._fills.get(cell) is task:
+            del self._fills[cell]
+        if not task.cancelled():
+            task.exception()  # mark retrieved so abandoned failures don't log warnings
+
+    async def _fill(self, cell: Cell, fetch: Callable[[float, float], Awaitable[Any]]) -> Any:
+        lat, lon = self.center(cell)
+        value = await fetch(lat, lon)
+        self.put(lat, lon, value)
+        return value
+
+    def clear(self) -> None:
+        for task in self._fills.values():
+            task.cancel()
+        self._fills.clear()
+        self._cells.clear()
+
+    def stats(self) -> dict:
+        return {
+            "resolution_deg": self.resolution,
+            "ttl": self.ttl,
+            "cells": len(self._cells),
+            "inflight": len(self._fills),
+            "hits": self.hits,
+            "misses": self.misses,
+            "merged": self._flight.coalesced,
+        }
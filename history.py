@@ -0,0 +1,194 @@
+# history.py
+# ---------------------------
+# Purpose:
+#   - Keep the ReAct agent's prompt within a token budget as a session grows.
+#   - Runs as LangGraph's `pre_model_hook` (before every LLM call) and rewrites the stored history:
+#       1) old tool outputs (e.g. full NWS alert descriptions) → short digests
+#       2) turns older than the recent window → folded into one rolling summary message
+#       3) if still over budget, tool outputs in recent (but not the current) turns → digests
+#     The latest `keep_turns` turns stay verbatim, and tool calls are never split from their results.
+#   - Records approximate prompt tokens before/after trimming for every model call.
+#   - Configuration:
+#       PLUGGRAPH_HISTORY_BUDGET=6000      prompt token budget
+#       PLUGGRAPH_HISTORY_KEEP_TURNS=3     recent turns kept verbatim
+#       PLUGGRAPH_TOOL_DIGEST_CHARS=400    characters kept from an old tool output
+#       PLUGGRAPH_SUMMARY_MODEL=gpt-4o-mini
+# ---------------------------
+
+import os
+import logging
+from collections import deque
+from typing import List, Optional
+
+from langchain_core.messages import (
+    AIMessage,
+    BaseMessage,
+    HumanMessage,
+    RemoveMessage,
+    SystemMessage,
+    ToolMessage,
+)
+from langchain_core.messages.utils import count_tokens_approximately
+from langgraph.graph.message import REMOVE_ALL_MESSAGES
+
+log = logging.getLogger("pluggraph.history")
+
+SUMMARY_ID = "history-summary"  # id of the rolling summary message kept at the head of the history
+SUMMARY_PREFIX = "Summary of the earlier conversation:\n"
+DIGEST_MARK = " …[trimmed]"
+MAX_PENDING_CALLS = 256  # per-call token stats kept until the next pop_turn_stats()
+
+SUMMARY_PROMPT = (
+    "You maintain a running summary of a chat between a user and an assistant that uses tools. "
+    "Update the summary with the new messages. Keep facts the user stated, their preferences and "
+    "instructions, places and results that may be referred to later. Be concise (under 200 words).\n\n"
+    "Current summary:\n{summary}\n\nNew messages:\n{transcript}"
+)
+
+
+def _text(message: BaseMessage) -> str:
+    """Plain text of a message (content may be a list of content blocks)."""
+    content = message.content
+    if isinstance(content, str):
+        return content
+    parts = []
+    for block in content:
+        if isinstance(block, str):
+            parts.append(block)
+        elif isinstance(block, dict) and block.get("type") == "text":
+            parts.append(block.get("text", ""))
+    return "\n".join(parts)
+
+
+def _split_turns(messages: List[BaseMessage]) -> List[List[BaseMessage]]:
+    """Group messages into turns, each starting at a HumanMessage (tool calls stay with their results)."""
+    turns: List[List[BaseMessage]] = []
+    for message in messages:
+        if isinstance(message, HumanMessage) or not turns:
+            turns.append([message])
+        else:
+            turns[-1].append(message)
+    return turns
+
+
+class HistoryManager:
+    """Token-budgeted trimming + rolling summarization, used as `create_react_agent(pre_model_hook=...)`."""
+
+    def __init__(self, budget: int = 6000, keep_turns: int = 3, digest_chars: int = 400, summarizer=None):
+        self.budget = budget
+        self.keep_turns = max(1, keep_turns)
+        self.digest_chars = digest_chars
+        self.summarizer = summarizer  # chat model for rolling summaries; None = extractive fallback
+        # (tokens_before, tokens_after) per model call since the last pop; bounded because headless
+        # runs (batch.py) never pop it
+        self._calls: deque = deque(maxlen=MAX_PENDING_CALLS)
+
+    # ---- helpers ----
+
+    @staticmethod
+    def count(messages: List[BaseMessage]) -> int:
+        return count_tokens_approximately(messages)
+
+    def _digest(self, message: BaseMessage) -> BaseMessage:
+        if not isinstance(message, ToolMessage):
+            return message
+        text = _text(message)
+        if len(text) <= self.digest_chars + len(DIGEST_MARK):
+            return message
+        short = " ".join(text[: self.digest_chars].split()) + DIGEST_MARK
+        return ToolMessage(content=short, tool_call_id=message.tool_call_id, name=message.name, id=message.id)
+
+    async def _summarize(self, summary: str, turns: List[List[BaseMessage]]) -> str:
+        lines = []
+        for message in (m for turn in turns for m in turn):
+            if isinstance(message, AIMessage) and message.tool_calls:
+                calls = ", ".join(f"{c['name']}({c['args']})" for c in message.tool_calls)
+                lines.append(f"assistant called: {calls}")
+            elif _text(message).strip():
+                role = {"human": "user", "ai": "assistant", "tool": "tool"}.get(message.type, message.type)
+                lines.append(f"{role}: {' '.join(_text(message).split())[: self.digest_chars]}")
+        transcript = "\n".join(lines)
+        if self.summarizer is not None:
+            try:
+                # Own config: the turn's stream callbacks must not see (or print) the summary tokens
+                reply = await self.summarizer.ainvoke(
+                    SUMMARY_PROMPT.format(summary=summary or "(none)", transcript=transcript),
+                    config={"callbacks": [], "tags": ["nostream"]},
+                )
+                return _text(reply).strip()
+            except Exception as e:  # summarization is best-effort; fall back to an extractive digest
+                log.warning("history summarization failed: %s", e)
+        # Extractive fallback: what the user asked and what the assistant concluded
+        kept = [line for line in [*summary.splitlines(), *lines] if line.startswith(("user:", "assistant:"))]
+        while len(kept) > 1 and sum(len(line) + 1 for line in kept) > self.digest_chars * 4:
+            kept.pop(0)  # oldest lines go first
+        return "\n".join(kept)
+
+    # ---- hook ----
+
+    async def pre_model_hook(self, state: dict) -> dict:
+        """LangGraph pre-model hook: return the (possibly rewritten) history for the next LLM call."""
+        messages: List[BaseMessage] = list(state["messages"])
+        before = self.count(messages)
+        if before <= self.budget:
+            self._record(before, before)
+            return {"llm_input_messages": messages}
+
+        summary = ""
+        if messages and isinstance(messages[0], SystemMessage) and messages[0].id == SUMMARY_ID:
+            summary = _text(messages.pop(0))[len(SUMMARY_PREFIX):]
+        turns = _split_turns(messages)
+        old, recent = turns[: -self.keep_turns], turns[-self.keep_turns:]
+
+        # 1) Digest verbose tool outputs in old turns
+        old = [[self._digest(m) for m in turn] for turn in old]
+        new = self._assemble(summary, old, recent)
+
+        # 2) Fold old turns into the rolling summary
+        if self.count(new) > self.budget and old:
+            summary = await self._summarize(summary, old)
+            old = []
+            new = self._assemble(summary, old, recent)
+
+        # 3) Digest tool outputs in recent turns too, except the turn in progress
+        if self.count(new) > self.budget:
+            recent = [[self._digest(m) for m in turn] for turn in recent[:-1]] + recent[-1:]
+            new = self._assemble(summary, old, recent)
+
+        after = self.count(new)
+        self._record(before, after)
+        # Overwrite the stored history so the checkpoint shrinks too
+        return {"messages": [RemoveMessage(id=REMOVE_ALL_MESSAGES), *new]}
+
+    @staticmethod
+    def _assemble(summary: str, old: List[List[BaseMessage]], recent: List[List[BaseMessage]]) -> List[BaseMessage]:
+        head = [SystemMessage(content=SUMMARY_PREFIX + summary, id=SUMMARY_ID)] if summary else []
+        return head + [m for turn in old + recent for m in turn]
+
+    # ---- stats ----
+
+    def _record(self, before: int, after: int) -> None:
+        self._calls.append((before, after))
+        log.info("prompt tokens ~%d → ~%d (budget %d)", before, after, self.budget)
+
+    def pop_turn_stats(self) -> Optional[dict]:
+        """Prompt-token counts for the model calls since the last pop (i.e. the last turn)."""
+        calls, self._calls = self._calls, deque(maxlen=MAX_PENDING_CALLS)
+        if not calls:
+            return None
+        return {
+            "model_calls": len(calls),
+            "prompt_tokens_before": max(b for b, _ in calls),
+            "prompt_tokens_after": max(a for _, a in calls),
+        }
+
+
+def history_from_env(summarizer_factory=None) -> HistoryManager:
+    """Build a HistoryManager from PLUGGRAPH_HISTORY_* settings; `summarizer_factory(model_name)` builds the summary LLM."""
+    model = os.getenv("PLUGGRAPH_SUMMARY_MODEL", "gpt-4o-mini")
+    return HistoryManager(
+        budget=int(os.getenv("PLUGGRAPH_HISTORY_BUDGET", "6000")),
+        keep_turns=int(os.getenv("PLUGGRAPH_HISTORY_KEEP_TURNS", "3")),
+        digest_chars=int(os.getenv("PLUGGRAPH_TOOL_DIGEST_CHARS", "400")),
+        summarizer=summarizer_factory(model) if summarizer_factory and model else None,
+    )
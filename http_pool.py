@@ -0,0 +1,510 @@
+# http_pool.py
+# ---------------------------
+# Purpose:
+#   - Shared HTTP layer used by every MCP server's `_get_json` helper.
+#   - Keeps one long-lived, pooled httpx.AsyncClient per upstream host instead of
+#     building a fresh client (new TCP + TLS handshake) for every tool call.
+#   - Features:
+#       - Keep-alive connection reuse, optional HTTP/2 (needs the `h2` package)
+#       - Configurable pool size and per-host timeouts
+#       - Pool hit/miss counters (reused connection vs. new handshake) per host
+#       - Optional TTL response cache (see response_cache.py) for `get_json(..., ttl=...)`
+#       - Single-flight coalescing of identical concurrent `get_json` calls (see single_flight.py)
+#       - Streaming `get_json_prefix`: keep the first N items of one array and stop reading the
+#         body there (see json_stream.py)
+#       - Per-host token buckets, priority queueing and Retry-After handling (see scheduler.py)
+#       - Per-host circuit breakers (fail fast while a host is down or slow) and optional
+#         hedged GETs after the host's p95 latency (see circuit_breaker.py)
+#       - Spans + Prometheus metrics per upstream request: host, status, bytes, cache hit/miss (tracing.py)
+#       - Clean shutdown through a FastMCP lifespan hook
+#   - Configuration (environment variables, all optional):
+#       PLUGGRAPH_HTTP2=1                   enable HTTP/2 when `h2` is installed
+#       PLUGGRAPH_POOL_SIZE=10              max connections per host
+#       PLUGGRAPH_POOL_KEEPALIVE=10         max idle keep-alive connections per host
+#       PLUGGRAPH_POOL_KEEPALIVE_EXPIRY=30  seconds an idle connection is kept
+#       PLUGGRAPH_HOST_TIMEOUTS="api.weather.gov=10,nominatim.openstreetmap.org=8"
+#       PLUGGRAPH_UPSTREAM_OVERRIDE=http://127.0.0.1:9100   send every request to one local server
+#                                           (bench_stub.py); the real host goes in X-Upstream-Host
+# ---------------------------
+
+import os
+import json
+import asyncio
+import httpx
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, Optional
+from time import monotonic
+from urllib.parse import urlsplit
+from response_cache import cache_key, get_cache
+from single_flight import SingleFlight
+from scheduler import DeadlineExceeded, Scheduler, parse_retry_after, scheduler_from_env
+from circuit_breaker import CircuitBreaker, LatencyWindow, breaker_settings_from_env
+from json_stream import read_prefix
+from tracing import METRICS, SIZE_BUCKETS, current_span, register_metrics, span
+
+try:  # HTTP/2 support is optional; httpx needs the `h2` package for it
+    import h2  # noqa: F401
+    HAS_H2 = True
+except ImportError:
+    HAS_H2 = False
+
+DEFAULT_TIMEOUT = 20.0
+
+# Request headers that change the response body; part of the single-flight key
+VARY_HEADERS = ("accept", "accept-language", "authorization")
+
+# Throttling responses that are retried after the host's Retry-After pause
+RETRY_STATUSES = (429, 503)
+MAX_RETRIES = 2
+RETRY_BACKOFF = 1.0  # seconds, doubled per attempt when no Retry-After is given
+
+
+def _env_flag(name: str, default: bool = False) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in {"1", "true", "yes", "on"}
+
+
+def _parse_host_timeouts(spec: str) -> dict:
+    """Parse "host=seconds,host=seconds" into a dict (bad entries are ignored)."""
+    out = {}
+    for part in spec.split(","):
+        host, _, seconds = part.partition("=")
+        try:
+            out[host.strip().lower()] = float(seconds)
+        except ValueError:
+            continue
+    return out
+
+
+class HostStats:
+    """Per-host counters: requests sent, pool hits (reused connection) and misses (new handshake)."""
+
+    __slots__ = ("requests", "hits", "misses", "errors")
+
+    def __init__(self):
+        self.requests = 0
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    def as_dict(self) -> dict:
+        return {"requests": self.requests, "hits": self.hits, "misses": self.misses, "errors": self.errors}
+
+
+class _OverrideTransport(httpx.AsyncBaseTransport):
+    """Send requests to a fixed origin (e.g. the benchmark stub), keeping the real host in a header."""
+
+    def __init__(self, target: str, inner: httpx.AsyncBaseTransport):
+        parts = urlsplit(target)
+        self.scheme, self.host, self.port = parts.scheme or "http", parts.hostname, parts.port
+        self.inner = inner
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        request.headers["X-Upstream-Host"] = request.url.host
+        request.url = request.url.copy_with(scheme=self.scheme, host=self.host, port=self.port)
+        return await self.inner.handle_async_request(request)
+
+    async def aclose(self) -> None:
+        await self.inner.aclose()
+
+
+class HttpPool:
+    """
+    Process-wide pool of httpx.AsyncClient objects, one per upstream origin.
+
+    Servers share a single instance through `get_pool()`; in a normal stdio deployment
+    that means one pool per server process.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = 10,
+        max_keepalive: int = 10,
+        keepalive_expiry: float = 30.0,
+        http2: bool = False,
+        default_timeout: float = DEFAULT_TIMEOUT,
+        host_timeouts: Optional[dict] = None,
+        scheduler: Optional[Scheduler] = None,
+        upstream_override: Optional[str] = None,
+        breaker: Optional[dict] = None,
+        hedge: bool = False,
+    ):
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.http2 = http2 and HAS_H2  # silently fall back to HTTP/1.1 without `h2`
+        self.default_timeout = default_timeout
+        self.host_timeouts = {k.lower(): v for k, v in (host_timeouts or {}).items()}
+        self._clients: dict[str, httpx.AsyncClient] = {}
+        self._stats: dict[str, HostStats] = {}
+        self._refs = 0
+        self.flight = SingleFlight()
+        self.scheduler = scheduler or Scheduler()
+        self.upstream_override = upstream_override
+        self.breaker_settings = breaker or {}
+        self.hedge = hedge
+        self._breakers: dict[str, CircuitBreaker] = {}
+        self._latency: dict[str, LatencyWindow] = {}
+
+    # ---- configuration ----
+
+    def configure_host(self, host: str, timeout: Optional[float] = None) -> None:
+        """Set a per-host timeout; values from PLUGGRAPH_HOST_TIMEOUTS are not overridden."""
+        host = host.lower()
+        if timeout is not None and host not in self.host_timeouts:
+            self.host_timeouts[host] = timeout
+
+    def timeout_for(self, host: str, timeout: Optional[float] = None) -> float:
+        """Resolve the timeout for a request: per-host setting, then caller value, then pool default."""
+        return self.host_timeouts.get(host.lower()) or timeout or self.default_timeout
+
+    # ---- clients ----
+
+    def client_for(self, url: str) -> httpx.AsyncClient:
+        """Return the long-lived client for the URL's origin, creating it on first use."""
+        parts = urlsplit(url)
+        origin = f"{parts.scheme}://{parts.netloc}".lower()
+        client = self._clients.get(origin)
+        if client is None or client.is_closed:
+            transport = None
+            if self.upstream_override:
+                inner = httpx.AsyncHTTPTransport(limits=self.limits, http2=self.http2)
+                transport = _OverrideTransport(self.upstream_override, inner)
+            client = httpx.AsyncClient(
+                limits=self.limits,
+                http2=self.http2,
+                timeout=self.timeout_for(parts.hostname or ""),
+                transport=transport,
+            )
+            self._clients[origin] = client
+        return client
+
+    def _stats_for(self, host: str) -> HostStats:
+        stats = self._stats.get(host)
+        if stats is None:
+            stats = self._stats[host] = HostStats()
+        return stats
+
+    def breaker_for(self, host: str) -> CircuitBreaker:
+        breaker = self._breakers.get(host)
+        if breaker is None:
+            breaker = self._breakers[host] = CircuitBreaker(host, **self.breaker_settings)
+        return breaker
+
+    def _latency_for(self, host: str) -> LatencyWindow:
+        window = self._latency.get(host)
+        if window is None:
+            window = self._latency[host] = LatencyWindow()
+        return window
+
+    def _record(self, breaker: CircuitBreaker, ok: bool, seconds: float) -> None:
+        before = breaker.state
+        breaker.record(ok, seconds)
+        if breaker.state != before:
+            METRICS.inc("pluggraph_breaker_transitions_total", {"host": breaker.host, "state": breaker.state})
+
+    async def get(self, url: str, params: Optional[dict] = None, headers: Optional[dict] = None,
+                  timeout: Optional[float] = None,
+                  consume: Optional[Callable[[httpx.Response], Awaitable[None]]] = None) -> httpx.Response:
+        """
+        GET through the pooled client for the URL's host; raises on network or HTTP errors.
+        With `consume`, a successful body is streamed: `consume(response)` reads as much of it
+        as it needs before the response is closed (streamed requests are not hedged).
+        Waits for the host's rate-limit token first, and on 429/503 honors Retry-After by
+        pausing the host and retrying while the request's deadline still allows it.
+        Raises CircuitOpen at once while the host's circuit breaker is open.
+        """
+        host = (urlsplit(url).hostname or "").lower()
+        budget = self.timeout_for(host, timeout)
+        deadline = monotonic() + budget
+        breaker = self.breaker_for(host)
+        for attempt in range(MAX_RETRIES + 1):
+            state = breaker.state
+            try:
+                breaker.before()
+            except Exception:
+                METRICS.inc("pluggraph_breaker_rejections_total", {"host": host})
+                raise
+            if breaker.state != state:
+                METRICS.inc("pluggraph_breaker_transitions_total", {"host": host, "state": breaker.state})
+            started, sent = monotonic(), None
+            try:
+                await self.scheduler.acquire(host, deadline=deadline)
+                sent = monotonic()
+                remaining = max(0.001, deadline - monotonic())
+                if consume is None:
+                    r = await self._send_hedged(host, url, params, headers, remaining)
+                else:
+                    r = await self._send(host, url, params, headers, remaining, consume)
+            except (asyncio.CancelledError, DeadlineExceeded):
+                elapsed = monotonic() - sent if sent is not None else 0.0
+                if breaker.slow and elapsed > breaker.slow:
+                    # Callers' own deadlines cut off most hanging requests: still a slow failure
+                    self._record(breaker, False, elapsed)
+                else:
+                    breaker.cancelled()  # no verdict: given up while queued or before it was slow
+                raise
+            except Exception:
+                self._record(breaker, False, monotonic() - started)
+                raise
+            self._record(breaker, r.status_code < 500, monotonic() - started)
+            if r.status_code in RETRY_STATUSES and attempt < MAX_RETRIES:
+                delay = parse_retry_after(r.headers.get("Retry-After"))
+                delay = RETRY_BACKOFF * (2 ** attempt) if delay is None else delay
+                self.scheduler.defer(host, delay)
+                if monotonic() + delay < deadline:
+                    continue  # re-queue behind the pause instead of surfacing the 429
+            if r.is_error:
+                self._stats_for(host).errors += 1
+            r.raise_for_status()
+            return r
+        raise AssertionError("unreachable")
+
+    async def _send_hedged(self, host: str, url: str, params: Optional[dict], headers: Optional[dict],
+                           timeout: float) -> httpx.Response:
+        """
+        `_send`, plus (with hedging on) a second copy of the GET if no answer has arrived after
+        the host's p95 latency; the first good response wins and the other is cancelled.
+        The hedge only goes out if the host's rate limit has a token free right now.
+        """
+        delay = self._latency_for(host).hedge_delay() if self.hedge else None
+        if delay is None or delay >= timeout:
+            return await self._send(host, url, params, headers, timeout)
+        primary = asyncio.ensure_future(self._send(host, url, params, headers, timeout))
+        hedge = None
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+            if done:
+                return primary.result()
+            try:
+                await self.scheduler.acquire(host, deadline=monotonic())
+            except DeadlineExceeded:
+                return await primary
+            hedge = asyncio.ensure_future(self._send(host, url, params, headers, max(0.001, timeout - delay)))
+            pending = {primary, hedge}
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None and task.result().status_code < 500:
+                        winner = "hedge" if task is hedge else "primary"
+                        METRICS.inc("pluggraph_hedged_requests_total", {"host": host, "winner": winner})
+                        return task.result()
+            # Both copies failed: surface the primary's outcome
+            METRICS.inc("pluggraph_hedged_requests_total", {"host": host, "winner": "none"})
+            return primary.result()
+        finally:
+            for task in (primary, hedge):
+                if task is not None and not task.done():
+                    task.cancel()
+
+    async def _send(self, host: str, url: str, params: Optional[dict], headers: Optional[dict],
+                    timeout: float, consume: Optional[Callable[[httpx.Response], Awaitable[None]]] = None,
+                    ) -> httpx.Response:
+        """One request on the pooled client, counting pool hits/misses."""
+        stats = self._stats_for(host)
+        new_connection = False
+
+        async def trace(event: str, info: dict) -> None:
+            # httpcore only opens a TCP connection when no idle pooled one is available
+            nonlocal new_connection
+            if event == "connection.connect_tcp.started":
+                new_connection = True
+
+        stats.requests += 1
+        status = "error"
+        with span(f"GET {host}", "client", **{"server.address": host, "url.path": urlsplit(url).path}) as s:
+            try:
+                client = self.client_for(url)
+                if consume is None:
+                    r = await client.get(
+                        url,
+                        params=params,
+                        headers=headers,
+                        timeout=timeout,
+                        extensions={"trace": trace},
+                    )
+                    size = len(r.content)
+                else:
+                    async with client.stream("GET", url, params=params, headers=headers, timeout=timeout,
+                                             extensions={"trace": trace}) as r:
+                        if r.is_error:
+                            await r.aread()
+                        else:
+                            await consume(r)
+                        # A body left unread closes its connection instead of returning it to the pool
+                        s.set("pluggraph.body_complete", r.is_stream_consumed)
+                        size = r.num_bytes_downloaded
+                status = str(r.status_code)
+                s.set("http.response.status_code", r.status_code)
+                s.set("http.response.body.size", size)
+                METRICS.observe("pluggraph_upstream_response_bytes", {"host": host}, size, SIZE_BUCKETS)
+                if r.is_error:
+                    s.fail(f"HTTP {r.status_code}")
+                else:
+                    self._latency_for(host).observe(s.duration)
+                return r
+            except Exception:
+                stats.errors += 1
+                raise
+            finally:
+                s.set("pluggraph.connection_reused", not new_connection)
+                METRICS.observe("pluggraph_upstream_duration_seconds", {"host": host}, s.duration)
+                METRICS.inc("pluggraph_upstream_requests_total", {"host": host, "status": status})
+                if new_connection:
+                    stats.misses += 1
+                else:
+                    stats.hits += 1
+
+    async def get_json(self, url: str, params: Optional[dict] = None, headers: Optional[dict] = None,
+                       timeout: Optional[float] = None, ttl: Optional[float] = None) -> Optional[Any]:
+        """
+        GET and parse JSON; returns None on any network, HTTP or decode error.
+        With `ttl` (seconds) successful responses are served from the shared response cache.
+        Identical concurrent calls share one upstream request; each caller keeps its own timeout.
+        """
+        return await self._get_cached(cache_key(url, params), url, headers, timeout, ttl,
+                                      lambda: self._fetch_json(url, params, headers, timeout))
+
+    async def get_json_prefix(self, url: str, path: str = "", limit: int = 10, params: Optional[dict] = None,
+                              headers: Optional[dict] = None, timeout: Optional[float] = None,
+                              ttl: Optional[float] = None) -> Optional[Any]:
+        """
+        Like get_json for large bodies where only the first `limit` items of one array matter:
+        the body is parsed while it streams in and reading stops once they are collected.
+        `path` names the array by dot-separated object keys ("features"; "" = top-level array).
+        Returns the document with that array cut to `limit` items; keys after it are not read.
+        """
+        key = f"{cache_key(url, params)}#{path}[:{limit}]"
+        return await self._get_cached(key, url, headers, timeout, ttl,
+                                      lambda: self._fetch_prefix(url, path, limit, params, headers, timeout))
+
+    async def _get_cached(self, key: str, url: str, headers: Optional[dict], timeout: Optional[float],
+                          ttl: Optional[float], fetch: Callable[[], Awaitable[Any]]) -> Optional[Any]:
+        """Response cache, then single-flight around `fetch`; None on any error."""
+        host = urlsplit(url).hostname or ""
+        if ttl:
+            found, value = get_cache().get(key)
+            METRICS.inc("pluggraph_cache_lookups_total", {"host": host, "result": "hit" if found else "miss"})
+            parent = current_span()
+            if parent is not None:
+                parent.set(f"pluggraph.cache.{host}", "hit" if found else "miss")
+            if found:
+                return value
+        vary = tuple((h, v) for h, v in sorted((headers or {}).items(), key=lambda kv: kv[0].lower())
+                     if h.lower() in VARY_HEADERS)
+        try:
+            data = await self.flight.do((key, vary), fetch, timeout=self.timeout_for(host, timeout))
+        except Exception:
+            return None
+        if ttl:
+            get_cache().put(key, data, ttl)
+        return data
+
+    async def _fetch_json(self, url: str, params: Optional[dict], headers: Optional[dict],
+                          timeout: Optional[float]) -> Any:
+        r = await self.get(url, params=params, headers=headers, timeout=timeout)
+        return r.json()
+
+    async def _fetch_prefix(self, url: str, path: str, limit: int, params: Optional[dict],
+                            headers: Optional[dict], timeout: Optional[float]) -> Any:
+        parsed = {}
+
+        async def consume(r: httpx.Response) -> None:
+            parsed["data"] = await read_prefix(r.aiter_bytes(), path, limit)
+
+        await self.get(url, params=params, headers=headers, timeout=timeout, consume=consume)
+        return parsed["data"]
+
+    # ---- stats ----
+
+    def stats(self) -> dict:
+        """Pool hit/miss counters per host plus totals."""
+        hosts = {host: s.as_dict() for host, s in sorted(self._stats.items())}
+        totals = HostStats()
+        for s in self._stats.values():
+            totals.requests += s.requests
+            totals.hits += s.hits
+            totals.misses += s.misses
+            totals.errors += s.errors
+        return {
+            "http2": self.http2,
+            "open_clients": sum(1 for c in self._clients.values() if not c.is_closed),
+            "totals": totals.as_dict(),
+            "singleflight": self.flight.stats(),
+            "scheduler": self.scheduler.stats(),
+            "breakers": {host: b.stats() for host, b in sorted(self._breakers.items())},
+            "hedging": {
+                "enabled": self.hedge,
+                "delay": {host: w.hedge_delay() for host, w in sorted(self._latency.items())},
+            },
+            "hosts": hosts,
+        }
+
+    # ---- lifecycle ----
+
+    def retain(self) -> None:
+        self._refs += 1
+
+    async def release(self) -> None:
+        """Drop one reference; the pool closes its clients when the last user is gone."""
+        self._refs = max(0, self._refs - 1)
+        if self._refs == 0:
+            await self.aclose()
+
+    async def aclose(self) -> None:
+        """Close every pooled client (idle connections are shut down cleanly)."""
+        clients, self._clients = list(self._clients.values()), {}
+        for client in clients:
+            await client.aclose()
+
+
+_POOL: Optional[HttpPool] = None
+
+
+def get_pool() -> HttpPool:
+    """Return the process-wide pool, building it from environment settings on first use."""
+    global _POOL
+    if _POOL is None:
+        _POOL = HttpPool(
+            max_connections=int(os.getenv("PLUGGRAPH_POOL_SIZE", "10")),
+            max_keepalive=int(os.getenv("PLUGGRAPH_POOL_KEEPALIVE", "10")),
+            keepalive_expiry=float(os.getenv("PLUGGRAPH_POOL_KEEPALIVE_EXPIRY", "30")),
+            http2=_env_flag("PLUGGRAPH_HTTP2"),
+            host_timeouts=_parse_host_timeouts(os.getenv("PLUGGRAPH_HOST_TIMEOUTS", "")),
+            scheduler=scheduler_from_env(),
+            upstream_override=os.getenv("PLUGGRAPH_UPSTREAM_OVERRIDE") or None,
+            breaker=breaker_settings_from_env(),
+            hedge=_env_flag("PLUGGRAPH_HEDGE"),
+        )
+    return _POOL
+
+
+@asynccontextmanager
+async def lifespan(server):
+    """FastMCP lifespan hook: keep the shared pool open while the server runs, close it on shutdown."""
+    pool = get_pool()
+    pool.retain()
+    try:
+        yield {}
+    finally:
+        await pool.release()
+
+
+def register_stats(mcp) -> None:
+    """Expose the shared HTTP layer's counters as the `stats://http` and `stats://cache` MCP resources
+    (plus `metrics://prometheus`)."""
+    register_metrics(mcp)
+
+    @mcp.resource("stats://http", name="http_stats", mime_type="application/json")
+    def http_stats() -> str:
+        """Upstream HTTP pool statistics (per-host requests, pool hits/misses, errors)."""
+        return json.dumps(get_pool().stats(), indent=2)
+
+    @mcp.resource("stats://cache", name="cache_stats", mime_type="application/json")
+    def cache_stats() -> str:
+        """Response cache statistics (entries, hits, misses, evictions, hit ratio)."""
+        return json.dumps(get_cache().stats(), indent=2)
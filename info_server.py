@@ -5,30 +5,66 @@
 #       1) search_universities(country, name?) -> list basic matches (Hipolabs Universities API).
 #       2) country_info(query) -> basic country facts (REST Countries).
 #       3) image_of(query) -> first image URL from Wikipedia/Wikimedia.
+#       4) images_of(queries) -> image URLs for many titles in one multi-title request.
+#   - search_universities answers from a local, indexed copy of the dataset when
+#     PLUGGRAPH_UNIVERSITIES is set (see universities.py), and from the API otherwise.
+#   - country_info answers from an in-memory countries snapshot when PLUGGRAPH_COUNTRIES is
+#     set (see countries.py); the snapshot is loaded at startup and refreshed in the background.
 # ---------------------------
 
-import httpx  # async HTTP client
+import asyncio  # concurrent fallback searches
+from contextlib import asynccontextmanager  # lifespan helper
 from typing import Optional, List  # typing helpers
 from mcp.server.fastmcp import FastMCP  # MCP server helper
+from http_pool import get_pool, lifespan, register_stats  # shared pooled HTTP layer
+from response_cache import get_cache  # image results cached by normalized query
+from tracing import instrument_tools  # spans + latency metrics for every tool
+from universities import university_index  # optional local universities index
+from countries import country_snapshot  # optional local countries snapshot
 
-# Instantiate the MCP server
-mcp = FastMCP("info")  # server name
+@asynccontextmanager
+async def info_lifespan(server):
+    """HTTP pool lifespan, plus load the countries snapshot before the first tool call."""
+    async with lifespan(server) as state:
+        await country_snapshot()  # no-op unless PLUGGRAPH_COUNTRIES is set
+        yield state
+
+# Instantiate the MCP server; the lifespan closes pooled connections on shutdown
+mcp = FastMCP("info", lifespan=info_lifespan)  # server name
+register_stats(mcp)  # expose pool hit/miss counters as a resource
+
+# Response cache TTLs (seconds); this data changes rarely
+UNIVERSITIES_TTL = 24 * 3600  # university lists
+COUNTRY_TTL = 24 * 3600  # country facts
+IMAGE_TTL = 24 * 3600  # Wikipedia search + page images
+IMAGE_MISS_TTL = 3600  # "No image found." answers (negative cache)
+
+WIKIPEDIA_API = "https://en.wikipedia.org/w/api.php"
+NO_IMAGE = "No image found."
+IMAGE_BATCH = 50  # titles per multi-title request (MediaWiki limit for normal clients)
 
 # Generic JSON helper
-async def _get_json(url: str, params: Optional[dict] = None, headers: Optional[dict] = None, timeout: float = 20.0):
+async def _get_json(url: str, params: Optional[dict] = None, headers: Optional[dict] = None, timeout: float = 20.0,
+                    ttl: Optional[float] = None):
     """
     Helper to GET JSON with basic error handling and optional headers.
+    Responses are cached for `ttl` seconds when given.
     """
     hdrs = {"User-Agent": "mcp-info/1.0"}  # polite UA
     if headers:  # merge any custom headers
         hdrs.update(headers)  # update dict
-    async with httpx.AsyncClient(timeout=timeout) as client:  # client
-        try:  # request
-            r = await client.get(url, params=params, headers=hdrs)  # GET
-            r.raise_for_status()  # error on 4xx/5xx
-            return r.json()  # parse JSON
-        except Exception:  # swallow errors
-            return None  # indicate failure
+    # Reuse the long-lived per-host client (keep-alive); returns None on any error
+    return await get_pool().get_json(url, params=params, headers=hdrs, timeout=timeout, ttl=ttl)
+
+# Streaming variant for big lists
+async def _get_json_prefix(url: str, path: str, limit: int, params: Optional[dict] = None,
+                           timeout: float = 20.0, ttl: Optional[float] = None):
+    """
+    Like _get_json, but the body is parsed while it arrives and reading stops after `limit`
+    items of the array at `path` ("" = the top-level list).
+    """
+    hdrs = {"User-Agent": "mcp-info/1.0"}  # polite UA
+    return await get_pool().get_json_prefix(url, path, limit, params=params, headers=hdrs, timeout=timeout, ttl=ttl)
 
 @mcp.tool()
 async def search_universities(country: str, name: str = "") -> List[dict]:
@@ -40,10 +76,16 @@ async def search_universities(country: str, name: str = "") -> List[dict]:
     Returns:
       - list of dicts with {name, country, web_pages[0]} truncated to top few results
     """
+    index = await university_index()  # None unless a local copy is configured and synced
+    if index is not None:
+        hits = index.search(country, name, limit=5)  # ranked; only the top five are built
+        if hits is not None:  # None = country not in the local copy → ask the API
+            return hits
     params = {"country": country}  # mandatory param
     if name:  # if filter present
         params["name"] = name  # add name filter
-    data = await _get_json("http://universities.hipolabs.com/search", params=params)  # call API
+    # Large countries return thousands of entries; stop reading after the five we keep
+    data = await _get_json_prefix("http://universities.hipolabs.com/search", "", 5, params=params, ttl=UNIVERSITIES_TTL)  # call API
     if not data or not isinstance(data, list):  # validate
         return []  # empty list on failure
     # Return top 5 simplified entries
@@ -65,7 +107,11 @@ async def country_info(query: str) -> dict:
     Returns:
       - basic facts: official name, capital, population, region, currencies, languages.
     """
-    data = await _get_json(f"https://restcountries.com/v3.1/name/{query}", params={"fullText": "false"})  # call API
+    snapshot = await country_snapshot()  # None unless a local snapshot is configured and present
+    if snapshot is not None:
+        found = snapshot.find(query)  # names, codes, spellings, demonyms; typo-tolerant
+        return found if found is not None else {"error": "Country not found."}  # same payload as the API path
+    data = await _get_json(f"https://restcountries.com/v3.1/name/{query}", params={"fullText": "false"}, ttl=COUNTRY_TTL)  # call API
     if not data or not isinstance(data, list):  # validate
         return {"error": "Country not found."}  # error payload
     c = data[0]  # take first match
@@ -79,6 +125,22 @@ async def country_info(query: str) -> dict:
         "languages": list((c.get("languages") or {}).values())
     }  # summary
 
+def _image_key(query: str) -> str:
+    """Cache key for an image lookup: case- and whitespace-insensitive query."""
+    return "image_of:" + " ".join(query.casefold().split())
+
+def _thumbnails(data) -> List[dict]:
+    """Pages of a pageimages response (formatversion 1 dict or 2 list), in search rank order."""
+    pages = ((data or {}).get("query") or {}).get("pages") or []
+    if isinstance(pages, dict):  # formatversion=1 keys pages by id
+        pages = list(pages.values())
+    return sorted((p for p in pages if isinstance(p, dict)), key=lambda p: p.get("index", 0))
+
+def _remember_image(query: str, url: Optional[str]) -> str:
+    """Cache a result (misses too, for a shorter time) and return the tool's answer."""
+    get_cache().put(_image_key(query), url, IMAGE_TTL if url else IMAGE_MISS_TTL)
+    return url or NO_IMAGE
+
 @mcp.tool()
 async def image_of(query: str) -> str:
     """
@@ -88,34 +150,85 @@ async def image_of(query: str) -> str:
     Returns:
       - A single best-effort image URL (thumbnail) or a message if not found.
     """
-    # First, use Wikipedia search API to get a page ID for the query
-    search = await _get_json(
-        "https://en.wikipedia.org/w/api.php",
-        params={"action": "query", "list": "search", "srsearch": query, "format": "json"}  # search params
-    )  # call API
-    if not search or not search.get("query", {}).get("search"):  # no results
-        return "No image found."  # fallback
-    page_title = search["query"]["search"][0]["title"]  # top page title
-    # Then, request page image (thumbnail) via another API call
-    page = await _get_json(
-        "https://en.wikipedia.org/w/api.php",
+    found, cached = get_cache().get(_image_key(query))  # normalized-query cache, misses included
+    if found:
+        return cached or NO_IMAGE
+    # One round-trip: full-text search as the page generator, thumbnails as the page property
+    data = await _get_json(
+        WIKIPEDIA_API,
         params={
             "action": "query",
+            "generator": "search",
+            "gsrsearch": query,
+            "gsrlimit": 3,  # best-ranked of the top three that has an image
             "prop": "pageimages",
             "piprop": "thumbnail",
             "pithumbsize": 600,
-            "titles": page_title,
-            "format": "json"
-        }  # image params
+            "format": "json",
+            "formatversion": 2,
+        },
     )  # call API
-    # Parse the thumbnail URL from the response
-    pages = (page or {}).get("query", {}).get("pages", {})  # pages dict keyed by pageid
-    for _, v in pages.items():  # iterate pages
-        thumb = v.get("thumbnail", {})  # thumb dict
-        if "source" in thumb:  # if URL exists
-            return thumb["source"]  # return image URL
-    # If no thumbnail found, say so
-    return "No image found."  # fallback
+    if data is None:  # network/HTTP error: answer, but do not cache the miss
+        return NO_IMAGE
+    for page in _thumbnails(data):  # pages in search rank order
+        source = (page.get("thumbnail") or {}).get("source")
+        if source:  # if URL exists
+            return _remember_image(query, source)  # return image URL
+    return _remember_image(query, None)  # nothing found: negative cache
+
+@mcp.tool()
+async def images_of(queries: List[str]) -> dict:
+    """
+    Tool: images_of
+    Args:
+      - queries: page titles (e.g., ["Eiffel Tower", "Mount Fuji"])
+    Returns:
+      - {query: image URL or "No image found."}; titles are resolved together in one request
+        (following redirects), and only queries that are not page titles fall back to a search.
+    """
+    results, pending = {}, []
+    for query in dict.fromkeys(q for q in queries if q and q.strip()):  # unique, in order
+        found, cached = get_cache().get(_image_key(query))
+        if found:
+            results[query] = cached or NO_IMAGE
+        else:
+            pending.append(query)
+    unresolved = []
+    for start in range(0, len(pending), IMAGE_BATCH):
+        batch = pending[start:start + IMAGE_BATCH]
+        data = await _get_json(
+            WIKIPEDIA_API,
+            params={
+                "action": "query",
+                "titles": "|".join(batch),
+                "redirects": 1,
+                "prop": "pageimages",
+                "piprop": "thumbnail",
+                "pithumbsize": 600,
+                "format": "json",
+                "formatversion": 2,
+            },
+        )  # one multi-title call
+        info = (data or {}).get("query") or {}
+        # Follow title normalization ("eiffel tower" → "Eiffel tower") and redirects to the page title
+        renames = {r.get("from"): r.get("to") for r in (info.get("normalized") or []) + (info.get("redirects") or [])}
+        thumbs = {p.get("title"): (p.get("thumbnail") or {}).get("source") for p in _thumbnails(data)}
+        for query in batch:
+            title = query
+            for _ in range(3):  # normalized → redirect target
+                if title not in renames:
+                    break
+                title = renames[title]
+            if thumbs.get(title):
+                results[query] = _remember_image(query, thumbs[title])
+            else:
+                unresolved.append(query)  # not a page title (or no image on it): search instead
+    if unresolved:
+        for query, url in zip(unresolved, await asyncio.gather(*(image_of(q) for q in unresolved))):
+            results[query] = url
+    return {query: results[query] for query in dict.fromkeys(q for q in queries if q and q.strip())}
+
+instrument_tools(mcp)  # trace and time every tool registered above
 
 # Start MCP server
 if __name__ == "__main__":  # entrypoint guard
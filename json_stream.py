@@ -0,0 +1,181 @@
+# json_stream.py
+# ---------------------------
+# Purpose:
+#   - Incremental "prefix" parsing for large upstream JSON bodies where a tool keeps only the
+#     first few items of one array (DuckDuckGo `RelatedTopics`, the Hipolabs university list).
+#   - PrefixParser is fed bytes as they arrive. It walks down a dot-separated path of object
+#     keys ("RelatedTopics", "" = the top-level array), keeps the values of keys it passes on the
+#     way, collects up to `limit` array items and then reports done, so the caller can stop
+#     reading the body.
+#   - Values are decoded with json's C-accelerated raw_decode; a value cut off by a chunk
+#     boundary is retried only once the buffer has doubled, so parsing stays linear.
+#   - The result is the document with the array cut to `limit` items; keys after the array
+#     are never read (http_pool.get_json_prefix).
+# ---------------------------
+
+import json
+import codecs
+from typing import Any, AsyncIterator, List
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = " \t\n\r"
+
+TRIM_AT = 1 << 16  # drop consumed text from the buffer once this much has piled up
+
+
+class _NeedMore(Exception):
+    """The buffer ends inside the next token; feed more bytes."""
+
+
+class PrefixParser:
+    """Push parser that collects the first `limit` items of the array at `path`."""
+
+    def __init__(self, path: str = "", limit: int = 10):
+        self.keys: List[str] = [k for k in path.split(".") if k]
+        self.limit = limit
+        self.done = False
+        self.truncated = False      # stopped before the end of the array
+        self._text = codecs.getincrementaldecoder("utf-8")()
+        self._buf = ""
+        self._pos = 0
+        self._final = False
+        self._retry_len = 0         # buffer length at which a failed raw_decode is retried
+        self._root: Any = None
+        self._container: Any = None  # object whose keys are being read, or the target array
+        self._depth = 0              # path keys descended so far
+        self._state = "value"        # value | key | items
+
+    # ---- input ----
+
+    def feed(self, data: bytes) -> bool:
+        """Add bytes; returns True once the result is complete."""
+        if self.done:
+            return True
+        self._buf += self._text.decode(data)
+        if len(self._buf) >= self._retry_len:
+            self._run()
+        return self.done
+
+    def close(self) -> Any:
+        """End of body: finish parsing and return the (possibly truncated) document."""
+        if not self.done:
+            self._buf += self._text.decode(b"", final=True)
+            self._final = True
+            self._run()
+            if not self.done:
+                raise ValueError("JSON body ended early")
+        return self._root
+
+    def result(self) -> Any:
+        return self._root
+
+    # ---- parsing ----
+
+    def _run(self) -> None:
+        try:
+            while not self.done:
+                getattr(self, f"_{self._state}")()
+        except _NeedMore:
+            pass
+        if self._pos > TRIM_AT:
+            consumed = self._pos
+            self._buf, self._pos = self._buf[consumed:], 0
+            self._retry_len = max(0, self._retry_len - consumed)
+
+    def _peek(self) -> str:
+        buf, pos = self._buf, self._pos
+        while pos < len(buf) and buf[pos] in _WHITESPACE:
+            pos += 1
+        self._pos = pos
+        if pos >= len(buf):
+            if self._final:
+                raise ValueError("JSON body ended early")
+            raise _NeedMore
+        return buf[pos]
+
+    def _decode(self) -> Any:
+        """Decode one complete value at the cursor (strings, numbers, objects, ...)."""
+        start = self._peek()
+        try:
+            value, end = _decoder.raw_decode(self._buf, self._pos)
+        except json.JSONDecodeError:
+            if self._final:
+                raise ValueError("invalid JSON in upstream body") from None
+            # Probably cut off mid-value: wait until the unread part has doubled before retrying
+            self._retry_len = len(self._buf) + (len(self._buf) - self._pos)
+            raise _NeedMore
+        if end == len(self._buf) and not self._final and (start == "-" or start.isdigit()):
+            raise _NeedMore  # "12" may still become "123"
+        self._pos = end
+        self._retry_len = 0
+        return value
+
+    def _value(self) -> None:
+        ch = self._peek()
+        want_array = self._depth == len(self.keys)
+        if want_array and ch == "[":
+            self._pos += 1
+            items: list = []
+            self._set_child(items)
+            self._container, self._state = items, "items"
+        elif not want_array and ch == "{":
+            self._pos += 1
+            obj: dict = {}
+            self._set_child(obj)
+            self._container, self._state = obj, "key"
+        else:
+            # The path does not match the document's shape: keep the whole value as-is
+            self._set_child(self._decode())
+            self.done = True
+
+    def _set_child(self, value: Any) -> None:
+        if self._container is None:
+            self._root = value
+        else:
+            self._container[self.keys[self._depth - 1]] = value
+
+    def _key(self) -> None:
+        ch = self._peek()
+        if ch == "}":  # object ended without the path key
+            self._pos += 1
+            self.done = True
+            return
+        if ch == ",":
+            self._pos += 1
+        mark = self._pos
+        try:
+            key = self._decode()
+            if self._peek() != ":":
+                raise ValueError("invalid JSON object in upstream body")
+            self._pos += 1
+            if key == self.keys[self._depth]:
+                self._depth += 1
+                self._state = "value"
+                return
+            self._container[key] = self._decode()  # a key before the path: keep its value
+        except _NeedMore:
+            self._pos = mark  # re-read the key together with its value
+            raise
+
+    def _items(self) -> None:
+        ch = self._peek()
+        if ch == "]":
+            self._pos += 1
+            self.done = True
+            return
+        if ch == "," and self._container:
+            self._pos += 1
+        item = self._decode()
+        self._container.append(item)
+        if len(self._container) >= self.limit:
+            self.truncated = True
+            self.done = True
+
+
+async def read_prefix(chunks: AsyncIterator[bytes], path: str = "", limit: int = 10) -> Any:
+    """Parse an async byte stream, stopping as soon as `limit` items at `path` are collected."""
+    parser = PrefixParser(path, limit)
+    async for chunk in chunks:
+        if parser.feed(chunk):
+            return parser.result()
+    return parser.close()
@@ -0,0 +1,255 @@
+# lazy_tools.py
+# ---------------------------
+# Purpose:
+#   - Fast agent startup: tool schemas come from an on-disk manifest instead of a handshake
+#     with every MCP server, so time to the first prompt does not grow with the server count.
+#   - Each manifest entry is keyed by a sha256 of the server file (+ its connection config);
+#     editing a server invalidates only that server's entry, which is refreshed on next start.
+#   - A server process is spawned the first time one of its tools is called and then kept
+#     for the rest of the session (optionally warmed in the background right after startup).
+#   - Connections use the usual langchain-mcp-adapters configs (stdio, http, ...) or
+#     {"transport": "in_process", "module": "weather_server"}: the server module is imported and
+#     mounted in this process behind an in-memory transport (no subprocess, no stdio pipe),
+#     sharing this process's event loop and HTTP pool.
+#   - Remote connections (e.g. streamable_http to serve.py) may carry a "source" path: the local
+#     server file whose hash invalidates the manifest entry. It is not passed to the transport.
+#   - Configuration:
+#       PLUGGRAPH_TOOL_MANIFEST=.pluggraph_tools.json   manifest path
+#       PLUGGRAPH_WARM_SERVERS=0                         1 = spawn all servers in the background
+# ---------------------------
+
+import os
+import json
+import asyncio
+import hashlib
+import logging
+import importlib
+import importlib.util
+from typing import Dict, List, Optional
+
+from mcp import ClientSession
+from mcp.types import Tool as MCPTool
+from mcp.shared.memory import create_connected_server_and_client_session
+from langchain_core.tools import BaseTool
+from langchain_mcp_adapters.sessions import create_session
+from mcp.client.stdio import get_default_environment
+from tracing import span
+from langchain_mcp_adapters.tools import convert_mcp_tool_to_langchain_tool
+
+log = logging.getLogger("pluggraph.tools")
+
+DEFAULT_MANIFEST = ".pluggraph_tools.json"
+
+IN_PROCESS = "in_process"
+
+
+def _server_file(connection: dict) -> Optional[str]:
+    """Source file of the server: "source", the in-process module, or the first existing path in args."""
+    if connection.get("source"):
+        return connection["source"]
+    if connection.get("transport") == IN_PROCESS:
+        spec = importlib.util.find_spec(connection["module"])  # locates the file without importing it
+        return spec.origin if spec else None
+    for arg in connection.get("args", []):
+        path = os.path.join(connection.get("cwd") or "", arg)
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+def server_fingerprint(connection: dict) -> str:
+    """sha256 of the server's source file and its connection config."""
+    digest = hashlib.sha256(json.dumps(connection, sort_keys=True, default=str).encode())
+    path = _server_file(connection)
+    if path and os.path.isfile(path):
+        with open(path, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def _connect(connection: dict):
+    """Async context manager yielding an initialized ClientSession for the connection."""
+    if connection.get("transport") == IN_PROCESS:
+        server = importlib.import_module(connection["module"]).mcp
+        # per-request INFO logs would otherwise be printed into the chat terminal
+        logging.getLogger("mcp.server.lowlevel.server").setLevel(logging.WARNING)
+        return create_connected_server_and_client_session(server)  # initializes the session itself
+    params = {key: value for key, value in connection.items() if key != "source"}
+    if params.get("transport") == "stdio" and params.get("env") is None:
+        # the MCP SDK starts stdio servers with a minimal environment; pass our settings along
+        settings = {k: v for k, v in os.environ.items() if k.startswith("PLUGGRAPH_")}
+        params["env"] = {**get_default_environment(), **settings}
+    return _initialized(create_session(params))
+
+
+class _initialized:
+    """Wrap create_session() so both transports yield a session that is already initialized."""
+
+    def __init__(self, context):
+        self._context = context
+
+    async def __aenter__(self) -> ClientSession:
+        session = await self._context.__aenter__()
+        await session.initialize()
+        return session
+
+    async def __aexit__(self, *exc):
+        return await self._context.__aexit__(*exc)
+
+
+class LazySession:
+    """
+    Stand-in for an MCP ClientSession that connects on first use.
+    The real session lives in its own task so the transport's context is entered and
+    exited by the same task, whichever tool call happened to start it.
+    """
+
+    def __init__(self, name: str, connection: dict):
+        self.name = name
+        self.connection = connection
+        self._ready: Optional[asyncio.Future] = None
+        self._closing: Optional[asyncio.Event] = None
+        self._owner: Optional[asyncio.Task] = None
+
+    @property
+    def started(self) -> bool:
+        return self._owner is not None
+
+    async def _run(self) -> None:
+        try:
+            async with _connect(self.connection) as session:
+                self._ready.set_result(session)
+                await self._closing.wait()
+        except BaseException as e:
+            if not self._ready.done():
+                self._ready.set_exception(e)
+            elif not isinstance(e, asyncio.CancelledError):
+                log.warning("MCP server %r exited: %s", self.name, e)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+
+    def start(self) -> None:
+        """Spawn/connect the server in the background (no-op if already started)."""
+        if self._owner is None:
+            self._ready = asyncio.get_running_loop().create_future()
+            self._closing = asyncio.Event()
+            self._owner = asyncio.create_task(self._run(), name=f"mcp-{self.name}")
+
+    async def session(self) -> ClientSession:
+        self.start()
+        try:
+            return await asyncio.shield(self._ready)
+        except Exception:
+            self._owner = None  # failed to start; the next call tries again
+            raise
+
+    async def call_tool(self, name: str, arguments: Optional[dict] = None, **kwargs):
+        """Same signature as ClientSession.call_tool; connects on first call."""
+        with span(f"mcp {self.name}.{name}", "client", **{"mcp.server": self.name, "mcp.tool": name}) as s:
+            session = await self.session()
+            # the server-side tool span joins this trace through the request's _meta
+            kwargs["meta"] = {**(kwargs.get("meta") or {}), "traceparent": s.traceparent()}
+            result = await session.call_tool(name, arguments, **kwargs)
+            if result.isError:
+                s.fail("tool returned an error")
+            return result
+
+    async def list_tools(self) -> List[MCPTool]:
+        session = await self.session()
+        tools, cursor = [], None
+        while True:
+            page = await session.list_tools(cursor=cursor)
+            tools.extend(page.tools)
+            cursor = page.nextCursor
+            if not cursor:
+                return tools
+
+    async def aclose(self) -> None:
+        owner, self._owner = self._owner, None
+        if owner is None:
+            return
+        self._closing.set()
+        try:
+            await asyncio.wait_for(owner, timeout=5)
+        except (asyncio.TimeoutError, asyncio.CancelledError, Exception):
+            owner.cancel()
+
+
+class LazyToolset:
+    """LangChain tools for several MCP servers, backed by the schema manifest and lazy sessions."""
+
+    def __init__(self, connections: Dict[str, dict], manifest_path: Optional[str] = None):
+        self.connections = connections
+        self.manifest_path = manifest_path or os.getenv("PLUGGRAPH_TOOL_MANIFEST", DEFAULT_MANIFEST)
+        self.sessions = {name: LazySession(name, conn) for name, conn in connections.items()}
+        self.tool_servers: Dict[str, str] = {}  # tool name -> server name, filled by get_tools()
+        self.manifest_hits = 0
+        self.manifest_misses = 0
+
+    def _read_manifest(self) -> dict:
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else {}
+        except (OSError, ValueError):
+            return {}
+
+    def _write_manifest(self, manifest: dict) -> None:
+        tmp = f"{self.manifest_path}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(manifest, f, indent=1)
+            os.replace(tmp, self.manifest_path)  # atomic: a crash never leaves a half-written manifest
+        except OSError as e:
+            log.warning("could not write tool manifest %s: %s", self.manifest_path, e)
+
+    async def _refresh(self, name: str) -> List[dict]:
+        # The server was spawned for the handshake anyway, so its session is kept for later calls
+        tools = await self.sessions[name].list_tools()
+        return [tool.model_dump(mode="json", exclude_none=True) for tool in tools]
+
+    def _entry(self, name: str) -> str:
+        # one entry per server and transport, so switching stdio <-> in_process does not thrash
+        return f"{name}@{self.connections[name].get('transport', 'stdio')}"
+
+    async def get_tools(self) -> List[BaseTool]:
+        """All tools, in server order; only servers with a stale/missing manifest entry are contacted."""
+        manifest = self._read_manifest()
+        stale = {}
+        for name, conn in self.connections.items():
+            fingerprint = server_fingerprint(conn)
+            entry = manifest.get(self._entry(name))
+            if isinstance(entry, dict) and entry.get("hash") == fingerprint:
+                self.manifest_hits += 1
+            else:
+                self.manifest_misses += 1
+                stale[name] = fingerprint
+        if stale:
+            refreshed = await asyncio.gather(*(self._refresh(name) for name in stale))
+            for (name, fingerprint), tools in zip(stale.items(), refreshed):
+                manifest[self._entry(name)] = {"hash": fingerprint, "tools": tools}
+            self._write_manifest(manifest)
+
+        tools: List[BaseTool] = []
+        for name in self.connections:
+            for spec in manifest[self._entry(name)]["tools"]:
+                self.tool_servers[spec["name"]] = name
+                tools.append(convert_mcp_tool_to_langchain_tool(
+                    self.sessions[name], MCPTool.model_validate(spec), server_name=name,
+                ))
+        return tools
+
+    def warm(self) -> None:
+        """Start every server in the background so the first tool call does not pay the spawn."""
+        for session in self.sessions.values():
+            session.start()
+
+    def stats(self) -> dict:
+        return {
+            "manifest_hits": self.manifest_hits,
+            "manifest_misses": self.manifest_misses,
+            "started": sorted(name for name, s in self.sessions.items() if s.started),
+        }
+
+    async def aclose(self) -> None:
+        await asyncio.gather(*(s.aclose() for s in self.sessions.values()))
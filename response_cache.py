@@ -0,0 +1,138 @@
+# response_cache.py
+# ---------------------------
+# Purpose:
+#   - TTL + LRU cache for upstream JSON responses, shared by all tools in a server process.
+#   - Keys are the normalized URL plus sorted query params, so `geocode("Chennai")` and
+#     `country_info("Japan")` are answered from memory after the first lookup.
+#   - Each call site picks its own TTL (geocode: days, forecast: minutes, alerts: ~1 minute).
+#   - Optional on-disk SQLite backing so cached entries survive restarts.
+#   - Configuration (environment variables, all optional):
+#       PLUGGRAPH_CACHE_SIZE=2048     max entries kept in memory (LRU bound)
+#       PLUGGRAPH_CACHE_PATH=...      SQLite file for persistent entries (unset = memory only)
+# ---------------------------
+
+import os
+import json
+import time
+import sqlite3
+from collections import OrderedDict
+from typing import Any, Optional, Tuple
+from urllib.parse import parse_qsl, urlsplit, urlunsplit, urlencode
+
+# How often (in puts) expired rows are purged from the SQLite file
+_PURGE_EVERY = 256
+
+
+def cache_key(url: str, params: Optional[dict] = None) -> str:
+    """Normalize URL + params into a stable cache key (lowercase origin, sorted params, no fragment)."""
+    parts = urlsplit(url)
+    path = parts.path or "/"
+    items = parse_qsl(parts.query, keep_blank_values=True)
+    items += [(str(k), str(v).strip()) for k, v in (params or {}).items()]
+    query = urlencode(sorted(items))
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), path, query, ""))
+
+
+class ResponseCache:
+    """In-memory LRU of (expires_at, value) entries with an optional SQLite second tier."""
+
+    def __init__(self, max_entries: int = 2048, path: Optional[str] = None):
+        self.max_entries = max_entries
+        self._mem: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._db: Optional[sqlite3.Connection] = None
+        self._puts = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if path:
+            self._open_db(path)
+
+    def _open_db(self, path: str) -> None:
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, expires REAL NOT NULL, value TEXT NOT NULL)"
+        )
+        self._db.execute("DELETE FROM responses WHERE expires <= ?", (time.time(),))
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        """Return (found, value); expired entries count as misses and are dropped."""
+        now = time.time()
+        entry = self._mem.get(key)
+        if entry is not None:
+            expires, value = entry
+            if expires > now:
+                self._mem.move_to_end(key)
+                self.hits += 1
+                return True, value
+            del self._mem[key]
+        if self._db is not None:
+            row = self._db.execute("SELECT expires, value FROM responses WHERE key = ?", (key,)).fetchone()
+            if row and row[0] > now:
+                value = json.loads(row[1])
+                self._remember(key, row[0], value)
+                self.disk_hits += 1
+                return True, value
+        self.misses += 1
+        return False, None
+
+    def put(self, key: str, value: Any, ttl: float) -> None:
+        """Store a JSON-compatible value for `ttl` seconds."""
+        if ttl <= 0:
+            return
+        expires = time.time() + ttl
+        self._remember(key, expires, value)
+        if self._db is not None:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, expires, value) VALUES (?, ?, ?)",
+                (key, expires, json.dumps(value)),
+            )
+            self._puts += 1
+            if self._puts % _PURGE_EVERY == 0:
+                self._db.execute("DELETE FROM responses WHERE expires <= ?", (time.time(),))
+
+    def _remember(self, key: str, expires: float, value: Any) -> None:
+        self._mem[key] = (expires, value)
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.max_entries:
+            self._mem.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        self._mem.clear()
+        if self._db is not None:
+            self._db.execute("DELETE FROM responses")
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "entries": len(self._mem),
+            "max_entries": self.max_entries,
+            "persistent": self._db is not None,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round((self.hits + self.disk_hits) / lookups, 3) if lookups else 0.0,
+        }
+
+    def close(self) -> None:
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+
+_CACHE: Optional[ResponseCache] = None
+
+
+def get_cache() -> ResponseCache:
+    """Return the process-wide response cache, configured from the environment on first use."""
+    global _CACHE
+    if _CACHE is None:
+        _CACHE = ResponseCache(
+            max_entries=int(os.getenv("PLUGGRAPH_CACHE_SIZE", "2048")),
+            path=os.getenv("PLUGGRAPH_CACHE_PATH") or None,
+        )
+    return _CACHE
@@ -0,0 +1,248 @@
+# scheduler.py
+# ---------------------------
+# Purpose:
+#   - Rate-limited, prioritized upstream scheduler used by http_pool before every request.
+#   - One token bucket per upstream host (Nominatim ~1 req/s, ZenQuotes, NWS, ...): requests
+#     over quota wait in a per-host priority queue instead of failing with HTTP 429.
+#   - Interactive requests (tool calls) are served before background ones (cache refills);
+#     use `with background(): ...` around refill code.
+#   - A request whose deadline cannot be met given the queue ahead of it is dropped early
+#     with DeadlineExceeded rather than waiting just to time out.
+#   - `defer(host, seconds)` pauses a host after a 429/503 Retry-After.
+#   - Queue-depth and wait-time histograms per host for capacity planning.
+#   - Configuration:
+#       PLUGGRAPH_RATE_LIMITS="host=rate/burst,..."   e.g. "nominatim.openstreetmap.org=1/1"
+# ---------------------------
+
+import os
+import heapq
+import asyncio
+import itertools
+import contextvars
+from time import monotonic
+from contextlib import contextmanager
+from typing import Optional
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+
+INTERACTIVE = 0
+BACKGROUND = 1
+
+# Documented / observed provider quotas: host -> (requests per second, burst)
+DEFAULT_LIMITS = {
+    "nominatim.openstreetmap.org": (1.0, 1),  # usage policy: max 1 req/s
+    "zenquotes.io": (5 / 30, 5),              # free tier: 5 requests per 30 s
+    "api.weather.gov": (5.0, 10),             # unpublished; be polite
+    "official-joke-api.appspot.com": (2.0, 5),
+}
+
+_priority: contextvars.ContextVar[int] = contextvars.ContextVar("upstream_priority", default=INTERACTIVE)
+
+
+@contextmanager
+def background():
+    """Mark upstream requests made inside this block as background (served after interactive ones)."""
+    token = _priority.set(BACKGROUND)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority() -> int:
+    return _priority.get()
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a queued request cannot be dispatched before its deadline."""
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Retry-After header (delta-seconds or HTTP-date) → seconds to wait, or None."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+class Histogram:
+    """Fixed-bucket cumulative histogram (Prometheus style)."""
+
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.total += value
+        self.count += 1
+
+    def as_dict(self) -> dict:
+        cumulative, running = {}, 0
+        for bound, n in zip(list(self.buckets) + ["+Inf"], self.counts):
+            running += n
+            cumulative[str(bound)] = running
+        return {"buckets": cumulative, "count": self.count, "sum": round(self.total, 6)}
+
+
+WAIT_BUCKETS = (0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DEPTH_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+
+class HostLimiter:
+    """Token bucket + priority queue for one upstream host."""
+
+    def __init__(self, host: str, rate: float, burst: int):
+        self.host = host
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = monotonic()
+        self.paused_until = 0.0
+        self._heap: list = []
+        self._seq = itertools.count()
+        self._dispatcher: Optional[asyncio.Task] = None
+        self.dispatched = 0
+        self.dropped = 0
+        self.deferred = 0
+        self.wait = Histogram(WAIT_BUCKETS)
+        self.depth = Histogram(DEPTH_BUCKETS)
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def _queued_ahead(self, priority: int) -> int:
+        return sum(1 for p, _, _, fut in self._heap if p <= priority and not fut.done())
+
+    async def acquire(self, priority: int = INTERACTIVE, deadline: Optional[float] = None) -> None:
+        """Wait for a token; raises DeadlineExceeded if `deadline` (monotonic) cannot be met."""
+        now = monotonic()
+        self._refill(now)
+        if not self._heap and now >= self.paused_until and self.tokens >= 1:
+            self.tokens -= 1
+            self.dispatched += 1
+            self.wait.observe(0.0)
+            self.depth.observe(0)
+            return
+        # Estimated wait: pause left + one token interval for every request ahead of us
+        ahead = self._queued_ahead(priority)
+        eta = max(0.0, self.paused_until - now) + max(0.0, ahead + 1 - self.tokens) / self.rate
+        if deadline is not None and now + eta > deadline:
+            self.dropped += 1
+            raise DeadlineExceeded(f"{self.host}: ~{eta:.1f}s queue wait exceeds deadline")
+        fut = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._heap, (priority, next(self._seq), deadline, fut))
+        self.depth.observe(ahead)
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.ensure_future(self._dispatch())
+        try:
+            await fut
+        finally:
+            if not fut.done():
+                fut.cancel()  # caller gave up; the dispatcher skips cancelled entries
+        self.wait.observe(monotonic() - now)
+
+    async def _dispatch(self) -> None:
+        while self._heap:
+            now = monotonic()
+            self._refill(now)
+            if now < self.paused_until:
+                await asyncio.sleep(self.paused_until - now)
+                continue
+            if self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                continue
+            _, _, deadline, fut = heapq.heappop(self._heap)
+            if fut.done():
+                continue
+            if deadline is not None and now > deadline:
+                self.dropped += 1
+                fut.set_exception(DeadlineExceeded(f"{self.host}: deadline passed while queued"))
+                continue
+            self.tokens -= 1
+            self.dispatched += 1
+            fut.set_result(None)
+
+    def defer(self, seconds: float) -> None:
+        """Pause dispatching (e.g. after Retry-After) and drain the bucket."""
+        self.deferred += 1
+        self.paused_until = max(self.paused_until, monotonic() + seconds)
+        self.tokens = 0.0
+
+    def stats(self) -> dict:
+        return {
+            "rate": self.rate,
+            "burst": self.burst,
+            "queued": sum(1 for *_, fut in self._heap if not fut.done()),
+            "dispatched": self.dispatched,
+            "dropped": self.dropped,
+            "deferred": self.deferred,
+            "paused_for": round(max(0.0, self.paused_until - monotonic()), 3),
+            "wait_seconds": self.wait.as_dict(),
+            "queue_depth": self.depth.as_dict(),
+        }
+
+
+class Scheduler:
+    """Per-host limiters; hosts without a configured quota are only limited after a Retry-After."""
+
+    def __init__(self, limits: Optional[dict] = None):
+        self.limits = dict(DEFAULT_LIMITS)
+        self.limits.update(limits or {})
+        self._hosts: dict[str, HostLimiter] = {}
+
+    def _limiter(self, host: str) -> Optional[HostLimiter]:
+        limiter = self._hosts.get(host)
+        if limiter is None and host in self.limits:
+            rate, burst = self.limits[host]
+            limiter = self._hosts[host] = HostLimiter(host, rate, burst)
+        return limiter
+
+    async def acquire(self, host: str, deadline: Optional[float] = None, priority: Optional[int] = None) -> None:
+        limiter = self._limiter(host)
+        if limiter is not None:
+            await limiter.acquire(current_priority() if priority is None else priority, deadline)
+
+    def defer(self, host: str, seconds: float) -> None:
+        limiter = self._limiter(host)
+        if limiter is None:
+            # Unknown quota: start a generous bucket so the pause is still honored
+            self.limits[host] = (10.0, 10)
+            limiter = self._limiter(host)
+        limiter.defer(seconds)
+
+    def stats(self) -> dict:
+        return {host: limiter.stats() for host, limiter in sorted(self._hosts.items())}
+
+
+def parse_rate_limits(spec: str) -> dict:
+    """Parse "host=rate/burst,host=rate" into {host: (rate, burst)}; bad entries are ignored."""
+    out = {}
+    for part in spec.split(","):
+        host, _, value = part.partition("=")
+        rate, _, burst = value.partition("/")
+        try:
+            out[host.strip().lower()] = (float(rate), int(burst or 1))
+        except ValueError:
+            continue
+    return out
+
+
+def scheduler_from_env() -> Scheduler:
+    return Scheduler(parse_rate_limits(os.getenv("PLUGGRAPH_RATE_LIMITS", "")))
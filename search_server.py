@@ -6,25 +6,34 @@
 #   - NOTE: This is not a full web browser; it's enough to fetch snippets and links.
 # ---------------------------
 
-import httpx  # async HTTP client
 from typing import Optional, List  # typing
 from mcp.server.fastmcp import FastMCP  # MCP server
+from http_pool import get_pool, lifespan, register_stats  # shared pooled HTTP layer
+from tracing import instrument_tools  # spans + latency metrics for every tool
 
 # Instantiate MCP server
-mcp = FastMCP("search")  # logical server name
+mcp = FastMCP("search", lifespan=lifespan)  # logical server name
+register_stats(mcp)  # expose pool hit/miss counters as a resource
+
+# Cache instant answers briefly; repeated queries within a session are common
+SEARCH_TTL = 10 * 60  # seconds
 
 # Simple JSON helper
-async def _get_json(url: str, params: Optional[dict] = None) -> Optional[dict]:
+async def _get_json(url: str, params: Optional[dict] = None, ttl: Optional[float] = None) -> Optional[dict]:
     """
-    Helper to GET JSON with modest error handling.
+    Helper to GET JSON with modest error handling (cached for `ttl` seconds when given).
     """
-    async with httpx.AsyncClient(timeout=15) as client:  # client
-        try:  # attempt request
-            r = await client.get(url, params=params)  # GET
-            r.raise_for_status()  # raise on 4xx/5xx
-            return r.json()  # parse JSON
-        except Exception:  # swallow errors
-            return None  # failure
+    # Reuse the long-lived per-host client (keep-alive); returns None on any error
+    return await get_pool().get_json(url, params=params, timeout=15, ttl=ttl)
+
+# Streaming variant: only the first `limit` items of the array at `path` are read
+async def _get_json_prefix(url: str, path: str, limit: int, params: Optional[dict] = None,
+                           ttl: Optional[float] = None) -> Optional[dict]:
+    """
+    Like _get_json, but the body is parsed while it arrives and reading stops after `limit`
+    items of the array at `path` (later keys are not read).
+    """
+    return await get_pool().get_json_prefix(url, path, limit, params=params, timeout=15, ttl=ttl)
 
 @mcp.tool()
 async def web_search(query: str) -> List[dict]:
@@ -37,7 +46,8 @@ async def web_search(query: str) -> List[dict]:
     """
     # DuckDuckGo Instant Answer API (does not require API key)
     params = {"q": query, "format": "json", "no_html": 1, "skip_disambig": 1}  # practical params
-    data = await _get_json("https://api.duckduckgo.com/", params=params)  # call API
+    # Only the first related topics are used; the abstract fields come before them in the body
+    data = await _get_json_prefix("https://api.duckduckgo.com/", "RelatedTopics", 8, params=params, ttl=SEARCH_TTL)  # call API
     if not data:  # handle failure
         return []  # empty list
     # Try to harvest items from RelatedTopics; sometimes 'Abstract' is present at top-level
@@ -62,6 +72,8 @@ async def web_search(query: str) -> List[dict]:
     # Return compact list
     return out  # list of dicts
 
+instrument_tools(mcp)  # trace and time every tool registered above
+
 # Start MCP stdio loop
 if __name__ == "__main__":  # entrypoint
     mcp.run(transport="stdio")  # run server
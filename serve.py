@@ -0,0 +1,123 @@
+# serve.py
+# ---------------------------
+# Purpose:
+#   - Run an MCP server over the network instead of stdio, so many agent instances can share
+#     one warm tool tier:  python serve.py weather --port 8001 --workers 4
+#   - Streamable HTTP (default) runs stateless with JSON responses, so any uvicorn worker can
+#     answer any request and the tier scales horizontally behind a load balancer.
+#     `--transport sse` is available for older clients (single worker: SSE sessions live in one process).
+#   - Adds GET /healthz (process is up) and GET /readyz (HTTP pool open, MCP session manager
+#     running) for load balancers and orchestrators, and GET /metrics (Prometheus, per worker).
+#   - Each worker keeps its own pool and in-memory cache; set PLUGGRAPH_CACHE_PATH to share
+#     cached responses between workers (and restarts) through SQLite.
+#   - Configuration:
+#       PLUGGRAPH_ALLOWED_HOSTS="tools.internal:*"   extra Host headers accepted besides localhost
+# ---------------------------
+
+import os
+import argparse
+import importlib
+from contextlib import asynccontextmanager
+
+import uvicorn
+from starlette.requests import Request
+from starlette.responses import JSONResponse, PlainTextResponse
+
+from http_pool import get_pool
+from tracing import METRICS
+
+# server name -> (module, default port)
+SERVERS = {
+    "weather": ("weather_server", 8001),
+    "fun": ("fun_server", 8002),
+    "info": ("info_server", 8003),
+    "search": ("search_server", 8004),
+}
+
+# Workers import the app by name, so the chosen server/transport are handed over via the environment
+MODULE_ENV = "PLUGGRAPH_SERVE_MODULE"
+TRANSPORT_ENV = "PLUGGRAPH_SERVE_TRANSPORT"
+
+
+def create_app():
+    """uvicorn app factory (one call per worker process)."""
+    module = os.environ[MODULE_ENV]
+    transport = os.getenv(TRANSPORT_ENV, "http")
+    mcp = importlib.import_module(module).mcp
+    state = {"ready": False}
+
+    extra_hosts = [h.strip() for h in os.getenv("PLUGGRAPH_ALLOWED_HOSTS", "").split(",") if h.strip()]
+    security = mcp.settings.transport_security
+    if extra_hosts and security is not None:
+        security.allowed_hosts.extend(extra_hosts)
+        security.allowed_origins.extend(f"http://{h}" for h in extra_hosts)
+
+    @mcp.custom_route("/healthz", methods=["GET"])
+    async def healthz(request: Request) -> JSONResponse:
+        return JSONResponse({"status": "ok", "server": mcp.name, "pid": os.getpid()})
+
+    @mcp.custom_route("/readyz", methods=["GET"])
+    async def readyz(request: Request) -> JSONResponse:
+        if not state["ready"]:
+            return JSONResponse({"status": "starting", "server": mcp.name}, status_code=503)
+        return JSONResponse({"status": "ready", "server": mcp.name, "pid": os.getpid()})
+
+    @mcp.custom_route("/metrics", methods=["GET"])
+    async def metrics(request: Request) -> PlainTextResponse:
+        return PlainTextResponse(METRICS.render(), media_type="text/plain; version=0.0.4")
+
+    if transport == "sse":
+        app = mcp.sse_app()
+    else:
+        mcp.settings.stateless_http = True  # no per-client session state: any worker serves any request
+        mcp.settings.json_response = True   # single JSON body per call instead of an SSE stream
+        app = mcp.streamable_http_app()
+
+    inner = app.router.lifespan_context
+
+    @asynccontextmanager
+    async def lifespan(app):
+        # Hold the pool for the worker's lifetime; stateless requests each run the server
+        # lifespan, and without this reference the pool would close after every request.
+        pool = get_pool()
+        pool.retain()
+        try:
+            async with inner(app):
+                state["ready"] = True
+                yield
+        finally:
+            state["ready"] = False
+            await pool.release()
+
+    app.router.lifespan_context = lifespan
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a pluggraph MCP server over HTTP.")
+    parser.add_argument("server", choices=sorted(SERVERS), help="which MCP server to run")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, help="default: 8001-8004 by server")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", "1")))
+    parser.add_argument("--transport", choices=["http", "sse"], default="http")
+    args = parser.parse_args()
+
+    module, port = SERVERS[args.server]
+    workers = args.workers
+    if args.transport == "sse" and workers > 1:
+        print("SSE sessions are held in one process; running a single worker")
+        workers = 1
+    os.environ[MODULE_ENV] = module
+    os.environ[TRANSPORT_ENV] = args.transport
+    uvicorn.run(
+        "serve:create_app",
+        factory=True,
+        host=args.host,
+        port=args.port or port,
+        workers=workers,
+        log_level="warning",
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+# single_flight.py
+# ---------------------------
+# Purpose:
+#   - Request coalescing: identical concurrent calls share one in-flight task.
+#   - Used under every server's `_get_json` (via http_pool) and by grid_cache, so a burst of
+#     agent sessions asking about the same city produces one upstream request, not N.
+#   - Each caller keeps its own timeout and cancellation: a caller giving up does not cancel
+#     the shared task while others still wait; the task is only cancelled when nobody is left.
+# ---------------------------
+
+import asyncio
+from typing import Any, Awaitable, Callable, Hashable, Optional
+
+
+class _Call:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Future):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Coalesce concurrent calls that share a key into one execution."""
+
+    def __init__(self):
+        self._calls: dict[Hashable, _Call] = {}
+        self.calls = 0        # executions actually started
+        self.coalesced = 0    # callers that joined an execution already in flight
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]], timeout: Optional[float] = None) -> Any:
+        """
+        Run `fn()` once per key at a time; concurrent callers with the same key await the same result.
+        Raises asyncio.TimeoutError if this caller's `timeout` expires first.
+        """
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call(asyncio.ensure_future(fn()))
+            self._calls[key] = call
+            self.calls += 1
+            call.task.add_done_callback(lambda _, key=key, call=call: self._forget(key, call))
+        else:
+            self.coalesced += 1
+        call.waiters += 1
+        try:
+            # shield: cancelling/timing out this waiter must not cancel the shared task
+            return await asyncio.wait_for(asyncio.shield(call.task), timeout)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                call.task.cancel()  # last interested caller is gone
+
+    def _forget(self, key: Hashable, call: _Call) -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
+        if not call.task.cancelled():
+            call.task.exception()  # mark retrieved so abandoned failures don't log warnings
+
+    def stats(self) -> dict:
+        return {"calls": self.calls, "coalesced": self.coalesced, "inflight": len(self._calls)}
@@ -0,0 +1,85 @@
+# snapshot.py
+# ---------------------------
+# Purpose:
+#   - Keep a local file in sync with a slowly changing upstream dataset (used by universities.py
+#     and countries.py).
+#   - refresh_file(): conditional GET (If-None-Match with the last ETag), content-hash check for
+#     servers without ETags, atomic replace. A sidecar `<path>.meta` records the ETag, the hash
+#     and when the copy was last checked; an unchanged dataset costs one 304 and nothing else.
+#   - keep_fresh(): background loop that runs a sync function whenever the copy is older than
+#     the refresh interval (or missing), retrying failures later while the old copy keeps serving.
+# ---------------------------
+
+import os
+import sys
+import json
+import time
+import asyncio
+import hashlib
+from typing import Any, Awaitable, Callable, Optional
+
+RETRY_SECONDS = 600.0  # wait after a failed sync
+
+
+def read_meta(path: str) -> dict:
+    try:
+        with open(path + ".meta", "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_meta(path: str, meta: dict) -> None:
+    tmp = path + ".meta.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(tmp, path + ".meta")
+
+
+async def refresh_file(path: str, url: str, validate: Optional[Callable[[Any], bool]] = None,
+                       params: Optional[dict] = None, timeout: float = 60.0) -> bool:
+    """
+    Download `url` to `path` if it changed since the last refresh; returns True when `path`
+    was replaced. `validate` gets the parsed JSON and rejects bodies that must not be saved.
+    """
+    from http_pool import get_pool  # imported lazily: offline CLI paths need no HTTP layer
+    meta = read_meta(path) if os.path.exists(path) else {}
+    headers = {"If-None-Match": meta["etag"]} if meta.get("etag") else {}
+    r = await get_pool().get(url, params=params, headers=headers, timeout=timeout)
+    if r.status_code == 304:
+        _write_meta(path, dict(meta, checked=time.time()))
+        return False
+    digest = hashlib.sha256(r.content).hexdigest()
+    fresh = {"etag": r.headers.get("ETag"), "sha256": digest, "url": url, "checked": time.time()}
+    if digest == meta.get("sha256"):
+        _write_meta(path, fresh)  # same content under a new ETag
+        return False
+    if validate is not None and not validate(r.json()):
+        raise ValueError(f"{url} returned an unexpected payload")
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(r.content)
+    os.replace(tmp, path)  # atomic swap so readers never see a half-written file
+    _write_meta(path, fresh)
+    return True
+
+
+async def keep_fresh(path: str, refresh: float, sync: Callable[[], Awaitable[Any]], label: str) -> None:
+    """
+    Run `sync` when `path` is missing or was last checked over `refresh` seconds ago.
+    With `refresh` 0 an existing file (e.g. a bundled snapshot) is used as-is.
+    """
+    while True:
+        exists = os.path.exists(path)
+        checked = read_meta(path).get("checked", 0.0) if exists else 0.0
+        if not exists or (refresh and checked + refresh < time.time()):
+            try:
+                await sync()
+            except Exception as e:  # keep serving the old copy (or the live API) and retry later
+                print(f"{label} sync failed: {e}", file=sys.stderr)  # stdout belongs to the MCP stdio stream
+                await asyncio.sleep(min(refresh or RETRY_SECONDS, RETRY_SECONDS))
+                continue
+        if not refresh:
+            return
+        checked = read_meta(path).get("checked", time.time())
+        await asyncio.sleep(max(60.0, checked + refresh - time.time()))
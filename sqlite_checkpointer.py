@@ -0,0 +1,416 @@
+# sqlite_checkpointer.py
+# ---------------------------
+# Purpose:
+#   - Persistent, bounded LangGraph checkpointer replacing the in-process MemorySaver.
+#   - Local SQLite file (WAL mode) so conversations survive restarts.
+#   - Writes are buffered and flushed in batches (one transaction per batch / interval).
+#   - Retention:
+#       - keep at most `max_checkpoints` per thread (older ones are deleted with their writes)
+#       - evict threads idle for `idle_seconds` from memory (they stay on disk)
+#       - optional `thread_ttl` deletes threads not touched for that long, on compaction
+#       - periodic compaction: WAL checkpoint + incremental vacuum
+#   - Lazy loading: a thread's checkpoints are read from disk only when it becomes active.
+#   - Configuration (read by `checkpointer_from_env`):
+#       PLUGGRAPH_CHECKPOINTER=sqlite|memory          (default sqlite)
+#       PLUGGRAPH_CHECKPOINT_DB=pluggraph_checkpoints.db
+#       PLUGGRAPH_CHECKPOINT_MAX=20                   checkpoints kept per thread
+#       PLUGGRAPH_CHECKPOINT_IDLE=900                 seconds before an idle thread leaves memory
+#       PLUGGRAPH_CHECKPOINT_TTL=0                    seconds before an untouched thread is deleted (0 = never)
+# ---------------------------
+
+import os
+import time
+import sqlite3
+import asyncio
+import threading
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Iterator, Optional, Sequence
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+)
+
+try:  # newer langgraph stores run config keys (e.g. thread_id) in metadata through this helper
+    from langgraph.checkpoint.base import get_checkpoint_metadata
+except ImportError:  # pragma: no cover - older langgraph-checkpoint
+    def get_checkpoint_metadata(config, metadata):
+        return metadata
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS threads (
+    thread_id TEXT PRIMARY KEY,
+    updated REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS checkpoints (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL,
+    checkpoint_id TEXT NOT NULL,
+    parent_id TEXT,
+    type TEXT,
+    checkpoint BLOB,
+    meta_type TEXT,
+    metadata BLOB,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+);
+CREATE TABLE IF NOT EXISTS writes (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL,
+    checkpoint_id TEXT NOT NULL,
+    task_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    channel TEXT NOT NULL,
+    type TEXT,
+    value BLOB,
+    task_path TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+);
+"""
+
+
+class _Thread:
+    """In-memory view of one thread: {ns: {checkpoint_id: row}} and {(ns, checkpoint_id): {(task, idx): write}}."""
+
+    __slots__ = ("checkpoints", "writes", "last_used")
+
+    def __init__(self):
+        self.checkpoints: dict[str, dict[str, tuple]] = {}
+        self.writes: dict[tuple, dict[tuple, tuple]] = {}
+        self.last_used = time.monotonic()
+
+
+class SqliteCheckpointer(BaseCheckpointSaver):
+    """LangGraph checkpoint saver backed by SQLite with batched writes, retention and lazy loading."""
+
+    def __init__(
+        self,
+        path: str,
+        *,
+        max_checkpoints: int = 20,
+        idle_seconds: float = 900.0,
+        max_threads_in_memory: int = 256,
+        thread_ttl: float = 0.0,
+        batch_size: int = 32,
+        flush_interval: float = 1.0,
+        compact_interval: float = 3600.0,
+        serde=None,
+    ):
+        super().__init__(serde=serde)
+        self.max_checkpoints = max_checkpoints
+        self.idle_seconds = idle_seconds
+        self.max_threads_in_memory = max_threads_in_memory
+        self.thread_ttl = thread_ttl
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.compact_interval = compact_interval
+        self._lock = threading.RLock()
+        self._threads: "OrderedDict[str, _Thread]" = OrderedDict()
+        self._pending: list[tuple[str, tuple]] = []   # (sql, params) waiting for the next flush
+        self._last_flush = time.monotonic()
+        self._last_compact = time.monotonic()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA auto_vacuum=INCREMENTAL")  # only takes effect on a new file
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+
+    # ---- memory / lazy loading ----
+
+    def _thread(self, thread_id: str) -> _Thread:
+        """Return the thread's in-memory state, loading it from disk on first access."""
+        thread = self._threads.get(thread_id)
+        if thread is None:
+            thread = self._load(thread_id)
+            self._threads[thread_id] = thread
+        self._threads.move_to_end(thread_id)
+        thread.last_used = time.monotonic()
+        self._evict_idle()
+        return thread
+
+    def _load(self, thread_id: str) -> _Thread:
+        thread = _Thread()
+        self._flush_locked()  # make sure disk reflects anything buffered for this thread
+        rows = self._db.execute(
+            "SELECT checkpoint_ns, checkpoint_id, parent_id, type, checkpoint, meta_type, metadata "
+            "FROM checkpoints WHERE thread_id = ?", (thread_id,)
+        )
+        for ns, cid, parent, ctype, cblob, mtype, mblob in rows:
+            thread.checkpoints.setdefault(ns, {})[cid] = ((ctype, cblob), (mtype, mblob), parent)
+        rows = self._db.execute(
+            "SELECT checkpoint_ns, checkpoint_id, task_id, idx, channel, type, value, task_path "
+            "FROM writes WHERE thread_id = ? ORDER BY task_id, idx", (thread_id,)
+        )
+        for ns, cid, task_id, idx, channel, vtype, vblob, task_path in rows:
+            thread.writes.setdefault((ns, cid), {})[(task_id, idx)] = (task_id, channel, (vtype, vblob), task_path)
+        return thread
+
+    def _evict_idle(self) -> None:
+        """Drop idle / least-recently-used threads from memory; they reload lazily from disk."""
+        now = time.monotonic()
+        while self._threads:
+            thread_id, thread = next(iter(self._threads.items()))
+            if len(self._threads) > self.max_threads_in_memory or now - thread.last_used > self.idle_seconds:
+                del self._threads[thread_id]
+            else:
+                break
+
+    # ---- batched persistence ----
+
+    def _queue(self, sql: str, params: tuple) -> None:
+        self._pending.append((sql, params))
+
+    def _flush_due(self) -> bool:
+        return bool(self._pending) and (
+            len(self._pending) >= self.batch_size or time.monotonic() - self._last_flush >= self.flush_interval
+        )
+
+    def _flush_locked(self) -> None:
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, []
+        self._db.execute("BEGIN")
+        try:
+            for sql, params in batch:
+                self._db.execute(sql, params)
+            self._db.execute("COMMIT")
+        except Exception:
+            self._db.execute("ROLLBACK")
+            self._pending = batch + self._pending  # keep them for the next attempt
+            raise
+        self._last_flush = time.monotonic()
+
+    def flush(self) -> None:
+        """Write all buffered checkpoints and writes in one transaction."""
+        with self._lock:
+            self._flush_locked()
+
+    def maintain(self) -> None:
+        """Flush when due and run compaction when its interval has elapsed."""
+        with self._lock:
+            if self._flush_due():
+                self._flush_locked()
+            if time.monotonic() - self._last_compact >= self.compact_interval:
+                self._compact_locked()
+
+    def compact(self) -> None:
+        with self._lock:
+            self._compact_locked()
+
+    def _compact_locked(self) -> None:
+        self._flush_locked()
+        if self.thread_ttl > 0:
+            cutoff = time.time() - self.thread_ttl
+            stale = [r[0] for r in self._db.execute("SELECT thread_id FROM threads WHERE updated < ?", (cutoff,))]
+            for thread_id in stale:
+                self._delete_thread_locked(thread_id)
+            self._flush_locked()
+        self._db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        self._db.execute("PRAGMA incremental_vacuum")
+        self._last_compact = time.monotonic()
+
+    def close(self) -> None:
+        with self._lock:
+            self._flush_locked()
+            self._db.close()
+
+    # ---- retention ----
+
+    def _prune(self, thread_id: str, ns: str, thread: _Thread) -> None:
+        """Keep only the newest `max_checkpoints` for (thread, ns); checkpoint ids sort by time."""
+        saved = thread.checkpoints.get(ns, {})
+        if self.max_checkpoints <= 0 or len(saved) <= self.max_checkpoints:
+            return
+        for cid in sorted(saved)[: len(saved) - self.max_checkpoints]:
+            del saved[cid]
+            thread.writes.pop((ns, cid), None)
+            self._queue("DELETE FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                        (thread_id, ns, cid))
+            self._queue("DELETE FROM writes WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                        (thread_id, ns, cid))
+
+    # ---- BaseCheckpointSaver API ----
+
+    def _tuple(self, thread_id: str, ns: str, cid: str, thread: _Thread) -> CheckpointTuple:
+        checkpoint, metadata, parent = thread.checkpoints[ns][cid]
+        writes = thread.writes.get((ns, cid), {}).values()
+        return CheckpointTuple(
+            config={"configurable": {"thread_id": thread_id, "checkpoint_ns": ns, "checkpoint_id": cid}},
+            checkpoint=self.serde.loads_typed(checkpoint),
+            metadata=self.serde.loads_typed(metadata),
+            pending_writes=[(task_id, channel, self.serde.loads_typed(value)) for task_id, channel, value, _ in writes],
+            parent_config=(
+                {"configurable": {"thread_id": thread_id, "checkpoint_ns": ns, "checkpoint_id": parent}}
+                if parent else None
+            ),
+        )
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        thread_id = config["configurable"]["thread_id"]
+        ns = config["configurable"].get("checkpoint_ns", "")
+        with self._lock:
+            saved = self._thread(thread_id).checkpoints.get(ns)
+            if not saved:
+                return None
+            cid = get_checkpoint_id(config) or max(saved)
+            if cid not in saved:
+                return None
+            return self._tuple(thread_id, ns, cid, self._threads[thread_id])
+
+    def list(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[CheckpointTuple]:
+        with self._lock:
+            if config:
+                thread_ids = [config["configurable"]["thread_id"]]
+            else:
+                self._flush_locked()
+                thread_ids = [r[0] for r in self._db.execute("SELECT thread_id FROM threads ORDER BY thread_id")]
+            want_ns = config["configurable"].get("checkpoint_ns") if config else None
+            want_id = get_checkpoint_id(config) if config else None
+            before_id = get_checkpoint_id(before) if before else None
+            out = []
+            for thread_id in thread_ids:
+                thread = self._thread(thread_id)
+                for ns, saved in thread.checkpoints.items():
+                    if want_ns is not None and ns != want_ns:
+                        continue
+                    for cid in sorted(saved, reverse=True):
+                        if want_id and cid != want_id:
+                            continue
+                        if before_id and cid >= before_id:
+                            continue
+                        item = self._tuple(thread_id, ns, cid, thread)
+                        if filter and not all(item.metadata.get(k) == v for k, v in filter.items()):
+                            continue
+                        out.append(item)
+                        if limit is not None and len(out) >= limit:
+                            return iter(out)
+            return iter(out)
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        thread_id = config["configurable"]["thread_id"]
+        ns = config["configurable"].get("checkpoint_ns", "")
+        parent = config["configurable"].get("checkpoint_id")
+        # Checkpoints are stored whole (channel values included) so pruning old ones is always safe
+        ctype, cblob = self.serde.dumps_typed(checkpoint)
+        mtype, mblob = self.serde.dumps_typed(get_checkpoint_metadata(config, metadata))
+        with self._lock:
+            thread = self._thread(thread_id)
+            thread.checkpoints.setdefault(ns, {})[checkpoint["id"]] = ((ctype, cblob), (mtype, mblob), parent)
+            self._queue(
+                "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (thread_id, ns, checkpoint["id"], parent, ctype, cblob, mtype, mblob),
+            )
+            self._queue("INSERT OR REPLACE INTO threads VALUES (?, ?)", (thread_id, time.time()))
+            self._prune(thread_id, ns, thread)
+        return {"configurable": {"thread_id": thread_id, "checkpoint_ns": ns, "checkpoint_id": checkpoint["id"]}}
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        thread_id = config["configurable"]["thread_id"]
+        ns = config["configurable"].get("checkpoint_ns", "")
+        cid = config["configurable"]["checkpoint_id"]
+        with self._lock:
+            stored = self._thread(thread_id).writes.setdefault((ns, cid), {})
+            for idx, (channel, value) in enumerate(writes):
+                key = (task_id, WRITES_IDX_MAP.get(channel, idx))
+                if key[1] >= 0 and key in stored:
+                    continue  # regular writes are idempotent per task; special channels overwrite
+                vtype, vblob = self.serde.dumps_typed(value)
+                stored[key] = (task_id, channel, (vtype, vblob), task_path)
+                self._queue(
+                    "INSERT OR REPLACE INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (thread_id, ns, cid, task_id, key[1], channel, vtype, vblob, task_path),
+                )
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self._lock:
+            self._delete_thread_locked(thread_id)
+            self._flush_locked()
+
+    def _delete_thread_locked(self, thread_id: str) -> None:
+        self._threads.pop(thread_id, None)
+        for table in ("checkpoints", "writes", "threads"):
+            self._queue(f"DELETE FROM {table} WHERE thread_id = ?", (thread_id,))
+
+    # ---- async API: loads/flushes touch disk, so they run in a worker thread ----
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        if config["configurable"]["thread_id"] not in self._threads:
+            return await asyncio.to_thread(self.get_tuple, config)  # cold thread: lazy disk load
+        return self.get_tuple(config)
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        items = await asyncio.to_thread(lambda: list(self.list(config, filter=filter, before=before, limit=limit)))
+        for item in items:
+            yield item
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        out = self.put(config, checkpoint, metadata, new_versions)
+        await self._amaintain()
+        return out
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        self.put_writes(config, writes, task_id, task_path)
+        await self._amaintain()
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await asyncio.to_thread(self.delete_thread, thread_id)
+
+    async def _amaintain(self) -> None:
+        if self._flush_due() or time.monotonic() - self._last_compact >= self.compact_interval:
+            await asyncio.to_thread(self.maintain)
+
+
+def checkpointer_from_env():
+    """Build the agent's checkpointer from PLUGGRAPH_CHECKPOINT* settings (see header)."""
+    if os.getenv("PLUGGRAPH_CHECKPOINTER", "sqlite").lower() == "memory":
+        from langgraph.checkpoint.memory import MemorySaver
+        return MemorySaver()
+    return SqliteCheckpointer(
+        os.getenv("PLUGGRAPH_CHECKPOINT_DB", "pluggraph_checkpoints.db"),
+        max_checkpoints=int(os.getenv("PLUGGRAPH_CHECKPOINT_MAX", "20")),
+        idle_seconds=float(os.getenv("PLUGGRAPH_CHECKPOINT_IDLE", "900")),
+        thread_ttl=float(os.getenv("PLUGGRAPH_CHECKPOINT_TTL", "0")),
+    )
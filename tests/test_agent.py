@@ -0,0 +1,38 @@
+import asyncio
+import os
+import threading
+from contextlib import asynccontextmanager
+
+import lazy_tools
+from lazy_tools import LazyToolset
+
+os.environ.setdefault("OPENAI_API_KEY", "test")  # agent.py builds its ChatOpenAI client at import
+from agent import run_chat_loop  # noqa: E402
+
+
+def test_warm_servers_spawn_while_waiting_for_input(monkeypatch):
+    connected = threading.Event()
+
+    @asynccontextmanager
+    async def connect(connection):
+        await asyncio.sleep(0.01)  # the spawn needs the event loop to make progress
+        connected.set()
+        yield object()
+
+    def type_slowly(prompt):
+        typed_before_spawn = not connected.wait(timeout=2)
+        return "oops" if typed_before_spawn else "exit"
+
+    monkeypatch.setattr(lazy_tools, "_connect", connect)
+    monkeypatch.setattr("builtins.input", type_slowly)
+    toolset = LazyToolset({"fake": {}})
+
+    async def main():
+        toolset.warm()
+        try:
+            await run_chat_loop(agent=None, toolset=toolset)  # a turn would fail: no agent
+        finally:
+            await toolset.aclose()
+
+    asyncio.run(main())
+    assert connected.is_set()
@@ -0,0 +1,44 @@
+import asyncio
+
+import pytest
+
+from circuit_breaker import CircuitOpen
+from http_pool import HttpPool
+
+URL = "https://slow.example/api"
+
+
+def _hanging_pool(slow: float) -> HttpPool:
+    pool = HttpPool(breaker={"failures": 3, "slow": slow, "open_seconds": 30})
+
+    async def hang(*args, **kwargs):
+        await asyncio.sleep(60)  # upstream never answers
+
+    pool._send = hang
+    return pool
+
+
+def test_cancelled_slow_requests_open_the_circuit():
+    async def main():
+        pool = _hanging_pool(slow=0.02)
+        for _ in range(3):
+            with pytest.raises(asyncio.TimeoutError):
+                await asyncio.wait_for(pool.get(URL), timeout=0.1)  # the caller's own deadline
+        assert pool.breaker_for("slow.example").state == "open"
+        with pytest.raises(CircuitOpen):
+            await pool.get(URL)
+
+    asyncio.run(main())
+
+
+def test_requests_cancelled_before_the_slow_threshold_give_no_verdict():
+    async def main():
+        pool = _hanging_pool(slow=5.0)
+        for _ in range(5):
+            with pytest.raises(asyncio.TimeoutError):
+                await asyncio.wait_for(pool.get(URL), timeout=0.02)
+        breaker = pool.breaker_for("slow.example")
+        assert breaker.state == "closed"
+        assert breaker.consecutive == 0
+
+    asyncio.run(main())
@@ -0,0 +1,83 @@
+import asyncio
+from time import monotonic
+
+import content_pool
+from content_pool import ContentPool
+
+
+def _counter_fetch(delay: float, calls: list):
+    async def fetch():
+        calls.append(monotonic())
+        await asyncio.sleep(delay)
+        n = len(calls)
+        return [f"item {n}.{i}" for i in range(5)]
+    return fetch
+
+
+def test_cold_take_waits_for_first_batch_only():
+    calls = []
+    pool = ContentPool("test", _counter_fetch(0.1, calls), high=20, low=5, no_repeat=0)
+
+    async def main():
+        start = monotonic()
+        item = await pool.take()
+        took = monotonic() - start
+        await pool._task  # the top-up carries on after the caller got its item
+        return item, took
+
+    item, took = asyncio.run(main())
+    assert item == "item 1.0"
+    assert took < 0.2  # one fetch, not the several it takes to reach `high`
+    assert len(calls) > 1 and len(pool.items) >= pool.high
+
+
+def test_take_falls_back_to_archive_when_upstream_is_down():
+    batches = [["a", "b"]]
+
+    async def fetch():
+        return batches.pop() if batches else []
+
+    pool = ContentPool("test", fetch, high=2, low=1, no_repeat=1)
+
+    async def main():
+        served = [await pool.take(), await pool.take()]
+        served.append(await pool.take())
+        return served
+
+    served = asyncio.run(main())
+    assert served[:2] == ["a", "b"]
+    assert served[2] == "a"  # from the archive, skipping the item served last
+    assert pool.fallbacks == 1
+    assert pool.stats()["backing_off"]
+
+
+def test_refill_error_is_reported_and_backs_off(capsys):
+    async def fetch():
+        raise ValueError("bad payload")
+
+    pool = ContentPool("test", fetch, high=5, low=1)
+
+    async def main():
+        return await pool.take()
+
+    assert asyncio.run(main()) is None
+    assert "test refill failed: bad payload" in capsys.readouterr().err
+    assert pool.stats()["backing_off"]
+
+
+def test_cold_take_is_bounded(monkeypatch):
+    monkeypatch.setattr(content_pool, "COLD_WAIT", 0.1)
+    calls = []
+    pool = ContentPool("test", _counter_fetch(5, calls), high=5, low=1)
+
+    async def main():
+        start = monotonic()
+        item = await pool.take()
+        took = monotonic() - start
+        running = not pool._task.done()
+        pool.clear()
+        return item, took, running
+
+    item, took, running = asyncio.run(main())
+    assert item is None and took < 1
+    assert running  # giving up on the wait did not cancel the refill
@@ -0,0 +1,56 @@
+import os
+
+import pytest
+
+import gazetteer
+from gazetteer import Gazetteer, build_index
+
+CITIES = [
+    # geonameid, name, asciiname, alternates, lat, lon, class, code, country, cc2, admin1, a2, a3, a4, population
+    ("1", "Paris", "Paris", "", "48.85341", "2.3488", "P", "PPLC", "FR", "", "11", "", "", "", "2138551"),
+    ("2", "Paris", "Paris", "", "33.66094", "-95.55551", "P", "PPLA2", "US", "", "TX", "", "", "", "24782"),
+    ("3", "Austin", "Austin", "", "30.26715", "-97.74306", "P", "PPLA", "US", "", "TX", "", "", "", "961855"),
+    ("4", "Austin", "Austin", "", "43.66663", "-92.97464", "P", "PPLA2", "US", "", "MN", "", "", "", "24563"),
+]
+
+
+@pytest.fixture
+def gaz(tmp_path):
+    dump = tmp_path / "cities.txt"
+    dump.write_text("".join("\t".join(row) + "\n" for row in CITIES), encoding="utf-8")
+    (tmp_path / gazetteer.COUNTRY_INFO).write_text(
+        "#ISO\tISO3\tISO-Numeric\tfips\tCountry\n"
+        "FR\tFRA\t250\tFR\tFrance\tParis\n"
+        "US\tUSA\t840\tUS\tUnited States\tWashington\n", encoding="utf-8")
+    (tmp_path / gazetteer.ADMIN1_CODES).write_text(
+        "US.TX\tTexas\tTexas\t4736286\nUS.MN\tMinnesota\tMinnesota\t5037779\nFR.11\tÎle-de-France\tIle-de-France\t3012874\n",
+        encoding="utf-8")
+    index = Gazetteer(build_index(str(dump)))
+    yield index
+    index.close()
+
+
+def test_country_and_admin1_names_qualify(gaz):
+    assert gaz.lookup("Paris, France")["country_code"] == "FR"
+    assert gaz.lookup("Paris, Texas")["latitude"] == pytest.approx(33.66094, abs=1e-4)
+    assert gaz.lookup("Austin, Minnesota")["latitude"] == pytest.approx(43.66663, abs=1e-4)
+    assert gaz.lookup("Paris, Île-de-France")["country_code"] == "FR"
+    assert gaz.lookup("Austin, Texas, USA")["latitude"] == pytest.approx(30.26715, abs=1e-4)
+
+
+def test_codes_still_qualify_and_unknown_names_miss(gaz):
+    assert gaz.lookup("Paris, TX")["country_code"] == "US"
+    assert gaz.lookup("Paris, FR")["country_code"] == "FR"
+    assert gaz.lookup("Paris, Narnia") is None
+
+
+def test_index_without_name_files(tmp_path):
+    dump = tmp_path / "cities.txt"
+    dump.write_text("\t".join(CITIES[0]) + "\n", encoding="utf-8")
+    index = Gazetteer(build_index(str(dump)))
+    try:
+        assert index.qualifiers == {}
+        assert index.lookup("Paris, FR")["country_code"] == "FR"
+    finally:
+        index.close()
+    assert os.path.exists(str(dump) + ".idx")
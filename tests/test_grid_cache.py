@@ -0,0 +1,27 @@
+import asyncio
+
+import pytest
+
+from grid_cache import GridCache
+
+
+def test_fill_outlives_a_lone_caller_deadline():
+    calls = 0
+
+    async def fetch(lat, lon):
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.1)
+        return {"lat": lat}
+
+    async def main():
+        grid = GridCache(ttl=60)
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(grid.get(13.08, 80.27, fetch), timeout=0.02)  # the only waiter gives up
+        value = await grid.get(13.08, 80.27, fetch)  # joins the fetch still in flight
+        assert value is not None
+        await asyncio.sleep(0)
+        assert grid.peek(13.08, 80.27) == value
+        return calls
+
+    assert asyncio.run(main()) == 1
@@ -0,0 +1,34 @@
+import asyncio
+import os
+
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.prebuilt import create_react_agent
+
+from history import HistoryManager
+
+os.environ.setdefault("OPENAI_API_KEY", "test")  # agent.py builds its ChatOpenAI client at import
+from agent import stream_turn  # noqa: E402
+
+
+class _FakeAgentModel(GenericFakeChatModel):
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+
+def test_summarization_does_not_stream_into_reply(capsys):
+    summarizer = GenericFakeChatModel(messages=iter([AIMessage(content="SUMMARY-TEXT of earlier turns")]))
+    history = HistoryManager(budget=60, keep_turns=1, summarizer=summarizer)
+    model = _FakeAgentModel(messages=iter([AIMessage(content="Reply for the user")]))
+    agent = create_react_agent(model, [], pre_model_hook=history.pre_model_hook)
+
+    earlier = []
+    for i in range(3):
+        earlier += [HumanMessage(content=f"question {i} " + "word " * 40),
+                    AIMessage(content=f"answer {i} " + "word " * 40)]
+    asyncio.run(stream_turn(agent, [*earlier, HumanMessage(content="and now?")], {}))
+
+    printed = capsys.readouterr().out
+    assert "Reply for the user" in printed
+    assert "SUMMARY-TEXT" not in printed
+    assert next(summarizer.messages, None) is None  # the hook did summarize this turn
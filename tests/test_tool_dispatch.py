@@ -0,0 +1,53 @@
+import asyncio
+from types import SimpleNamespace
+
+from langchain_core.messages import AIMessage, ToolMessage
+
+from tool_dispatch import ToolDispatcher
+
+
+def _step_requests(prefix: str, names):
+    calls = [{"name": name, "args": {}, "id": f"{prefix}{i}"} for i, name in enumerate(names)]
+    state = {"messages": [AIMessage(content="", tool_calls=calls)]}
+    return [SimpleNamespace(tool_call=call, state=state) for call in calls]
+
+
+async def _execute(request):
+    await asyncio.sleep(0.05)
+    return ToolMessage(content="ok", tool_call_id=request.tool_call["id"])
+
+
+def test_concurrent_turns_collect_their_own_steps():
+    dispatcher = ToolDispatcher({"a": "weather", "b": "search"}, turn_deadline=5)
+
+    async def turn(prefix: str, names):
+        with dispatcher.turn() as steps:
+            await asyncio.gather(*(dispatcher.awrap_tool_call(r, _execute) for r in _step_requests(prefix, names)))
+        return dispatcher.turn_stats(steps)
+
+    async def main():
+        return await asyncio.gather(turn("x", ["a", "b"]), turn("y", ["a", "b", "b"]))
+
+    first, second = asyncio.run(main())
+    assert (first["tool_steps"], first["tool_calls"]) == (1, 2)
+    assert (second["tool_steps"], second["tool_calls"]) == (1, 3)
+    assert second["tool_parallelism"] > 2  # the three calls ran side by side
+
+
+def test_turn_deadline_returns_partial_results():
+    dispatcher = ToolDispatcher({"a": "weather", "b": "info"}, turn_deadline=0.2)
+
+    async def execute(request):
+        await asyncio.sleep(0.01 if request.tool_call["name"] == "a" else 60)
+        return ToolMessage(content="ok", tool_call_id=request.tool_call["id"])
+
+    async def main():
+        with dispatcher.turn() as steps:
+            results = await asyncio.gather(*(dispatcher.awrap_tool_call(r, execute)
+                                             for r in _step_requests("z", ["a", "b"])))
+        return results, dispatcher.turn_stats(steps)
+
+    results, stats = asyncio.run(main())
+    assert results[0].content == "ok"
+    assert results[1].status == "error"
+    assert stats["tool_timeouts"] == 1
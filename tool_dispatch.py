@@ -0,0 +1,215 @@
+# tool_dispatch.py
+# ---------------------------
+# Purpose:
+#   - Concurrent dispatch of the tool calls the model emits in one ReAct step (e.g. get_weather
+#     for two cities plus web_search): every call goes to its MCP server at once.
+#   - ToolDispatcher.awrap_tool_call wraps each call made by LangGraph's ToolNode (which runs a
+#     step's calls side by side) with:
+#       - a concurrency cap per MCP server, so one step cannot flood a single server
+#       - a per-turn deadline: calls still queued or running when it expires are cancelled and
+#         answered with a timeout message, so the model gets the results that did finish
+#         instead of the turn hanging on one slow upstream
+#       - per-step timing: wall time, summed tool time and the parallelism actually achieved
+#         (logged at INFO on "pluggraph.tools", exported as metrics, and totalled per turn:
+#         `with dispatcher.turn() as steps` collects that turn's steps, even with many turns
+#         running concurrently as in batch.py)
+#   - Configuration:
+#       PLUGGRAPH_PARALLEL_TOOLS=1      0 = run a step's tool calls one at a time
+#       PLUGGRAPH_TOOL_CONCURRENCY=4    calls in flight per server; "4,search=2" overrides one server
+#       PLUGGRAPH_TURN_DEADLINE=60      seconds of tool work per user turn (0 = no deadline)
+# ---------------------------
+
+import os
+import asyncio
+import logging
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from time import monotonic
+from collections import deque
+from typing import Dict, Iterator, List, Optional
+
+from langchain_core.messages import ToolMessage
+from tracing import METRICS
+
+log = logging.getLogger("pluggraph.tools")
+
+PARALLELISM_BUCKETS = (1.0, 1.5, 2.0, 3.0, 4.0, 6.0, 8.0)
+MAX_PENDING_STEPS = 256  # step summaries kept until the next pop_turn_stats()
+
+# Absolute monotonic deadline of the turn being run in this task (None = no deadline)
+_DEADLINE: ContextVar[Optional[float]] = ContextVar("pluggraph_turn_deadline", default=None)
+# Step summaries of the turn being run in this task (None outside turn())
+_TURN_STEPS: ContextVar[Optional[List[dict]]] = ContextVar("pluggraph_turn_steps", default=None)
+
+
+class _Step:
+    """Tool calls answering one AI message."""
+
+    __slots__ = ("expected", "start", "done", "busy", "active", "peak", "timeouts", "servers", "turn")
+
+    def __init__(self, expected: int, turn: Optional[List[dict]]):
+        self.expected = expected
+        self.turn = turn    # the turn() collector this step reports to
+        self.start = monotonic()
+        self.done = 0
+        self.busy = 0.0     # summed per-call time, queueing included
+        self.active = 0
+        self.peak = 0       # most calls in flight at once
+        self.timeouts = 0
+        self.servers: Dict[str, int] = {}
+
+
+class ToolDispatcher:
+    """Per-server caps, per-turn deadline and step timing for a ToolNode's tool calls."""
+
+    def __init__(self, tool_servers: Dict[str, str], concurrency: int = 4,
+                 server_concurrency: Optional[Dict[str, int]] = None,
+                 turn_deadline: float = 60.0, parallel: bool = True):
+        self.tool_servers = tool_servers  # tool name -> MCP server name
+        self.concurrency = max(1, concurrency)
+        self.server_concurrency = {k: max(1, v) for k, v in (server_concurrency or {}).items()}
+        self.turn_deadline = turn_deadline
+        self.parallel = parallel
+        self._limits: Dict[str, asyncio.Semaphore] = {}
+        self._serial: Optional[asyncio.Lock] = None
+        self._steps: dict = {}
+        self._finished: deque = deque(maxlen=MAX_PENDING_STEPS)  # step summaries since the last pop_turn_stats
+
+    # ---- turns ----
+
+    @contextmanager
+    def turn(self) -> Iterator[List[dict]]:
+        """
+        Start the per-turn deadline for tool calls made while this block runs (one agent turn).
+        Yields the list that collects this turn's step summaries (see turn_stats).
+        """
+        steps: List[dict] = []
+        deadline = _DEADLINE.set(monotonic() + self.turn_deadline if self.turn_deadline > 0 else None)
+        collector = _TURN_STEPS.set(steps)
+        try:
+            yield steps
+        finally:
+            _TURN_STEPS.reset(collector)
+            _DEADLINE.reset(deadline)
+
+    def pop_turn_stats(self) -> Optional[dict]:
+        """Tool-step timing since the last pop (i.e. the last turn, for a single-conversation REPL)."""
+        steps, self._finished = self._finished, deque(maxlen=MAX_PENDING_STEPS)
+        return self.turn_stats(steps)
+
+    @staticmethod
+    def turn_stats(steps) -> Optional[dict]:
+        """Totals over step summaries (e.g. the list yielded by turn())."""
+        if not steps:
+            return None
+        wall = sum(s["wall_s"] for s in steps)
+        busy = sum(s["busy_s"] for s in steps)
+        return {
+            "tool_steps": len(steps),
+            "tool_calls": sum(s["calls"] for s in steps),
+            "tool_wall_s": round(wall, 3),
+            "tool_busy_s": round(busy, 3),
+            "tool_parallelism": round(busy / wall, 2) if wall > 0 else 1.0,
+            "tool_timeouts": sum(s["timeouts"] for s in steps),
+        }
+
+    # ---- dispatch ----
+
+    def _limit(self, server: str) -> asyncio.Semaphore:
+        limit = self._limits.get(server)
+        if limit is None:
+            limit = self._limits[server] = asyncio.Semaphore(self.server_concurrency.get(server, self.concurrency))
+        return limit
+
+    def _step(self, state, call_id: str) -> tuple:
+        messages = state.get("messages") if isinstance(state, dict) else getattr(state, "messages", None)
+        calls = getattr(messages[-1], "tool_calls", None) if messages else None
+        ids = tuple(c.get("id") for c in calls or ())
+        key = ids if call_id in ids else (call_id,)
+        step = self._steps.get(key)
+        if step is None:
+            step = self._steps[key] = _Step(len(key), _TURN_STEPS.get())
+        return key, step
+
+    async def awrap_tool_call(self, request, execute):
+        """ToolNode `awrap_tool_call` hook: run one tool call under its server cap and the turn deadline."""
+        call = request.tool_call
+        name = call["name"]
+        server = self.tool_servers.get(name, "unknown")
+        key, step = self._step(request.state, call["id"])
+        deadline = _DEADLINE.get()
+        if deadline is None and self.turn_deadline > 0:
+            deadline = monotonic() + self.turn_deadline  # outside a turn() block: bound each call on its own
+
+        async def run():
+            async with self._limit(server):
+                async with self._serial_lock():
+                    return await execute(request)
+
+        start = monotonic()
+        step.active += 1
+        step.peak = max(step.peak, step.active)
+        step.servers[server] = step.servers.get(server, 0) + 1
+        try:
+            remaining = None if deadline is None else deadline - monotonic()
+            if remaining is not None and remaining <= 0:
+                raise asyncio.TimeoutError
+            return await asyncio.wait_for(run(), timeout=remaining)
+        except asyncio.TimeoutError:
+            step.timeouts += 1
+            return ToolMessage(
+                content=f"{name} did not finish within the turn deadline ({self.turn_deadline:g}s); no result.",
+                name=name, tool_call_id=call["id"], status="error",
+            )
+        finally:
+            step.active -= 1
+            step.busy += monotonic() - start
+            step.done += 1
+            if step.done >= step.expected:
+                self._finish(key, step)
+
+    def _serial_lock(self):
+        if self.parallel:
+            return nullcontext()
+        if self._serial is None:
+            self._serial = asyncio.Lock()
+        return self._serial
+
+    def _finish(self, key: tuple, step: _Step) -> None:
+        self._steps.pop(key, None)
+        wall = monotonic() - step.start
+        parallelism = step.busy / wall if wall > 0 else 1.0
+        summary = {"calls": step.done, "wall_s": wall, "busy_s": step.busy, "peak": step.peak,
+                   "timeouts": step.timeouts, "servers": dict(step.servers)}
+        self._finished.append(summary)
+        if step.turn is not None:
+            step.turn.append(summary)
+        METRICS.observe("pluggraph_tool_step_seconds", {}, wall)
+        METRICS.observe("pluggraph_tool_step_parallelism", {}, parallelism, PARALLELISM_BUCKETS)
+        log.info("tool step: %d call(s) %s in %.2fs wall, %.2fs tool time, %.1fx parallel (peak %d)%s",
+                 step.done, ",".join(f"{s}×{n}" for s, n in step.servers.items()), wall, step.busy,
+                 parallelism, step.peak, f", {step.timeouts} timed out" if step.timeouts else "")
+
+
+def _concurrency_from_env() -> tuple:
+    """PLUGGRAPH_TOOL_CONCURRENCY="4" or "4,search=2,weather=3" -> (default cap, per-server caps)."""
+    default, per_server = 4, {}
+    for entry in filter(None, os.getenv("PLUGGRAPH_TOOL_CONCURRENCY", "").split(",")):
+        name, sep, value = entry.partition("=")
+        if sep:
+            per_server[name.strip()] = int(value)
+        else:
+            default = int(name)
+    return default, per_server
+
+
+def dispatcher_from_env(tool_servers: Dict[str, str]) -> ToolDispatcher:
+    """Build a ToolDispatcher from PLUGGRAPH_PARALLEL_TOOLS / _TOOL_CONCURRENCY / _TURN_DEADLINE."""
+    default, per_server = _concurrency_from_env()
+    return ToolDispatcher(
+        tool_servers,
+        concurrency=default,
+        server_concurrency=per_server,
+        turn_deadline=float(os.getenv("PLUGGRAPH_TURN_DEADLINE", "60")),
+        parallel=os.getenv("PLUGGRAPH_PARALLEL_TOOLS", "1") != "0",
+    )
@@ -0,0 +1,358 @@
+# tracing.py
+# ---------------------------
+# Purpose:
+#   - Lightweight spans + metrics to see where a slow turn spent its time: LLM calls, the MCP
+#     transport, a particular tool, or one upstream request inside a tool.
+#   - Spans nest through a contextvar (agent turn → LLM call / MCP tool call → server tool →
+#     upstream GET). The W3C `traceparent` travels in the MCP request `_meta`, so server-side
+#     spans join the agent's per-turn trace across stdio/HTTP.
+#   - Export: OpenTelemetry OTLP/JSON span objects, one per line, to a file or the console.
+#     Spans are buffered and written in batches; with export off, only metrics are kept.
+#   - Metrics: Prometheus-style counters and histograms (tool latency, upstream latency/status/
+#     bytes, cache hits), exposed as the `metrics://prometheus` MCP resource and /metrics in serve.py.
+#   - Logs: configure_logging() sets the level of the "pluggraph.*" loggers (per-step tool timing,
+#     prompt tokens per model call, ...) for the CLI entry points; output goes to stderr.
+#   - Configuration:
+#       PLUGGRAPH_TRACE=                   off (default) | console | path/to/spans.jsonl
+#       PLUGGRAPH_LOG_LEVEL=               pluggraph.* log level (default per entry point: REPL WARNING, batch INFO)
+# ---------------------------
+
+import os
+import sys
+import json
+import time
+import atexit
+import logging
+import random
+import functools
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Dict, Optional, Tuple
+
+from scheduler import Histogram
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+FLUSH_SPANS = 64       # write once this many spans are buffered ...
+FLUSH_INTERVAL = 1.0   # ... or this many seconds passed since the last write
+
+_current: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("pluggraph_span", default=None)
+
+
+class Span:
+    """One timed operation; attributes follow OpenTelemetry semantic names where one exists."""
+
+    __slots__ = ("name", "kind", "trace_id", "span_id", "parent_id", "start_ns", "end_ns", "attributes", "error")
+
+    def __init__(self, name: str, kind: str = "internal", trace_id: Optional[str] = None,
+                 parent_id: Optional[str] = None, attributes: Optional[dict] = None):
+        self.name = name
+        self.kind = kind
+        self.trace_id = trace_id or f"{random.getrandbits(128):032x}"
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.attributes = attributes or {}
+        self.error: Optional[str] = None
+
+    def set(self, key: str, value) -> None:
+        self.attributes[key] = value
+
+    def fail(self, message: str) -> None:
+        self.error = message
+
+    @property
+    def duration(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e9
+
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def to_otlp(self) -> dict:
+        """OTLP/JSON span representation."""
+        attrs = []
+        for key, value in self.attributes.items():
+            if isinstance(value, bool):
+                attrs.append({"key": key, "value": {"boolValue": value}})
+            elif isinstance(value, int):
+                attrs.append({"key": key, "value": {"intValue": str(value)}})
+            elif isinstance(value, float):
+                attrs.append({"key": key, "value": {"doubleValue": value}})
+            else:
+                attrs.append({"key": key, "value": {"stringValue": str(value)}})
+        out = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": {"internal": 1, "server": 2, "client": 3}.get(self.kind, 1),
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": attrs,
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1},
+        }
+        if self.parent_id:
+            out["parentSpanId"] = self.parent_id
+        return out
+
+
+def parse_traceparent(value: Optional[str]) -> Optional[Tuple[str, str]]:
+    """W3C traceparent "00-<trace>-<span>-<flags>" → (trace_id, span_id), or None."""
+    parts = (value or "").split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    return parts[1], parts[2]
+
+
+class Exporter:
+    """Buffered OTLP/JSON-lines writer (file path or "console" = stderr)."""
+
+    def __init__(self, target: str):
+        self.target = target
+        self.service = os.path.splitext(os.path.basename(sys.argv[0] or "python"))[0] or "python"
+        self._buffer = []
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        atexit.register(self.flush)
+
+    def export(self, span: Span) -> None:
+        with self._lock:
+            self._buffer.append(span)
+            due = len(self._buffer) >= FLUSH_SPANS or time.monotonic() - self._last_flush >= FLUSH_INTERVAL
+        if due:
+            self.flush()
+
+    def flush(self) -> None:
+        with self._lock:
+            spans, self._buffer = self._buffer, []
+            self._last_flush = time.monotonic()
+        if not spans:
+            return
+        resource = {"attributes": [{"key": "service.name", "value": {"stringValue": self.service}}]}
+        lines = "".join(
+            json.dumps({"resource": resource, "span": span.to_otlp()}, separators=(",", ":")) + "\n"
+            for span in spans
+        )
+        try:
+            if self.target == "console":
+                sys.stderr.write(lines)
+            else:
+                with open(self.target, "a", encoding="utf-8") as f:  # one append per batch
+                    f.write(lines)
+        except OSError:
+            pass  # tracing must never break a tool call
+
+
+_TARGET = os.getenv("PLUGGRAPH_TRACE", "").strip()
+EXPORTER: Optional[Exporter] = Exporter(_TARGET) if _TARGET and _TARGET.lower() not in {"0", "off"} else None
+
+
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+
+def start_span(name: str, kind: str = "internal", parent: Optional[Span] = None,
+               remote_parent: Optional[Tuple[str, str]] = None, **attributes) -> Span:
+    """Create a span (child of `parent`, `remote_parent` or the current span) without activating it."""
+    parent = parent or (None if remote_parent else _current.get())
+    if parent is not None:
+        return Span(name, kind, parent.trace_id, parent.span_id, attributes)
+    if remote_parent is not None:
+        return Span(name, kind, remote_parent[0], remote_parent[1], attributes)
+    return Span(name, kind, attributes=attributes)
+
+
+def end_span(span: Span) -> None:
+    span.end_ns = time.time_ns()
+    if EXPORTER is not None:
+        EXPORTER.export(span)
+
+
+@contextmanager
+def span(name: str, kind: str = "internal", remote_parent: Optional[Tuple[str, str]] = None, **attributes):
+    """Time a block as a span that is current (the parent of nested spans) inside the block."""
+    s = start_span(name, kind, remote_parent=remote_parent, **attributes)
+    token = _current.set(s)
+    try:
+        yield s
+    except BaseException as e:
+        s.fail(f"{type(e).__name__}: {e}")
+        raise
+    finally:
+        _current.reset(token)
+        end_span(s)
+
+
+# ---- metrics ----
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Metrics:
+    """Prometheus-style counters and histograms keyed by (name, labels)."""
+
+    def __init__(self):
+        self.counters: Dict[Tuple[str, Labels], float] = {}
+        self.histograms: Dict[Tuple[str, Labels], Histogram] = {}
+        self.help: Dict[str, str] = {}
+
+    def inc(self, name: str, labels: dict, value: float = 1.0) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        self.counters[key] = self.counters.get(key, 0.0) + value
+
+    def observe(self, name: str, labels: dict, value: float, buckets: tuple = LATENCY_BUCKETS) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        hist = self.histograms.get(key)
+        if hist is None:
+            hist = self.histograms[key] = Histogram(buckets)
+        hist.observe(value)
+
+    def describe(self, name: str, text: str) -> None:
+        self.help[name] = text
+
+    def render(self) -> str:
+        """Prometheus text exposition format."""
+        def fmt(labels, extra=()) -> str:
+            pairs = [*labels, *extra]
+            if not pairs:
+                return ""
+            escaped = (f'{k}="{str(v).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+                       for k, v in pairs)
+            return "{" + ",".join(escaped) + "}"
+
+        lines, typed = [], set()
+        for (name, labels), value in sorted(self.counters.items()):
+            if name not in typed:
+                typed.add(name)
+                if name in self.help:
+                    lines.append(f"# HELP {name} {self.help[name]}")
+                lines.append(f"# TYPE {name} counter")
+            lines.append(f"{name}{fmt(labels)} {value:g}")
+        for (name, labels), hist in sorted(self.histograms.items()):
+            if name not in typed:
+                typed.add(name)
+                if name in self.help:
+                    lines.append(f"# HELP {name} {self.help[name]}")
+                lines.append(f"# TYPE {name} histogram")
+            data = hist.as_dict()
+            for bound, count in data["buckets"].items():
+                lines.append(f"{name}_bucket{fmt(labels, (('le', bound),))} {count}")
+            lines.append(f"{name}_sum{fmt(labels)} {data['sum']}")
+            lines.append(f"{name}_count{fmt(labels)} {data['count']}")
+        return "\n".join(lines) + "\n"
+
+
+METRICS = Metrics()
+METRICS.describe("pluggraph_tool_calls_total", "MCP tool calls by server, tool and outcome")
+METRICS.describe("pluggraph_tool_duration_seconds", "MCP tool call latency")
+METRICS.describe("pluggraph_tool_step_seconds", "Wall time of one agent step's tool calls")
+METRICS.describe("pluggraph_tool_step_parallelism", "Summed tool time over wall time per agent step")
+METRICS.describe("pluggraph_upstream_requests_total", "Upstream HTTP requests by host and status")
+METRICS.describe("pluggraph_upstream_duration_seconds", "Upstream HTTP request latency")
+METRICS.describe("pluggraph_upstream_response_bytes", "Upstream HTTP response body size")
+METRICS.describe("pluggraph_cache_lookups_total", "Response cache lookups by host and result")
+METRICS.describe("pluggraph_breaker_rejections_total", "Upstream requests failed fast by an open circuit")
+METRICS.describe("pluggraph_breaker_transitions_total", "Circuit breaker state changes by host and new state")
+METRICS.describe("pluggraph_hedged_requests_total", "Hedged upstream GETs by host and which copy answered first")
+
+
+def configure_logging(default: str = "WARNING") -> None:
+    """Send "pluggraph.*" logs to stderr at PLUGGRAPH_LOG_LEVEL (or `default`); stdout stays for output."""
+    level = os.getenv("PLUGGRAPH_LOG_LEVEL", default).upper()
+    logging.basicConfig(stream=sys.stderr, format="%(asctime)s %(name)s %(levelname)s %(message)s")  # no-op if set up
+    logging.getLogger("pluggraph").setLevel(level)
+
+
+# ---- MCP server instrumentation ----
+
+def _request_traceparent(mcp) -> Optional[Tuple[str, str]]:
+    """traceparent sent by the client in the MCP request `_meta`, if any."""
+    try:
+        meta = mcp.get_context().request_context.meta
+    except (LookupError, ValueError, AttributeError):
+        return None  # called outside an MCP request (e.g. directly from Python)
+    return parse_traceparent(getattr(meta, "traceparent", None)) if meta is not None else None
+
+
+def instrument_tools(mcp) -> None:
+    """Wrap every tool registered on the FastMCP server with a span and latency/outcome metrics."""
+    for tool in mcp._tool_manager.list_tools():
+        if getattr(tool.fn, "__pluggraph_traced__", False):
+            continue
+        tool.fn = _traced_tool(mcp, tool.name, tool.fn)
+
+
+def _traced_tool(mcp, name: str, fn):
+    labels = {"server": mcp.name, "tool": name}
+
+    @functools.wraps(fn)
+    async def traced(*args, **kwargs):
+        start = time.perf_counter()
+        outcome = "ok"
+        try:
+            with span(f"tool {name}", "server", remote_parent=_request_traceparent(mcp),
+                      **{"mcp.server": mcp.name, "mcp.tool": name}):
+                return await fn(*args, **kwargs)
+        except BaseException:
+            outcome = "error"
+            raise
+        finally:
+            METRICS.observe("pluggraph_tool_duration_seconds", labels, time.perf_counter() - start)
+            METRICS.inc("pluggraph_tool_calls_total", {**labels, "outcome": outcome})
+
+    traced.__pluggraph_traced__ = True
+    return traced
+
+
+def register_metrics(mcp) -> None:
+    """Expose the metrics registry as the `metrics://prometheus` MCP resource."""
+
+    @mcp.resource("metrics://prometheus", name="metrics", mime_type="text/plain")
+    def metrics() -> str:
+        """Prometheus text-format metrics (tool latency, upstream requests, cache lookups)."""
+        return METRICS.render()
+
+
+# ---- agent (LangChain) instrumentation ----
+
+try:
+    from langchain_core.callbacks import BaseCallbackHandler
+except ImportError:  # servers can run without LangChain installed
+    BaseCallbackHandler = None
+
+if BaseCallbackHandler is not None:
+
+    class LLMSpanCallback(BaseCallbackHandler):
+        """LangChain callback that records one span per chat-model call (with token usage)."""
+
+        run_inline = True  # run in the caller's context so the current (turn) span is the parent
+
+        def __init__(self):
+            self._spans: Dict[str, Span] = {}
+
+        def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+            model = (kwargs.get("metadata") or {}).get("ls_model_name") or (serialized or {}).get("name", "llm")
+            self._spans[str(run_id)] = start_span(f"llm {model}", "client", **{"gen_ai.request.model": model})
+
+        def on_llm_end(self, response, *, run_id, **kwargs):
+            s = self._spans.pop(str(run_id), None)
+            if s is None:
+                return
+            usage = (response.llm_output or {}).get("token_usage") or {}
+            for generation in (response.generations or [[]])[0]:
+                meta = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                if meta:
+                    usage = {"prompt_tokens": meta.get("input_tokens"), "completion_tokens": meta.get("output_tokens")}
+            if usage.get("prompt_tokens") is not None:
+                s.set("gen_ai.usage.input_tokens", int(usage["prompt_tokens"]))
+            if usage.get("completion_tokens") is not None:
+                s.set("gen_ai.usage.output_tokens", int(usage["completion_tokens"]))
+            end_span(s)
+
+        def on_llm_error(self, error, *, run_id, **kwargs):
+            s = self._spans.pop(str(run_id), None)
+            if s is not None:
+                s.fail(f"{type(error).__name__}: {error}")
+                end_span(s)
@@ -0,0 +1,360 @@
+# universities.py
+# ---------------------------
+# Purpose:
+#   - Optional local copy of the Hipolabs world universities dataset for
+#     info_server.search_universities, so a call no longer downloads and parses every
+#     university of a country (thousands for the US or India) just to return five.
+#   - The dataset JSON is compiled into a compact binary index (`<dataset>.idx`) that is
+#     memory-mapped (same approach as gazetteer.py):
+#       - fixed-size university records sorted by country, so each country is one contiguous range
+#       - a country table (normalized name and ISO alpha-2 code -> range)
+#       - a sorted name-token table with posting lists of university ids (token and prefix lookups)
+#   - Name search ranks by IDF-weighted token matches (exact > prefix > typo-tolerant), with
+#     bonuses for a phrase or leading match; only the top-k results are turned into dicts.
+#   - A background task keeps the copy fresh with conditional GETs (snapshot.py): an unchanged
+#     dataset costs one 304 and no rebuild.
+#   - Configuration:
+#       PLUGGRAPH_UNIVERSITIES=/path/to/world_universities.json   (unset = disabled, API only)
+#       PLUGGRAPH_UNIVERSITIES_REFRESH=86400   seconds between refreshes (0 = never refresh an existing copy)
+#       PLUGGRAPH_UNIVERSITIES_URL=...         dataset source (default: the Hipolabs GitHub list)
+#   - CLI:
+#       python universities.py sync                     # download/refresh + rebuild the index
+#       python universities.py search India "iit delhi"
+# ---------------------------
+
+import os
+import sys
+import json
+import math
+import mmap
+import heapq
+import struct
+import asyncio
+import threading
+from bisect import bisect_left
+from difflib import SequenceMatcher
+from typing import Iterator, List, Optional, Tuple
+
+from gazetteer import normalize
+from snapshot import keep_fresh, refresh_file
+
+DATASET_URL = "https://raw.githubusercontent.com/Hipo/university-domains-list/master/world_universities_and_domains.json"
+
+MAGIC = b"PGUNI001"
+HEADER = struct.Struct("<8sIIIII")   # magic, n_unis, n_country_keys, n_tokens, n_postings, strings_size
+UNI = struct.Struct("<III2sBx")      # name_off, website_off, country_off, alpha2, name token count
+COUNTRY = struct.Struct("<III")      # key_off, first university, count
+TOKEN = struct.Struct("<III")        # token_off, first posting, count
+POSTING = struct.Struct("<I")        # university id (ascending within a token)
+
+PREFIX_SCAN = 2000      # max tokens scanned for one prefix / typo lookup
+FUZZY_MIN = 0.8         # minimum similarity for a typo-tolerant token match
+RERANK = 4              # candidates per requested result re-scored on the full name
+ACRONYM_SKIP = {"of", "the", "and", "for", "de", "la", "du", "des", "di", "del"}
+
+
+# ---- build ----
+
+def build_index(source: str, target: Optional[str] = None) -> str:
+    """Compile the dataset JSON into the binary index; returns the index path."""
+    target = target or source + ".idx"
+    with open(source, "r", encoding="utf-8") as f:
+        data = json.load(f)
+
+    rows, seen = [], set()
+    for uni in data if isinstance(data, list) else []:
+        name, country = (uni.get("name") or "").strip(), (uni.get("country") or "").strip()
+        if not name or not country or (name, country) in seen:
+            continue
+        seen.add((name, country))
+        website = (uni.get("web_pages") or [""])[0] or ""
+        alpha2 = (uni.get("alpha_two_code") or "").upper()[:2]
+        rows.append((normalize(country), normalize(name), name, country, website, alpha2))
+    rows.sort()
+
+    strings = bytearray(b"\0")
+    offsets = {}
+
+    def intern(s: str) -> int:
+        off = offsets.get(s)
+        if off is None:
+            off = offsets[s] = len(strings)
+            strings.extend(s.encode("utf-8") + b"\0")
+        return off
+
+    unis = bytearray()
+    countries = {}   # key -> [first, count]
+    postings = {}    # token -> [university ids]
+    for i, (country_key, name_key, name, country, website, alpha2) in enumerate(rows):
+        words = name_key.split()
+        unis += UNI.pack(intern(name), intern(website), intern(country),
+                         alpha2.encode("ascii", "ignore").ljust(2), min(len(words), 255))
+        for key in {country_key, alpha2.lower()}:
+            if key:
+                entry = countries.setdefault(key, [i, 0])
+                if entry[0] + entry[1] == i:  # alpha-2 codes shared by two country names keep the first range
+                    entry[1] += 1
+        tokens = set(words)
+        initials = "".join(w[0] for w in words if w not in ACRONYM_SKIP)
+        if len(initials) >= 3:
+            tokens.add(initials)  # "indian institute of technology delhi" is also found as "iitd" / "iit"
+        for token in tokens:
+            postings.setdefault(token, []).append(i)
+
+    country_table = bytearray()
+    for key in sorted(countries, key=lambda k: k.encode("utf-8")):
+        first, count = countries[key]
+        country_table += COUNTRY.pack(intern(key), first, count)
+    token_table, posting_table, n_postings = bytearray(), bytearray(), 0
+    for token in sorted(postings, key=lambda t: t.encode("utf-8")):
+        ids = postings[token]
+        token_table += TOKEN.pack(intern(token), n_postings, len(ids))
+        posting_table += struct.pack(f"<{len(ids)}I", *ids)
+        n_postings += len(ids)
+
+    tmp = target + ".tmp"
+    with open(tmp, "wb") as out:
+        out.write(HEADER.pack(MAGIC, len(rows), len(countries), len(postings), n_postings, len(strings)))
+        out.write(unis)
+        out.write(country_table)
+        out.write(token_table)
+        out.write(posting_table)
+        out.write(strings)
+    os.replace(tmp, target)  # atomic swap so readers never see a half-written index
+    return target
+
+
+# ---- lookup ----
+
+class UniversityIndex:
+    """Read-only view over a memory-mapped index built by `build_index`."""
+
+    def __init__(self, index_path: str):
+        self._file = open(index_path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.n_unis, self.n_countries, self.n_tokens, self.n_postings, _ = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{index_path} is not a universities index")
+        self._unis = HEADER.size
+        self._countries = self._unis + self.n_unis * UNI.size
+        self._tokens = self._countries + self.n_countries * COUNTRY.size
+        self._postings = self._tokens + self.n_tokens * TOKEN.size
+        self._strings = self._postings + self.n_postings * POSTING.size
+        # Posting lists as a uint32 view, so range filtering is a bisect instead of a decode
+        self._ids = memoryview(self._mm)[self._postings:self._strings].cast("I")
+
+    def close(self) -> None:
+        self._ids.release()
+        self._mm.close()
+        self._file.close()
+
+    def _string(self, off: int) -> bytes:
+        start = self._strings + off
+        return self._mm[start:self._mm.find(b"\0", start)]
+
+    def _lower_bound(self, base: int, size: int, n: int, key: bytes) -> int:
+        lo, hi = 0, n
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._string(struct.unpack_from("<I", self._mm, base + mid * size)[0]) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def country_range(self, country: str) -> Optional[Tuple[int, int]]:
+        """(first id, end id) of a country by name or alpha-2 code; a unique-enough prefix also works."""
+        key = normalize(country).encode("utf-8")
+        if not key:
+            return None
+        i = self._lower_bound(self._countries, COUNTRY.size, self.n_countries, key)
+        if i < self.n_countries:
+            key_off, first, count = COUNTRY.unpack_from(self._mm, self._countries + i * COUNTRY.size)
+            found = self._string(key_off)
+            if found == key or (len(key) >= 4 and found.startswith(key)):
+                return first, first + count
+        return None
+
+    def _university(self, i: int) -> dict:
+        name_off, website_off, country_off, _, _ = UNI.unpack_from(self._mm, self._unis + i * UNI.size)
+        return {
+            "name": self._string(name_off).decode("utf-8"),
+            "country": self._string(country_off).decode("utf-8"),
+            "website": self._string(website_off).decode("utf-8"),
+        }
+
+    def _name_tokens(self, i: int) -> int:
+        return UNI.unpack_from(self._mm, self._unis + i * UNI.size)[4] or 1
+
+    def _name_key(self, i: int) -> str:
+        return normalize(self._string(UNI.unpack_from(self._mm, self._unis + i * UNI.size)[0]).decode("utf-8"))
+
+    def _token_matches(self, token: bytes, prefix: bool) -> List[Tuple[int, float]]:
+        """(token index, weight) for an exact match, prefix matches, or else close spellings."""
+        start = self._lower_bound(self._tokens, TOKEN.size, self.n_tokens, token)
+        out = []
+        for t in range(start, min(start + PREFIX_SCAN, self.n_tokens)):
+            found = self._string(TOKEN.unpack_from(self._mm, self._tokens + t * TOKEN.size)[0])
+            if found == token:
+                out.append((t, 1.0))
+            elif prefix and found.startswith(token):
+                out.append((t, 0.6 + 0.3 * len(token) / len(found)))
+            else:
+                break
+            if not prefix:
+                break
+        if out or len(token) < 4:
+            return out
+        # Typo-tolerant pass over tokens sharing the first two characters
+        stem = token[:2]
+        first = self._lower_bound(self._tokens, TOKEN.size, self.n_tokens, stem)
+        for t in range(first, min(first + PREFIX_SCAN, self.n_tokens)):
+            found = self._string(TOKEN.unpack_from(self._mm, self._tokens + t * TOKEN.size)[0])
+            if not found.startswith(stem):
+                break
+            matcher = SequenceMatcher(None, token, found)
+            if matcher.quick_ratio() >= FUZZY_MIN and matcher.ratio() >= FUZZY_MIN:
+                out.append((t, 0.5 * matcher.ratio()))
+        return out
+
+    def _posting_ids(self, t: int, lo: int, hi: int) -> Iterator[int]:
+        """University ids of token `t` that fall inside [lo, hi)."""
+        _, first, count = TOKEN.unpack_from(self._mm, self._tokens + t * TOKEN.size)
+        ids = self._ids[first:first + count]
+        for j in range(bisect_left(ids, lo), count):
+            uid = ids[j]
+            if uid >= hi:
+                break
+            yield uid
+
+    def search(self, country: str, name: str = "", limit: int = 5) -> Optional[List[dict]]:
+        """
+        Top `limit` universities of `country`, ranked against `name` when given.
+        Returns None when the country is not in the local copy (callers fall back to the API).
+        """
+        bounds = self.country_range(country)
+        if bounds is None:
+            return None
+        lo, hi = bounds
+        words = normalize(name).split()
+        if not words:
+            return [self._university(i) for i in range(lo, min(hi, lo + limit))]
+
+        scores, matched = {}, {}
+        total_idf = 0.0
+        for word in words:
+            matches = self._token_matches(word.encode("utf-8"), prefix=True)
+            df = sum(TOKEN.unpack_from(self._mm, self._tokens + t * TOKEN.size)[2] for t, _ in matches)
+            idf = math.log(1 + self.n_unis / (1 + df))  # "university" counts for little, "kyoto" for a lot
+            total_idf += idf
+            best = {}
+            for t, weight in matches:
+                for uid in self._posting_ids(t, lo, hi):
+                    if weight > best.get(uid, 0.0):
+                        best[uid] = weight
+            for uid, weight in best.items():
+                scores[uid] = scores.get(uid, 0.0) + weight * idf
+                matched[uid] = matched.get(uid, 0) + 1
+        if not scores:
+            return []
+
+        # Universities matching every word first, then by weighted score plus how much of the name
+        # the query covers ("kyoto" prefers "Kyoto University" over "Kyoto Medical College");
+        # only the head is re-scored on the full name
+        for uid in scores:
+            scores[uid] = scores[uid] / total_idf + 0.3 * matched[uid] / self._name_tokens(uid) if total_idf else 0.0
+        head = heapq.nlargest(limit * RERANK, scores, key=lambda uid: (matched[uid], scores[uid], -uid))
+        phrase = " ".join(words)
+        ranked = []
+        for uid in head:
+            key = self._name_key(uid)
+            bonus = 0.0
+            if key.startswith(phrase):
+                bonus = 0.5
+            elif f" {phrase}" in f" {key}":
+                bonus = 0.3
+            score = scores[uid] + bonus - len(key) / 1000
+            ranked.append((matched[uid], score, uid))
+        ranked.sort(key=lambda r: (-r[0], -r[1], r[2]))
+        return [self._university(uid) for _, _, uid in ranked[:limit]]
+
+
+# ---- local copy ----
+
+_INDEX: Optional[UniversityIndex] = None
+_LOADED = False
+_LOCK = threading.Lock()
+_SYNC_TASK: Optional[asyncio.Task] = None
+
+
+def load_universities() -> Optional[UniversityIndex]:
+    """
+    Return the local index (None when PLUGGRAPH_UNIVERSITIES is unset or not downloaded yet).
+    Rebuilds the index when it is missing or older than the dataset; blocking, so async
+    callers should run it in a thread.
+    """
+    global _INDEX, _LOADED
+    with _LOCK:
+        if _LOADED:
+            return _INDEX
+        source = os.getenv("PLUGGRAPH_UNIVERSITIES")
+        if not source or not os.path.exists(source):
+            _LOADED = bool(not source)  # a configured but missing dataset is retried after a sync
+            return None
+        _LOADED = True
+        try:
+            index = source + ".idx"
+            if not os.path.exists(index) or os.path.getmtime(index) < os.path.getmtime(source):
+                build_index(source, index)
+            _INDEX = UniversityIndex(index)
+        except (OSError, ValueError) as e:
+            print(f"universities index disabled: {e}", file=sys.stderr)  # stdout belongs to the MCP stdio stream
+            _INDEX = None
+        return _INDEX
+
+
+async def sync_universities(source: str, url: Optional[str] = None) -> bool:
+    """
+    Refresh the dataset with a conditional GET and rebuild the index if it changed.
+    Returns True when a new index was swapped in.
+    """
+    global _INDEX, _LOADED
+    url = url or os.getenv("PLUGGRAPH_UNIVERSITIES_URL", DATASET_URL)
+    if not await refresh_file(source, url, validate=lambda data: isinstance(data, list)):
+        return False
+    await asyncio.to_thread(build_index, source, source + ".idx")
+    with _LOCK:
+        old, _INDEX, _LOADED = _INDEX, UniversityIndex(source + ".idx"), True
+    if old is not None:
+        old.close()  # searches run on the event loop, so none is using the old map now
+    return True
+
+
+async def university_index() -> Optional[UniversityIndex]:
+    """Index for async callers: loads it off the event loop and starts the background refresh."""
+    global _SYNC_TASK
+    source = os.getenv("PLUGGRAPH_UNIVERSITIES")
+    if not source:
+        return None
+    if _SYNC_TASK is None:
+        refresh = float(os.getenv("PLUGGRAPH_UNIVERSITIES_REFRESH", "86400"))
+        _SYNC_TASK = asyncio.ensure_future(keep_fresh(source, refresh, lambda: sync_universities(source), "universities"))
+    if not _LOADED:
+        await asyncio.to_thread(load_universities)
+    return _INDEX
+
+
+if __name__ == "__main__":
+    path = os.getenv("PLUGGRAPH_UNIVERSITIES")
+    if not path:
+        sys.exit("Set PLUGGRAPH_UNIVERSITIES to the local dataset path first.")
+    if len(sys.argv) == 2 and sys.argv[1] == "sync":
+        print("updated" if asyncio.run(sync_universities(path)) else "up to date")
+    elif len(sys.argv) in (3, 4) and sys.argv[1] == "search":
+        index = load_universities()
+        if index is None:
+            sys.exit("No local copy yet; run `python universities.py sync`.")
+        hits = index.search(sys.argv[2], sys.argv[3] if len(sys.argv) == 4 else "", limit=10)
+        print("country not found" if hits is None else "\n".join(json.dumps(h, ensure_ascii=False) for h in hits))
+    else:
+        sys.exit("usage: python universities.py sync | search <country> [name]")
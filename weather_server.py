@@ -183,18 +183,30 @@
 #       2) get_forecast(latitude, longitude) -> forecast via Open-Meteo.
 #       3) get_alerts(latitude, longitude) -> weather alerts via Open-Meteo + fallback to US NWS.
 #       4) get_weather(location) -> composite (geocode + forecast + alerts).
+#       5) get_weather_batch(locations) -> forecasts for many places in one bulk request.
 #   - Enhancements:
+#       - Optional offline GeoNames gazetteer in front of Nominatim (PLUGGRAPH_GAZETTEER)
+#       - Forecast/warnings snapped to a model grid cell and cached per cell (PLUGGRAPH_GRID_RES)
+#       - NWS alerts from a background-refreshed per-state spatial index, filtered to the alerts
+#         that cover the queried point (alert_index.py, PLUGGRAPH_ALERT_REFRESH)
 #       - Weathercode → human-readable descriptions
 #       - Feels-like temps
 #       - Alert severity emojis
 #       - Reverse geocoding in alerts
 # ---------------------------
 
-import httpx
-from typing import Any, Optional
+import json
+import asyncio
+from typing import Any, List, Optional, Tuple
 from mcp.server.fastmcp import FastMCP
+from http_pool import get_pool, lifespan, register_stats
+from tracing import instrument_tools
+from gazetteer import load_gazetteer
+from grid_cache import GridCache
+from alert_index import StateAlerts
 
-mcp = FastMCP("weather")
+mcp = FastMCP("weather", lifespan=lifespan)
+register_stats(mcp)
 
 # APIs
 NOMINATIM_URL = "https://nominatim.openstreetmap.org/search"
@@ -204,6 +216,26 @@ OPEN_METEO_WARNINGS = "https://api.open-meteo.com/v1/warnings"
 NWS_API_BASE = "https://api.weather.gov"
 UA = "mcp-weather/2.0 (+github.com/your-org)"
 
+# Response cache TTLs (seconds) per endpoint
+GEOCODE_TTL = 7 * 24 * 3600   # place names rarely move
+POINTS_TTL = 24 * 3600        # NWS grid/state for a point is static
+FORECAST_TTL = 10 * 60        # model runs update roughly hourly
+ALERTS_TTL = 60               # alerts change quickly
+
+# Per-branch deadlines (seconds) inside the composite tools
+BRANCH_DEADLINE = 8.0         # any single upstream call inside get_alerts
+FORECAST_DEADLINE = 10.0      # forecast branch of get_weather
+ALERTS_DEADLINE = 12.0        # alerts branch of get_weather (may chain NWS points → alerts)
+
+# Point lookups against Open-Meteo are snapped to grid cells; nearby queries share one fetch
+forecast_grid = GridCache(ttl=FORECAST_TTL)
+warnings_grid = GridCache(ttl=ALERTS_TTL)
+
+@mcp.resource("stats://grid", name="grid_stats", mime_type="application/json")
+def grid_stats() -> str:
+    """Grid-cell cache statistics for forecast and warnings lookups."""
+    return json.dumps({"forecast": forecast_grid.stats(), "warnings": warnings_grid.stats()}, indent=2)
+
 # Weather code mapping (partial for demo, expand if needed)
 WEATHER_CODES = {
     0: "Clear sky", 1: "Mainly clear", 2: "Partly cloudy", 3: "Overcast",
@@ -221,24 +253,34 @@ SEVERITY_ICONS = {
     "Extreme": "🚨", "Severe": "⚠️", "Moderate": "🔔", "Minor": "ℹ️"
 }
 
-async def _get_json(url: str, params: Optional[dict] = None, headers: Optional[dict] = None, timeout: float = 20.0) -> Optional[Any]:
-    """GET request helper (returns parsed JSON or None)."""
+async def _get_json(url: str, params: Optional[dict] = None, headers: Optional[dict] = None, timeout: float = 20.0,
+                    ttl: Optional[float] = None) -> Optional[Any]:
+    """GET request helper over the shared connection pool (returns parsed JSON or None, cached for `ttl` s)."""
     hdrs = {"User-Agent": UA, "Accept": "application/json"}
     if headers:
         hdrs.update(headers)
-    async with httpx.AsyncClient(timeout=timeout) as client:
-        try:
-            r = await client.get(url, params=params, headers=hdrs)
-            r.raise_for_status()
-            return r.json()
-        except Exception:
-            return None
+    return await get_pool().get_json(url, params=params, headers=hdrs, timeout=timeout, ttl=ttl)
+
+_gazetteer_loaded = False
+
+async def _local_geocode(location: str) -> Optional[dict]:
+    """Offline gazetteer lookup (see gazetteer.py); None when disabled or on a local miss."""
+    global _gazetteer_loaded
+    if not _gazetteer_loaded:
+        await asyncio.to_thread(load_gazetteer)  # first use may compile the index; keep the loop free
+        _gazetteer_loaded = True
+    gaz = load_gazetteer()
+    return gaz.lookup(location) if gaz else None
 
 @mcp.tool()
 async def geocode(location: str) -> dict:
     """Geocode free-text location → {lat, lon, display_name, country_code}."""
+    local = await _local_geocode(location)
+    if local:
+        return local
+    # Local miss (or no gazetteer configured) → Nominatim
     params = {"q": location, "format": "json", "limit": 1, "addressdetails": 1}
-    data = await _get_json(NOMINATIM_URL, params=params, headers={"Accept-Language": "en"})
+    data = await _get_json(NOMINATIM_URL, params=params, headers={"Accept-Language": "en"}, ttl=GEOCODE_TTL)
     if not data:
         return {"error": f"Could not geocode '{location}'."}
     top = data[0]
@@ -249,20 +291,11 @@ async def geocode(location: str) -> dict:
         "country_code": (top.get("address", {}).get("country_code") or "").upper()
     }
 
-@mcp.tool()
-async def get_forecast(latitude: float, longitude: float) -> str:
-    """Fetch forecast for given lat/lon → readable summary."""
-    params = {
-        "latitude": latitude,
-        "longitude": longitude,
-        "current_weather": "true",
-        "daily": "temperature_2m_max,temperature_2m_min,apparent_temperature_max,apparent_temperature_min,precipitation_sum",
-        "timezone": "auto"
-    }
-    data = await _get_json(OPEN_METEO_FORECAST, params=params)
-    if not data:
-        return "Unable to fetch forecast data."
+# Daily fields requested from Open-Meteo (shared by single and batch forecasts)
+FORECAST_DAILY = "temperature_2m_max,temperature_2m_min,apparent_temperature_max,apparent_temperature_min,precipitation_sum"
 
+def _format_forecast(data: dict) -> str:
+    """Open-Meteo forecast payload (one location) → readable summary."""
     current = data.get("current_weather") or {}
     daily = data.get("daily") or {}
 
@@ -288,37 +321,107 @@ async def get_forecast(latitude: float, longitude: float) -> str:
         )
     return "\n".join(lines)
 
+async def _fetch_forecast(latitude: float, longitude: float) -> Optional[dict]:
+    """Raw Open-Meteo forecast for a (snapped) point; cached per cell by forecast_grid."""
+    params = {
+        "latitude": latitude,
+        "longitude": longitude,
+        "current_weather": "true",
+        "daily": FORECAST_DAILY,
+        "timezone": "auto"
+    }
+    return await _get_json(OPEN_METEO_FORECAST, params=params)
+
+@mcp.tool()
+async def get_forecast(latitude: float, longitude: float) -> str:
+    """Fetch forecast for given lat/lon → readable summary."""
+    data = await forecast_grid.get(latitude, longitude, _fetch_forecast)
+    if not data:
+        return "Unable to fetch forecast data."
+    return _format_forecast(data)
+
+async def _with_deadline(coro, seconds: float, fallback: Any = None) -> Any:
+    """Await `coro` but give up after `seconds`, returning `fallback` (one slow branch can't stall the rest)."""
+    try:
+        return await asyncio.wait_for(coro, timeout=seconds)
+    except asyncio.TimeoutError:
+        return fallback
+
+async def _open_meteo_warnings(latitude: float, longitude: float) -> Optional[str]:
+    """Formatted Open-Meteo warnings, or None when there are none."""
+    async def fetch(lat: float, lon: float) -> Optional[dict]:
+        return await _get_json(OPEN_METEO_WARNINGS, params={"latitude": lat, "longitude": lon})
+
+    warn = await warnings_grid.get(latitude, longitude, fetch)
+    if not (warn and isinstance(warn.get("warnings"), list) and warn["warnings"]):
+        return None
+    out = []
+    for w in warn["warnings"][:3]:
+        event = w.get("event", "Alert")
+        severity = w.get("severity", "unknown").title()
+        emoji = SEVERITY_ICONS.get(severity, "")
+        sender = w.get("sender", "Unknown agency")
+        onset, ends = w.get("onset", "n/a"), w.get("expires", "n/a")
+        desc = (w.get("description") or "").strip()
+        out.append(f"{emoji} {event} – {severity}\nFrom {sender}\n{onset} → {ends}\n{desc}")
+    return "\n\n".join(out)
+
+async def _nws_point(latitude: float, longitude: float) -> Optional[Tuple[str, List[str]]]:
+    """US state and NWS zone codes (forecast, county, fire weather) for a point via /points (None outside NWS coverage)."""
+    points = await _get_json(f"{NWS_API_BASE}/points/{latitude},{longitude}", headers={"Accept": "application/geo+json"}, ttl=POINTS_TTL)
+    props = (points or {}).get("properties") or {}
+    if not props.get("relativeLocation"):
+        return None
+    state = props["relativeLocation"]["properties"].get("state")
+    zones = [props[k].rstrip("/").rsplit("/", 1)[-1] for k in ("forecastZone", "county", "fireWeatherZone") if props.get(k)]
+    return (state, zones) if state else None
+
+async def _fetch_state_alerts(state: str) -> Optional[List[dict]]:
+    """Every active NWS alert for a state, with geometry (None on upstream errors)."""
+    alerts = await _get_json(f"{NWS_API_BASE}/alerts/active", params={"area": state},
+                             headers={"Accept": "application/geo+json"})
+    feats = alerts.get("features") if isinstance(alerts, dict) else None
+    return feats if isinstance(feats, list) else None
+
+# One spatial index per state feed, shared by all calls and refreshed in the background
+nws_alerts = StateAlerts(_fetch_state_alerts)
+
+@mcp.resource("stats://alerts", name="alert_index_stats", mime_type="application/json")
+def alert_index_stats() -> str:
+    """Per-state NWS alert index statistics."""
+    return json.dumps(nws_alerts.stats(), indent=2)
+
+async def _nws_alerts(state: str, latitude: float, longitude: float, zones: List[str]) -> Optional[str]:
+    """Formatted active NWS alerts covering the point, or None when there are none."""
+    hits = await nws_alerts.covering(state, latitude, longitude, zones)
+    if not hits:
+        return None
+    blocks = []
+    for p in hits[:3]:
+        blocks.append(f"{p.get('event') or 'Alert'}: {p.get('areaDesc') or ''}\n{p.get('headline') or ''}\n{(p.get('description') or '').strip()}")
+    return "\n\n".join(blocks)
+
 @mcp.tool()
 async def get_alerts(latitude: float, longitude: float) -> str:
     """Fetch severe weather alerts for given lat/lon."""
-    params = {"latitude": latitude, "longitude": longitude}
-    warn = await _get_json(OPEN_METEO_WARNINGS, params=params)
-    if warn and isinstance(warn.get("warnings"), list) and warn["warnings"]:
-        out = []
-        for w in warn["warnings"][:3]:
-            event = w.get("event", "Alert")
-            severity = w.get("severity", "unknown").title()
-            emoji = SEVERITY_ICONS.get(severity, "")
-            sender = w.get("sender", "Unknown agency")
-            onset, ends = w.get("onset", "n/a"), w.get("expires", "n/a")
-            desc = (w.get("description") or "").strip()
-            out.append(f"{emoji} {event} – {severity}\nFrom {sender}\n{onset} → {ends}\n{desc}")
-        return "\n\n".join(out)
-
-    # fallback → US NWS alerts
-    points = await _get_json(f"{NWS_API_BASE}/points/{latitude},{longitude}", headers={"Accept": "application/geo+json"})
-    if points and points.get("properties", {}).get("relativeLocation"):
-        state = points["properties"]["relativeLocation"]["properties"].get("state")
-        if state:
-            alerts = await _get_json(f"{NWS_API_BASE}/alerts/active", params={"area": state}, headers={"Accept": "application/geo+json"})
-            feats = alerts.get("features") if alerts else None
-            if feats:
-                blocks = []
-                for f in feats[:3]:
-                    p = f.get("properties") or {}
-                    blocks.append(f"{p.get('event','Alert')}: {p.get('areaDesc','')}\n{p.get('headline','')}\n{p.get('description','').strip()}")
-                return "\n\n".join(blocks)
-    return "No active alerts for this location."
+    # Start the NWS /points lookup alongside Open-Meteo warnings instead of only after they come back empty
+    warnings = asyncio.create_task(_with_deadline(_open_meteo_warnings(latitude, longitude), BRANCH_DEADLINE))
+    point = asyncio.create_task(_with_deadline(_nws_point(latitude, longitude), BRANCH_DEADLINE))
+    try:
+        text = await warnings
+        if text:
+            return text
+        # fallback → US NWS alerts
+        found = await point
+        if found:
+            st, zones = found
+            text = await _with_deadline(_nws_alerts(st, latitude, longitude, zones), BRANCH_DEADLINE)
+            if text:
+                return text
+        return "No active alerts for this location."
+    finally:
+        for task in (warnings, point):
+            task.cancel()  # no-op when already finished
 
 @mcp.tool()
 async def get_weather(location: str) -> str:
@@ -327,9 +430,76 @@ async def get_weather(location: str) -> str:
     if "error" in place:
         return place["error"]
     lat, lon, name = place["latitude"], place["longitude"], place["display_name"]
-    forecast = await get_forecast(lat, lon)
-    alerts = await get_alerts(lat, lon)
+    # Forecast and alerts are independent: latency is the slower branch, not the sum
+    forecast, alerts = await asyncio.gather(
+        _with_deadline(get_forecast(lat, lon), FORECAST_DEADLINE, "Forecast unavailable (upstream timed out)."),
+        _with_deadline(get_alerts(lat, lon), ALERTS_DEADLINE, "Alerts unavailable (upstream timed out)."),
+    )
     return f"Weather for {name}:\n\nForecast:\n{forecast}\n\nAlerts:\n{alerts}"
 
+@mcp.tool()
+async def get_weather_batch(locations: list[str]) -> str:
+    """
+    Forecasts for several places in one call (use instead of repeated get_weather calls).
+    Geocodes all locations concurrently, then fetches every forecast in one multi-coordinate
+    Open-Meteo request. Use get_alerts for severe weather warnings.
+    """
+    # Drop duplicate names (case/whitespace-insensitive), keeping the caller's order
+    seen = {}
+    for loc in locations:
+        if loc.strip():
+            seen.setdefault(loc.strip().casefold(), loc.strip())
+    unique = list(seen.values())
+    if not unique:
+        return "No locations given."
+    places = await asyncio.gather(*(geocode(loc) for loc in unique))
+
+    # Different names can resolve to the same point; request each coordinate once
+    coords = []
+    for place in places:
+        if "error" not in place and (place["latitude"], place["longitude"]) not in coords:
+            coords.append((place["latitude"], place["longitude"]))
+
+    # Serve cached grid cells first; only the missing cells go into the bulk request
+    forecasts = {}
+    missing = []
+    for lat, lon in coords:
+        cached = forecast_grid.peek(lat, lon)
+        if cached is not None:
+            forecasts[(lat, lon)] = cached
+        elif forecast_grid.snap(lat, lon) not in missing:
+            missing.append(forecast_grid.snap(lat, lon))
+    if missing:
+        params = {
+            "latitude": ",".join(str(lat) for lat, _ in missing),
+            "longitude": ",".join(str(lon) for _, lon in missing),
+            "current_weather": "true",
+            "daily": FORECAST_DAILY,
+            "timezone": "auto"
+        }
+        data = await _get_json(OPEN_METEO_FORECAST, params=params)
+        # Open-Meteo answers a single coordinate with an object and several with a list (same order)
+        if isinstance(data, dict):
+            data = [data]
+        fetched = {}
+        if isinstance(data, list) and len(data) == len(missing):
+            for (lat, lon), item in zip(missing, data):
+                forecast_grid.put(lat, lon, item)
+                fetched[(lat, lon)] = item
+        for lat, lon in coords:
+            forecasts.setdefault((lat, lon), fetched.get(forecast_grid.snap(lat, lon)))
+
+    blocks = []
+    for loc, place in zip(unique, places):
+        if "error" in place:
+            blocks.append(f"{loc}:\n{place['error']}")
+            continue
+        data = forecasts.get((place["latitude"], place["longitude"]))
+        forecast = _format_forecast(data) if data else "Unable to fetch forecast data."
+        blocks.append(f"Weather for {place['display_name']}:\n{forecast}")
+    return "\n\n".join(blocks)
+
+instrument_tools(mcp)  # spans + latency metrics for every tool above
+
 if __name__ == "__main__":
     mcp.run(transport="stdio")